@@ -0,0 +1,375 @@
+"""
+cdc_export_to_s3.py
+Export CDC (Change Data Capture) PostgreSQL → Amazon S3 (Data Lake RAW)
+
+Pour les tables mises à jour en place (users, subscription_events), un export
+complet ou un filtre par date ne voit pas les UPDATE / DELETE. Ce script lit
+le slot de réplication logique (plugin wal2json, format-version 2) et écrit
+des lots de changements ordonnés dans la zone RAW :
+
+    raw/postgres_cdc/<table>/<date>/<table>_cdc_<date>_<lsn_fin>.csv
+
+Chaque ligne porte les colonnes techniques :
+- _cdc_lsn  : LSN du changement (entier, ordonnable)
+- _cdc_seq  : ordre du changement dans le lot
+- _cdc_op   : I (insert), U (update), D (delete)
+- _cdc_xid  : identifiant de transaction PostgreSQL
+
+Le slot n'est avancé (pg_replication_slot_advance) qu'après l'écriture
+réussie du lot, et jusqu'au LSN de fin du COMMIT de la dernière transaction
+complète lue : un échec d'upload rejoue simplement les mêmes changements au
+run suivant, une transaction déjà exportée n'est jamais relue, et le MERGE
+côté Snowflake (sql_snowflake/sql7.sql) est idempotent sur (id, _cdc_lsn).
+
+Un slot nouvellement créé ne décode que les changements postérieurs à sa
+création : l'état initial des tables capturées est chargé une fois par un
+export complet (prepare_slot, tâche cdc_export_merge du DAG).
+
+Pré-requis PostgreSQL : voir sql_postgres/sql3.sql
+
+Test local (sans S3) :
+    python cdc_export_to_s3.py --local-dir /tmp/cdc --peek
+
+Auteur : StreamVision Data Engineering
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+from io import StringIO
+
+# psycopg2 et boto3 sont importés dans les fonctions : le DAG importe ce
+# module au parsing et ne doit pas dépendre du pilote PostgreSQL.
+
+# ============================================================================
+# CONFIGURATION A MODIFIER
+# ============================================================================
+
+DB_CONFIG = {
+    "host": "host.docker.internal",
+    "database": "streamvision",   # NOM DE TA BASE
+    "user": "postgres",
+    "password": "1234"
+}
+
+S3_CONFIG = {
+    "bucket": "streamvision-data-raw",
+    "region": "eu-north-1"
+}
+
+CDC_CONFIG = {
+    "slot_name": "streamvision_cdc",
+    "plugin": "wal2json",
+    # Nombre indicatif de changements lus par lot (None = tout le backlog) :
+    # le lot s'arrête toujours sur une transaction complète
+    "max_changes": 500000,
+}
+
+# Tables capturées et leurs colonnes (ordre des colonnes du CSV = ordre DDL)
+CDC_TABLES = {
+    "users": [
+        "id", "email", "username", "first_name", "last_name", "country",
+        "age_group", "subscription_plan", "subscription_start",
+        "subscription_end", "created_at", "last_login", "is_active",
+        "payment_method", "device_preference"
+    ],
+    "subscription_events": [
+        "id", "user_id", "event_type", "event_date", "previous_plan",
+        "new_plan", "amount", "currency", "payment_gateway", "transaction_id"
+    ],
+}
+
+CDC_META_COLUMNS = ["_cdc_lsn", "_cdc_seq", "_cdc_op", "_cdc_xid"]
+
+# ============================================================================
+# CONNEXIONS
+# ============================================================================
+
+def get_db_connection():
+    import psycopg2
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    return conn
+
+
+def get_s3_client():
+    import boto3
+
+    s3 = boto3.client("s3", region_name=S3_CONFIG["region"])
+    s3.head_bucket(Bucket=S3_CONFIG["bucket"])
+    return s3
+
+# ============================================================================
+# SLOT DE REPLICATION
+# ============================================================================
+
+def lsn_to_int(lsn):
+    """Convertit un LSN PostgreSQL ('16/B374D848') en entier ordonnable."""
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def ensure_slot(conn):
+    """
+    Crée le slot logique s'il n'existe pas encore.
+
+    Retourne True si le slot vient d'être créé : il ne décode que les
+    changements postérieurs à sa création, l'état antérieur des tables
+    capturées doit être chargé par un instantané complet (prepare_slot).
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT 1 FROM pg_replication_slots WHERE slot_name = %s",
+        (CDC_CONFIG["slot_name"],)
+    )
+    created = cursor.fetchone() is None
+    if created:
+        print(f"Création du slot logique {CDC_CONFIG['slot_name']} ({CDC_CONFIG['plugin']})")
+        cursor.execute(
+            "SELECT pg_create_logical_replication_slot(%s, %s)",
+            (CDC_CONFIG["slot_name"], CDC_CONFIG["plugin"])
+        )
+    cursor.close()
+    return created
+
+
+def prepare_slot():
+    """
+    Crée le slot s'il n'existe pas (nouvelle base, slot supprimé après un
+    rechargement massif par generate_streaming_data1.py --reset).
+
+    Retourne True si le slot vient d'être créé : l'appelant exporte alors
+    les tables capturées en entier (instantané initial). Les changements
+    validés entre la création du slot et la lecture de l'instantané sont
+    aussi relus par le slot ; rejoués par le MERGE (dernier changement par
+    id), ils convergent vers le même état.
+    """
+    conn = get_db_connection()
+    try:
+        return ensure_slot(conn)
+    finally:
+        conn.close()
+
+
+def drop_slot():
+    """
+    Supprime le slot (instantané initial en échec) : le run suivant le
+    recrée et reprend l'instantané, au lieu de ne décoder que les
+    changements postérieurs à un état jamais chargé.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT pg_drop_replication_slot(slot_name)
+            FROM pg_replication_slots
+            WHERE slot_name = %s
+            """,
+            (CDC_CONFIG["slot_name"],)
+        )
+        cursor.close()
+        print(f"Slot {CDC_CONFIG['slot_name']} supprimé")
+    finally:
+        conn.close()
+
+
+def read_changes(conn, tables):
+    """
+    Lit (sans les consommer) les changements en attente dans le slot.
+
+    Retourne (changes, last_lsn) où changes est une liste ordonnée de
+    (lsn, xid, message wal2json décodé) et last_lsn le LSN de fin du COMMIT
+    de la dernière transaction complète (None si aucune). Les changements
+    d'une transaction dont le COMMIT n'a pas été lu (lot coupé par
+    max_changes) sont écartés : ils seront relus au run suivant. Le slot
+    n'est pas avancé ici.
+    """
+    add_tables = ",".join(f"public.{t}" for t in tables)
+
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT lsn::text, xid::text, data
+        FROM pg_logical_slot_peek_changes(
+            %s, NULL, %s,
+            'format-version', '2',
+            'include-xids', '1',
+            'include-transaction', 'true',
+            'include-type-oids', 'false',
+            'add-tables', %s
+        )
+        """,
+        (CDC_CONFIG["slot_name"], CDC_CONFIG["max_changes"], add_tables)
+    )
+
+    changes = []
+    pending = []
+    last_lsn = None
+    for lsn, xid, data in cursor:
+        message = json.loads(data)
+        action = message.get("action")
+        if action == "B":
+            pending = []
+        elif action == "C":
+            # lsn du message COMMIT = fin de la transaction : avancer le slot
+            # jusque-là ne la fera plus jamais décoder
+            changes.extend(pending)
+            pending = []
+            last_lsn = lsn
+        elif action in ("I", "U", "D"):
+            pending.append((lsn, xid, message))
+
+    cursor.close()
+    return changes, last_lsn
+
+
+def advance_slot(conn, lsn):
+    """
+    Confirme la consommation des changements jusqu'à lsn inclus (LSN de fin
+    du COMMIT d'une transaction, voir read_changes).
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT pg_replication_slot_advance(%s, %s::pg_lsn)",
+        (CDC_CONFIG["slot_name"], lsn)
+    )
+    cursor.close()
+
+# ============================================================================
+# MISE EN FORME DES LOTS
+# ============================================================================
+
+def build_batches(changes):
+    """
+    Regroupe les changements par table, dans l'ordre du WAL.
+
+    Pour un DELETE, wal2json ne fournit que l'identité (clé primaire) :
+    les autres colonnes sont laissées vides.
+    """
+    batches = {table: [] for table in CDC_TABLES}
+
+    for seq, (lsn, xid, message) in enumerate(changes):
+        table = message["table"]
+        if table not in CDC_TABLES:
+            continue
+
+        fields = message.get("columns") or message.get("identity") or []
+        values = {field["name"]: field["value"] for field in fields}
+
+        row = [lsn_to_int(lsn), seq, message["action"], message.get("xid", xid)]
+        row.extend(values.get(column) for column in CDC_TABLES[table])
+        batches[table].append(row)
+
+    return batches
+
+
+def batch_to_csv(table, rows):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CDC_META_COLUMNS + CDC_TABLES[table])
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def batch_key(table, date_partition, last_lsn):
+    return (
+        f"raw/postgres_cdc/{table}/"
+        f"{date_partition}/"
+        f"{table}_cdc_{date_partition.replace('-', '')}_{lsn_to_int(last_lsn)}.csv"
+    )
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+
+def export_changes(date_partition, local_dir=None, peek=False):
+    """
+    Exporte un lot de changements par table capturée.
+
+    - local_dir : écrit les fichiers dans ce répertoire au lieu de S3
+    - peek      : n'avance pas le slot (les changements seront relus)
+
+    Retourne la liste des fichiers écrits avec leur nombre de changements.
+    """
+    conn = get_db_connection()
+    written = []
+
+    try:
+        if ensure_slot(conn):
+            print(f"ATTENTION : slot créé, instantané complet nécessaire "
+                  f"(export_to_s3.py --full {' '.join(CDC_TABLES)})")
+        changes, last_lsn = read_changes(conn, list(CDC_TABLES))
+
+        if last_lsn is None:
+            print("Aucune transaction complète en attente dans le slot")
+            return written
+
+        print(f"{len(changes)} changements lus (transactions validées jusqu'au LSN {last_lsn})")
+
+        s3 = None if local_dir else get_s3_client()
+
+        for table, rows in build_batches(changes).items():
+            if not rows:
+                continue
+
+            key = batch_key(table, date_partition, last_lsn)
+            body = batch_to_csv(table, rows)
+
+            if local_dir:
+                path = os.path.join(local_dir, key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    f.write(body)
+                print(f"  {table} : {len(rows)} changements → {path}")
+            else:
+                s3.put_object(Bucket=S3_CONFIG["bucket"], Key=key, Body=body)
+                print(f"  {table} : {len(rows)} changements → s3://{S3_CONFIG['bucket']}/{key}")
+
+            written.append({"table": table, "key": key, "changes": len(rows)})
+
+        # Le slot avance même si les changements lus ne concernaient aucune
+        # table capturée (messages filtrés), pour ne pas les relire.
+        if not peek:
+            advance_slot(conn, last_lsn)
+            print(f"Slot {CDC_CONFIG['slot_name']} avancé jusqu'à {last_lsn}")
+
+    finally:
+        conn.close()
+
+    return written
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Export CDC PostgreSQL → S3 (RAW)")
+    parser.add_argument("--date", default=datetime.now().strftime("%Y-%m-%d"),
+                        help="Date de partition (YYYY-MM-DD)")
+    parser.add_argument("--local-dir", help="Écrit les lots en local au lieu de S3")
+    parser.add_argument("--peek", action="store_true",
+                        help="Lit les changements sans avancer le slot")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("EXPORT CDC STREAMVISION : POSTGRESQL (WAL) → RAW")
+    print("=" * 80)
+
+    try:
+        export_changes(args.date, local_dir=args.local_dir, peek=args.peek)
+    except Exception as e:
+        print(f"ERREUR CDC : {e}")
+        sys.exit(1)
+
+    print("\n" + "=" * 80)
+    print("EXPORT CDC TERMINE")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+dbt_runner.py
+Exécution programmatique de dbt (dbtRunner) - StreamVision
+
+Remplace les appels `python -m dbt ...` en sous-processus :
+- le projet est parsé une seule fois par processus, le Manifest en mémoire
+  est réutilisé pour toutes les commandes suivantes (build, docs, ...)
+- le répertoire target/ est conservé entre les tâches : partial_parse.msgpack
+  permet à dbt de ne reparser que les fichiers modifiés depuis le dernier run
+- les résultats sont renvoyés par nœud (statut, durée, lignes affectées)
+  au lieu de la sortie texte de dbt
+- les artefacts du dernier build sont conservés dans state_dir : le build
+  quotidien ne sélectionne que les modèles modifiés (state:modified+), ceux
+  en aval des sources qui ont reçu de nouvelles données et les nœuds en
+  échec au build précédent (result:error+, result:fail+)
+
+Auteur : StreamVision Data Engineering
+"""
+
+import os
+import shutil
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# ⚠️ MODIFIEZ CES CHEMINS SELON VOTRE INSTALLATION
+DBT_CONFIG = {
+    "project_dir": "/opt/airflow/dbt/streamvision_dbt",
+    "profiles_dir": None,  # None = ~/.dbt ou DBT_PROFILES_DIR
+    "target": None,        # None = target par défaut du profil
+    # Artefacts du dernier build (state:modified+, result:error+, ...)
+    "state_dir": "/opt/airflow/dbt/state",
+}
+
+# Artefacts conservés d'un run à l'autre
+STATE_ARTIFACTS = ["manifest.json", "run_results.json", "sources.json"]
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+class DbtRunner:
+    """
+    Enveloppe dbtRunner avec un Manifest mis en cache.
+
+    Usage :
+        runner = DbtRunner()
+        results = runner.build()
+        runner.invoke(["docs", "generate"])
+    """
+
+    def __init__(self, project_dir=None, profiles_dir=None, target=None, state_dir=None):
+        self.project_dir = project_dir or DBT_CONFIG["project_dir"]
+        self.profiles_dir = profiles_dir or DBT_CONFIG["profiles_dir"]
+        self.target = target or DBT_CONFIG["target"]
+        self.state_dir = state_dir or DBT_CONFIG["state_dir"]
+        self.manifest = None
+
+        if not os.path.exists(self.project_dir):
+            raise FileNotFoundError(f"Projet dbt non trouvé : {self.project_dir}")
+
+    def _common_args(self):
+        args = ["--project-dir", self.project_dir]
+        if self.profiles_dir:
+            args += ["--profiles-dir", self.profiles_dir]
+        if self.target:
+            args += ["--target", self.target]
+        return args
+
+    def _runner(self):
+        from dbt.cli.main import dbtRunner
+
+        return dbtRunner(manifest=self.manifest)
+
+    def parse(self):
+        """Parse le projet (partiellement si target/ est conservé) et garde le Manifest."""
+        if self.manifest is None:
+            result = self._runner().invoke(["parse"] + self._common_args())
+            if not result.success:
+                raise RuntimeError(f"Échec du parsing dbt : {result.exception}")
+            self.manifest = result.result
+        return self.manifest
+
+    def invoke(self, command):
+        """
+        Exécute une commande dbt avec le Manifest en cache.
+
+        Lève une exception si dbt n'a pas pu s'exécuter (erreur de projet,
+        de connexion...). Les échecs de nœuds sont rapportés dans le résultat.
+        """
+        self.parse()
+        result = self._runner().invoke(list(command) + self._common_args())
+        if result.exception is not None:
+            raise RuntimeError(f"Échec de dbt {' '.join(command)} : {result.exception}")
+        return result
+
+    def build(self, select=None, exclude=None, extra_args=None):
+        """
+        dbt build : modèles, tests, snapshots et seeds dans l'ordre du DAG,
+        chaque test s'exécutant dès que son modèle est construit.
+
+        Retourne la liste des résultats par nœud (voir node_results).
+        """
+        command = ["build"]
+        if select:
+            command += ["--select"] + list(select)
+        if exclude:
+            command += ["--exclude"] + list(exclude)
+        command += list(extra_args or [])
+
+        return node_results(self.invoke(command))
+
+    # ------------------------------------------------------------------
+    # Sélection par état (state:modified+, source_status:fresher+)
+    # ------------------------------------------------------------------
+
+    def has_state(self):
+        return os.path.exists(os.path.join(self.state_dir, "manifest.json"))
+
+    def build_changed(self, loaded_tables, full_refresh=False, extra_args=None):
+        """
+        Build limité à ce qui a changé depuis le dernier build :
+        - state:modified+           : modèles dont le code/la config a changé
+        - source:staging.stg_<t>+   : sources rechargées ce jour (manifeste d'export)
+        - source_status:fresher+    : sources plus fraîches qu'au dernier run
+                                      (chargements hors DAG, ex. MERGE CDC)
+        - result:error+, result:fail+, result:skipped+
+                                    : nœuds en erreur, tests en échec et
+                                      nœuds sautés au dernier build
+                                      (run_results.json de l'état), retentés
+                                      même sans changement de code ni de données
+
+        Une source non rechargée n'entraîne pas ses descendants, sauf si une
+        autre de leurs entrées a changé. Sans état précédent, build complet.
+
+        full_refresh : build complet avec --full-refresh (les modèles
+        incrémentaux sont reconstruits depuis tout l'historique).
+        """
+        # Produit target/sources.json (conservé dans l'état pour le run suivant)
+        self.invoke(["source", "freshness"])
+
+        if full_refresh:
+            print("Full refresh demandé : build complet")
+            nodes = self.build(extra_args=["--full-refresh"] + list(extra_args or []))
+        elif not self.has_state():
+            print("Pas d'état dbt précédent : build complet")
+            nodes = self.build(extra_args=extra_args)
+        else:
+            select = ["state:modified+"]
+            select += [f"source:staging.stg_{table}+" for table in sorted(loaded_tables)]
+
+            if os.path.exists(os.path.join(self.state_dir, "sources.json")):
+                select.append("source_status:fresher+")
+
+            # Les modèles sautés derrière un test en échec ne descendent pas
+            # du test dans le graphe : result:skipped+ les reprend
+            if os.path.exists(os.path.join(self.state_dir, "run_results.json")):
+                select += ["result:error+", "result:fail+", "result:skipped+"]
+
+            print(f"Sélection dbt : {' '.join(select)}")
+            nodes = self.build(
+                select=select,
+                extra_args=["--state", self.state_dir] + list(extra_args or []),
+            )
+
+        self.save_state()
+        return nodes
+
+    def save_state(self):
+        """
+        Copie les artefacts du build dans state_dir.
+
+        Appelé après chaque build, en échec compris : le run_results.json
+        conservé porte les nœuds en erreur, que le build suivant retente via
+        result:error+ / result:fail+ / result:skipped+.
+        """
+        target_dir = os.path.join(self.project_dir, "target")
+        os.makedirs(self.state_dir, exist_ok=True)
+        for artifact in STATE_ARTIFACTS:
+            path = os.path.join(target_dir, artifact)
+            if os.path.exists(path):
+                shutil.copy2(path, os.path.join(self.state_dir, artifact))
+
+# ============================================================================
+# RÉSULTATS
+# ============================================================================
+
+def node_results(result):
+    """Convertit un dbtRunnerResult en liste de dictionnaires (sérialisable en XCom)."""
+    execution = result.result
+    nodes = []
+
+    for run_result in getattr(execution, "results", None) or []:
+        timing = {
+            t.name: (t.completed_at - t.started_at).total_seconds()
+            for t in run_result.timing
+            if t.started_at and t.completed_at
+        }
+        adapter_response = run_result.adapter_response or {}
+
+        nodes.append({
+            "unique_id": run_result.node.unique_id,
+            "resource_type": str(run_result.node.resource_type),
+            "status": str(run_result.status),
+            "execution_time": round(run_result.execution_time or 0, 3),
+            "compile_time": round(timing.get("compile", 0), 3),
+            "execute_time": round(timing.get("execute", 0), 3),
+            "rows_affected": adapter_response.get("rows_affected"),
+            "failures": run_result.failures,
+            "message": run_result.message,
+        })
+
+    return nodes
+
+
+def summarize(nodes):
+    """Compte les nœuds par statut."""
+    summary = {}
+    for node in nodes:
+        summary[node["status"]] = summary.get(node["status"], 0) + 1
+    return summary
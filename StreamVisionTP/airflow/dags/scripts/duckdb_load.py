@@ -0,0 +1,162 @@
+"""
+duckdb_load.py
+Chargement local (fichiers exportés) → DuckDB STAGING - StreamVision
+
+Équivalent local de snowflake_load.py pour le profil d'exécution "local" :
+les fichiers écrits par export_to_s3.py --local-dir sont chargés dans un
+fichier DuckDB dont le schéma staging reproduit les tables stg_* de
+Snowflake. Le projet dbt tourne ensuite sur ce fichier (target "local", voir
+dbt/streamvision_dbt/profiles.example.yml).
+
+Même sémantique que le chargement Snowflake :
+1. lecture du CSV dans une table temporaire
+2. validation du nombre de lignes contre l'export
+3. application dans une transaction, une ligne par id, _loaded_at avancé
+   uniquement pour les lignes modifiées (export complet : remplacement de la
+   table ; export incrémental : upsert)
+
+Auteur : StreamVision Data Engineering
+"""
+
+import os
+
+from scripts.snowflake_load import LOAD_FILTERS, STAGING_COLUMNS, staging_table
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# ⚠️ MODIFIEZ CES CHEMINS SELON VOTRE INSTALLATION
+DUCKDB_CONFIG = {
+    # Le nom du fichier donne le nom du catalogue (= base des sources dbt)
+    "path": os.environ.get("STREAMVISION_DUCKDB_PATH", "/opt/airflow/data/streamvision_wh.duckdb"),
+    "schema": "staging",
+    # Racine des exports locaux (export_to_s3.py --local-dir)
+    "raw_dir": os.environ.get("STREAMVISION_RAW_DIR", "/opt/airflow/data"),
+}
+
+# ============================================================================
+# CONNEXION
+# ============================================================================
+
+def get_connection(path=None):
+    import duckdb
+
+    conn = duckdb.connect(path or DUCKDB_CONFIG["path"])
+    conn.execute(f"CREATE SCHEMA IF NOT EXISTS {DUCKDB_CONFIG['schema']}")
+    return conn
+
+# ============================================================================
+# SQL DE CHARGEMENT
+# ============================================================================
+
+def _target(table):
+    return f"{DUCKDB_CONFIG['schema']}.{staging_table(table)}"
+
+
+def _source_sql(table):
+    """
+    Lignes lues à appliquer : filtrées, une par id (la dernière du fichier :
+    rowid suit l'ordre de lecture du CSV).
+    """
+    where = f"WHERE {LOAD_FILTERS[table]}" if table in LOAD_FILTERS else ""
+    return f"""(
+            SELECT {", ".join(STAGING_COLUMNS[table])}
+            FROM landing
+            {where}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY rowid DESC) = 1
+        )"""
+
+
+def _same_row(table):
+    keyed = [c for c in STAGING_COLUMNS[table] if c != "id"]
+    return (
+        f"({', '.join(f't.{c}' for c in keyed)}) IS NOT DISTINCT FROM "
+        f"({', '.join(f's.{c}' for c in keyed)})"
+    )
+
+
+def build_apply_sql(table, mode="full"):
+    """
+    Application de la table temporaire "landing" dans la staging.
+
+    mode : "full" (remplacement de la table) ou "incremental" (upsert)
+    """
+    target = _target(table)
+    columns = ", ".join(STAGING_COLUMNS[table])
+    s_columns = ", ".join(f"s.{c}" for c in STAGING_COLUMNS[table])
+
+    applied = f"""
+        CREATE OR REPLACE TEMP TABLE applied AS
+        SELECT
+            {s_columns},
+            CASE
+                WHEN t.id IS NOT NULL AND {_same_row(table)} THEN t._loaded_at
+                ELSE CURRENT_TIMESTAMP
+            END AS _loaded_at
+        FROM {_source_sql(table)} AS s
+        LEFT JOIN {target} AS t
+          ON t.id = s.id
+        """
+
+    if mode == "full":
+        write = [f"DELETE FROM {target}"]
+    elif mode == "incremental":
+        write = [f"DELETE FROM {target} WHERE id IN (SELECT id FROM applied)"]
+    else:
+        raise ValueError(f"Mode de chargement inconnu : {mode}")
+
+    return [
+        "BEGIN TRANSACTION",
+        applied,
+        *write,
+        f"INSERT INTO {target} ({columns}, _loaded_at) SELECT * FROM applied",
+        "COMMIT",
+        "DROP TABLE IF EXISTS applied",
+    ]
+
+# ============================================================================
+# CHARGEMENT
+# ============================================================================
+
+def load_partition(conn, export_result, date_partition, raw_dir=None):
+    """
+    Charge une partition exportée en local (résultat de export_to_s3.export
+    avec local_dir) dans sa table de staging DuckDB.
+
+    Lève une exception si le nombre de lignes lues diffère de l'export : la
+    staging n'est alors pas modifiée. Retourne le résultat d'export complété
+    (rows_loaded).
+    """
+    table = export_result["table"]
+    if table not in STAGING_COLUMNS:
+        raise ValueError(f"Table de staging inconnue : {table}")
+
+    path = os.path.join(raw_dir or DUCKDB_CONFIG["raw_dir"], export_result["s3_key"])
+
+    conn.execute(
+        "CREATE OR REPLACE TEMP TABLE landing AS "
+        "SELECT * FROM read_csv(?, header = true, auto_detect = true)",
+        [path],
+    )
+
+    # Première exécution : table de staging typée d'après le fichier
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {_target(table)} AS "
+        f"SELECT {', '.join(STAGING_COLUMNS[table])}, "
+        f"CAST(NULL AS TIMESTAMP) AS _loaded_at FROM landing LIMIT 0"
+    )
+
+    rows_loaded = conn.execute("SELECT COUNT(*) FROM landing").fetchone()[0]
+    if rows_loaded != export_result["rows"]:
+        conn.execute("DROP TABLE IF EXISTS landing")
+        raise ValueError(
+            f"{table} : {rows_loaded} lignes lues pour "
+            f"{export_result['rows']} exportées ({path})"
+        )
+
+    for statement in build_apply_sql(table, export_result.get("mode", "full")):
+        conn.execute(statement)
+    conn.execute("DROP TABLE IF EXISTS landing")
+
+    return {**export_result, "rows_loaded": rows_loaded}
@@ -6,16 +6,39 @@ Format:
 - Tables relationnelles → CSV
 - Partitionnement par date (YYYY-MM-DD)
 
+Utilisable :
+- comme bibliothèque (DAG Airflow) : export(TABLES, context['ds'])
+- en ligne de commande : python export_to_s3.py [--date YYYY-MM-DD] [table ...]
+- en local (profil DuckDB, sans S3) : --local-dir /chemin ; les fichiers et
+  les manifestes gardent la même arborescence de clés sous ce répertoire
+
+Manifeste : chaque partition a un manifeste JSON
+(raw/postgres/_manifests/<date>/manifest.json) listant par table le statut,
+le nombre de lignes, la clé S3 et l'empreinte MD5 du contenu. Une table dont
+le contenu est identique à celui déjà chargé la veille n'est pas réécrite
+(statut "unchanged") : rien à charger ni à retransformer en aval.
+
+Export incrémental : viewing_sessions et episode_viewing (partitionnées par
+mois dans PostgreSQL, voir sql_postgres/sql1.sql) ne relisent que les lignes
+postérieures au watermark du dernier export chargé (manifeste de la veille),
+moins une fenêtre de rattrapage : PostgreSQL n'ouvre que les partitions
+récentes. Le résultat porte mode = "incremental" (MERGE en staging au lieu
+d'un remplacement). Sans watermark chargé, ou avec --full, export complet.
+
 Auteur : StreamVision Data Engineering
 """
 
-from datetime import datetime
-import psycopg2
-import pandas as pd
-import boto3
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
 from io import StringIO
 import sys
 
+# psycopg2, pandas et boto3 sont importés dans les fonctions : le DAG importe
+# TABLES au parsing et ne doit pas payer ces imports à chaque cycle.
+
 # ============================================================================
 # CONFIGURATION A MODIFIER
 # ============================================================================
@@ -45,100 +68,313 @@ TABLES = [
     "episode_viewing"
 ]
 
+# Tables exportées en incrémental : colonne de partitionnement PostgreSQL
+INCREMENTAL_TABLES = {
+    "viewing_sessions": "session_start",
+    "episode_viewing": "start_time",
+}
+
+# Fenêtre relue avant le watermark (sessions insérées en retard)
+INCREMENTAL_LOOKBACK = timedelta(days=3)
+
 # ============================================================================
 # CONNEXIONS
 # ============================================================================
 
-def get_db_connection():
-    try:
-        print("Connexion PostgreSQL...")
-        conn = psycopg2.connect(**DB_CONFIG)
-        print("Connexion PostgreSQL réussie")
-        return conn
-    except Exception as e:
-        print(f"ERREUR PostgreSQL : {e}")
-        sys.exit(1)
+def get_db_connection(db_config=None):
+    import psycopg2
+
+    print("Connexion PostgreSQL...")
+    conn = psycopg2.connect(**(db_config or DB_CONFIG))
+    print("Connexion PostgreSQL réussie")
+    return conn
+
+
+def get_s3_client(bucket=None):
+    import boto3
+
+    print("Connexion AWS S3 avec clés locales...")
+    s3 = boto3.client(
+        "s3",
+        region_name=S3_CONFIG["region"],
+    )
+
+    # Vérification du bucket
+    s3.head_bucket(Bucket=bucket or S3_CONFIG["bucket"])
+    print("Connexion S3 réussie")
+    return s3
+
+# ============================================================================
+# STOCKAGE (S3 ou répertoire local)
+# ============================================================================
+
+def put_object(s3, key, body, bucket=None, local_dir=None):
+    """Écrit un objet sur S3, ou sous local_dir/<key>. Retourne l'ETag (S3)."""
+    if local_dir:
+        path = os.path.join(local_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(body)
+        return ""
+
+    response = s3.put_object(Bucket=bucket or S3_CONFIG["bucket"], Key=key, Body=body)
+    return response.get("ETag", "").strip('"')
 
 
-def get_s3_client():
+def get_object(s3, key, bucket=None, local_dir=None):
+    """Lit un objet (None s'il n'existe pas)."""
+    if local_dir:
+        path = os.path.join(local_dir, key)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
     try:
-        print("Connexion AWS S3 avec clés locales...")
-        # Hardcoding the credentials directly into the client
-        s3 = boto3.client(
-            "s3", 
-            region_name=S3_CONFIG["region"],
-        )
-        
-        # Vérification du bucket
-        s3.head_bucket(Bucket=S3_CONFIG["bucket"])
-        print("Connexion S3 réussie")
-        return s3
-    except Exception as e:
-        print(f"ERREUR S3 : {e}")
-        sys.exit(1)
+        response = s3.get_object(Bucket=bucket or S3_CONFIG["bucket"], Key=key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    return response["Body"].read()
 
 # ============================================================================
 # EXPORT TABLE CSV
 # ============================================================================
 
-def export_table_to_s3(table_name, date_partition):
+def s3_key_for(table_name, date_partition):
+    return (
+        f"raw/postgres/{table_name}/"
+        f"{date_partition}/"
+        f"{table_name}_{date_partition.replace('-', '')}.csv"
+    )
+
+
+def manifest_key(date_partition):
+    return f"raw/postgres/_manifests/{date_partition}/manifest.json"
+
+
+def previous_partition(date_partition):
+    day = datetime.strptime(date_partition, "%Y-%m-%d") - timedelta(days=1)
+    return day.strftime("%Y-%m-%d")
+
+
+def read_manifest(s3, date_partition, bucket=None, local_dir=None):
+    """Lit le manifeste d'une partition (None s'il n'existe pas)."""
+    body = get_object(s3, manifest_key(date_partition), bucket, local_dir)
+    return json.loads(body) if body else None
+
+
+def write_manifest(s3, date_partition, results, bucket=None, local_dir=None):
+    """
+    Écrit le manifeste d'une partition à partir des résultats par table.
+
+    Chaque résultat peut porter un champ "loaded" (chargé en staging) ajouté
+    par l'orchestrateur après le chargement.
+    """
+    manifest = {
+        "date_partition": date_partition,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "tables": {result["table"]: result for result in results},
+    }
+    put_object(
+        s3, manifest_key(date_partition),
+        json.dumps(manifest, indent=2, default=str),
+        bucket, local_dir
+    )
+    return manifest
+
+
+def loaded_fingerprints(manifest):
+    """Empreintes des tables dont le contenu est déjà chargé en staging."""
+    if not manifest:
+        return {}
+    return {
+        table: entry["content_md5"]
+        for table, entry in manifest["tables"].items()
+        if entry.get("loaded") and entry.get("content_md5")
+    }
+
+
+def loaded_watermarks(manifest):
+    """Watermarks des tables incrémentales dont l'export est chargé en staging."""
+    if not manifest:
+        return {}
+    return {
+        table: entry["watermark"]
+        for table, entry in manifest["tables"].items()
+        if entry.get("loaded") and entry.get("watermark")
+    }
+
+
+def extract_query(table_name, watermark=None):
+    """
+    Requête d'extraction et ses paramètres.
+
+    Table incrémentale avec watermark : filtre sur la colonne de
+    partitionnement (élagage des partitions PostgreSQL).
+    """
+    column = INCREMENTAL_TABLES.get(table_name)
+    if column is None or watermark is None:
+        return f"SELECT * FROM {table_name}", None
+
+    since = datetime.fromisoformat(watermark) - INCREMENTAL_LOOKBACK
+    return f"SELECT * FROM {table_name} WHERE {column} >= %(since)s", {"since": since}
+
+
+def export_table_to_s3(conn, s3, table_name, date_partition, bucket=None, previous_md5=None,
+                       local_dir=None, watermark=None):
+    """
+    Exporte une table vers S3 en réutilisant la connexion et le client fournis
+    (ou sous local_dir, s3 pouvant alors être None).
+
+    Si previous_md5 correspond au contenu extrait, le fichier n'est pas
+    réécrit et le statut est "unchanged". Pour une table incrémentale,
+    watermark (dernier export chargé) limite l'extraction aux lignes récentes ;
+    le résultat porte le nouveau watermark.
+
+    Retourne un dictionnaire de résultat (sérialisable en XCom). Les erreurs
+    de lecture ou d'upload sont propagées à l'appelant.
+    """
+    import pandas as pd
+
+    bucket = bucket or S3_CONFIG["bucket"]
     print(f"\nExport table : {table_name}")
 
-    conn = get_db_connection()
+    query, params = extract_query(table_name, watermark)
+    mode = "full" if params is None else "incremental"
+    if params:
+        print(f"  Export incrémental : {INCREMENTAL_TABLES[table_name]} >= {params['since']}")
 
-    try:
-        df = pd.read_sql(f"SELECT * FROM {table_name}", conn)
-        print(f"  {len(df)} lignes extraites")
-    except Exception as e:
-        print(f"  ERREUR lecture {table_name} : {e}")
-        conn.close()
-        return
+    df = pd.read_sql(query, conn, params=params)
+    print(f"  {len(df)} lignes extraites")
 
-    conn.close()
+    result = {
+        "table": table_name,
+        "date_partition": date_partition,
+        "rows": len(df),
+        "bucket": bucket,
+        "s3_key": None,
+        "bytes": 0,
+        "status": "empty",
+        "mode": mode,
+    }
+
+    column = INCREMENTAL_TABLES.get(table_name)
+    if column:
+        result["watermark"] = df[column].max().isoformat() if not df.empty else watermark
 
     if df.empty:
         print("  Table vide — skip")
-        return
+        return result
 
     csv_buffer = StringIO()
     df.to_csv(csv_buffer, index=False)
+    body = csv_buffer.getvalue()
+    content_md5 = hashlib.md5(body.encode("utf-8")).hexdigest()
+    result["content_md5"] = content_md5
 
-    s3_key = (
-        f"raw/postgres/{table_name}/"
-        f"{date_partition}/"
-        f"{table_name}_{date_partition.replace('-', '')}.csv"
+    if content_md5 == previous_md5:
+        print("  Contenu identique à la partition déjà chargée — skip")
+        result["status"] = "unchanged"
+        return result
+
+    s3_key = s3_key_for(table_name, date_partition)
+
+    etag = put_object(s3, s3_key, body, bucket, local_dir)
+    if local_dir:
+        print(f"  Écriture OK → {os.path.join(local_dir, s3_key)}")
+    else:
+        print(f"  Upload OK → s3://{bucket}/{s3_key}")
+
+    # S3 est fortement cohérent : la clé retournée ici est lisible
+    # immédiatement, l'aval n'a pas besoin d'attendre le fichier.
+    result.update(
+        s3_key=s3_key,
+        bytes=len(body.encode("utf-8")),
+        etag=etag,
+        status="exported",
     )
+    return result
+
+
+def export(tables=None, date_partition=None, db_config=None, bucket=None, skip_unchanged=False,
+           local_dir=None, full=False):
+    """
+    Exporte les tables demandées vers S3 pour une date de partition.
 
-    s3 = get_s3_client()
+    - tables         : liste de tables (par défaut TABLES)
+    - date_partition : YYYY-MM-DD (par défaut la date du jour)
+    - db_config      : surcharge de DB_CONFIG
+    - bucket         : surcharge du bucket S3
+    - skip_unchanged : compare au manifeste de la veille et ne réécrit pas
+                       les tables dont le contenu chargé est identique
+    - local_dir      : écrit sous ce répertoire au lieu de S3 (profil local)
+    - full           : ignore les watermarks, export complet des tables
+                       incrémentales
 
+    Une seule connexion PostgreSQL et un seul client S3 sont ouverts pour
+    l'ensemble des tables. Retourne la liste des résultats par table.
+    """
+    tables = list(tables or TABLES)
+    date_partition = date_partition or datetime.now().strftime("%Y-%m-%d")
+
+    unknown = [t for t in tables if t not in TABLES]
+    if unknown:
+        raise ValueError(f"Tables inconnues : {', '.join(unknown)}")
+
+    conn = get_db_connection(db_config)
     try:
-        s3.put_object(
-            Bucket=S3_CONFIG["bucket"],
-            Key=s3_key,
-            Body=csv_buffer.getvalue()
-        )
-        print(f"  Upload OK → s3://{S3_CONFIG['bucket']}/{s3_key}")
-    except Exception as e:
-        print(f"  ERREUR upload S3 : {e}")
+        s3 = None if local_dir else get_s3_client(bucket)
+        previous = None
+        if skip_unchanged or (not full and any(t in INCREMENTAL_TABLES for t in tables)):
+            previous = read_manifest(s3, previous_partition(date_partition), bucket, local_dir)
+        fingerprints = loaded_fingerprints(previous) if skip_unchanged else {}
+        watermarks = {} if full else loaded_watermarks(previous)
+        return [
+            export_table_to_s3(
+                conn, s3, table, date_partition, bucket,
+                previous_md5=fingerprints.get(table),
+                local_dir=local_dir,
+                watermark=watermarks.get(table),
+            )
+            for table in tables
+        ]
+    finally:
+        conn.close()
 
 # ============================================================================
 # MAIN
 # ============================================================================
 
 def main():
+    parser = argparse.ArgumentParser(description="Export PostgreSQL → S3 (RAW)")
+    parser.add_argument("--date", default=datetime.now().strftime("%Y-%m-%d"),
+                        help="Date de partition (YYYY-MM-DD)")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="Ne réécrit pas les tables identiques à la veille")
+    parser.add_argument("--local-dir", help="Écrit les fichiers en local au lieu de S3")
+    parser.add_argument("--full", action="store_true",
+                        help="Export complet des tables incrémentales (ignore les watermarks)")
+    parser.add_argument("tables", nargs="*", help="Tables à exporter (défaut : toutes)")
+    args = parser.parse_args()
+
     print("=" * 80)
     print("EXPORT STREAMVISION : POSTGRESQL → AMAZON S3 (RAW)")
     print("=" * 80)
+    print(f"Date de partition : {args.date}")
 
-    date_partition = datetime.now().strftime("%Y-%m-%d")
-    print(f"Date de partition : {date_partition}")
-
-    for table in TABLES:
-        export_table_to_s3(table, date_partition)
+    try:
+        results = export(args.tables or TABLES, args.date, skip_unchanged=args.skip_unchanged,
+                         local_dir=args.local_dir, full=args.full)
+    except Exception as e:
+        print(f"ERREUR EXPORT : {e}")
+        sys.exit(1)
 
     print("\n" + "=" * 80)
     print("EXPORT TERMINE AVEC SUCCES")
     print("=" * 80)
+    for result in results:
+        print(f"  {result['table']:20} : {result['rows']:>10,} lignes "
+              f"({result['status']}, {result['mode']})")
     print(f"Bucket S3 : s3://{S3_CONFIG['bucket']}/raw/postgres/")
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+"""
+profile_local_pipeline.py
+Profilage local du pipeline StreamVision (PostgreSQL → fichiers → DuckDB → dbt)
+
+Exécute les mêmes étapes que le DAG quotidien en profil "local", sans S3 ni
+Snowflake, et mesure la durée de chaque étape :
+1. export   : export_to_s3.export(..., local_dir=...)        (par table)
+2. load     : duckdb_load.load_partition(...)                (par table)
+3. dbt      : dbt build --target local                       (par couche et par nœud)
+
+Usage (depuis airflow/dags/) :
+    STREAMVISION_DUCKDB_PATH=/tmp/sv/streamvision_wh.duckdb \\
+    STREAMVISION_RAW_DIR=/tmp/sv \\
+    python -m scripts.profile_local_pipeline --date 2026-01-05 [--full-refresh] [--json out.json]
+
+Pré-requis : profil dbt "local" (dbt/streamvision_dbt/profiles.example.yml)
+pointant sur le même fichier DuckDB.
+
+Auteur : StreamVision Data Engineering
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+from scripts import duckdb_load
+from scripts.dbt_runner import DbtRunner, summarize
+from scripts.export_to_s3 import TABLES, export
+
+# Couche dbt d'un nœud, d'après le préfixe du nom du modèle
+LAYERS = {
+    "stg_": "staging",
+    "dim_": "core",
+    "fact_": "core",
+    "agg_": "aggregates",
+    "snap_": "snapshots",
+    "mart_": "marts",
+}
+
+# ============================================================================
+# ÉTAPES
+# ============================================================================
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, round(time.perf_counter() - start, 3)
+
+
+def profile_export(tables, date_partition):
+    timings = {}
+    results = []
+    for table in tables:
+        (result,), seconds = timed(
+            export, [table], date_partition, local_dir=duckdb_load.DUCKDB_CONFIG["raw_dir"]
+        )
+        timings[table] = seconds
+        results.append(result)
+    return results, timings
+
+
+def profile_load(results, date_partition):
+    timings = {}
+    conn = duckdb_load.get_connection()
+    try:
+        for result in results:
+            if result["status"] != "exported":
+                continue
+            _, timings[result["table"]] = timed(
+                duckdb_load.load_partition, conn, result, date_partition
+            )
+    finally:
+        conn.close()
+    return timings
+
+
+def node_layer(node):
+    if node["resource_type"] not in ("model", "snapshot"):
+        return "tests"
+    name = node["unique_id"].rsplit(".", 1)[-1]
+    for prefix, layer in LAYERS.items():
+        if name.startswith(prefix):
+            return layer
+    return "other"
+
+
+def profile_dbt(full_refresh=False):
+    runner = DbtRunner(target="local")
+    args = ["--full-refresh"] if full_refresh else []
+    nodes, seconds = timed(runner.build, extra_args=args)
+
+    layers = {}
+    for node in nodes:
+        layer = node_layer(node)
+        layers[layer] = round(layers.get(layer, 0) + node["execution_time"], 3)
+    return nodes, layers, seconds
+
+# ============================================================================
+# RAPPORT
+# ============================================================================
+
+def print_section(title, timings):
+    print(f"\n{title}")
+    print("-" * 60)
+    for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name:40} {seconds:>10.3f}s")
+    print(f"  {'TOTAL':40} {sum(timings.values()):>10.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profilage local du pipeline StreamVision")
+    parser.add_argument("--date", default=datetime.now().strftime("%Y-%m-%d"),
+                        help="Date de partition (YYYY-MM-DD)")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="dbt build --full-refresh")
+    parser.add_argument("--json", help="Écrit les mesures dans ce fichier JSON")
+    parser.add_argument("tables", nargs="*", help="Tables à exporter (défaut : toutes)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("PROFILAGE LOCAL STREAMVISION : POSTGRESQL → FICHIERS → DUCKDB → DBT")
+    print("=" * 80)
+
+    try:
+        results, export_timings = profile_export(args.tables or TABLES, args.date)
+        load_timings = profile_load(results, args.date)
+        nodes, layer_timings, dbt_seconds = profile_dbt(args.full_refresh)
+    except Exception as e:
+        print(f"ERREUR PROFILAGE : {e}")
+        sys.exit(1)
+
+    print_section("1. EXPORT (par table)", export_timings)
+    print_section("2. CHARGEMENT DUCKDB (par table)", load_timings)
+    print_section("3. DBT BUILD (par couche, somme des nœuds)", layer_timings)
+    print(f"  {'MUR (dbt build)':40} {dbt_seconds:>10.3f}s")
+    print_section(
+        "   Nœuds les plus lents",
+        {n["unique_id"]: n["execution_time"]
+         for n in sorted(nodes, key=lambda n: n["execution_time"], reverse=True)[:10]},
+    )
+    print(f"\nRésumé dbt build : {summarize(nodes)}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "date_partition": args.date,
+                "export": export_timings,
+                "load": load_timings,
+                "dbt_layers": layer_timings,
+                "dbt_wall_seconds": dbt_seconds,
+                "dbt_nodes": nodes,
+            }, f, indent=2, default=str)
+        print(f"Mesures écrites dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""
+snowflake_load.py
+Chargement S3 (RAW) → Snowflake STAGING - StreamVision
+
+Génère le SQL de chargement d'une table exportée par export_to_s3.py.
+Les listes de colonnes reprennent l'ordre des CSV exportés (= DDL PostgreSQL,
+voir sql_snowflake/sql5.sql et sql6.sql).
+
+Chargement en trois temps (load_partition) :
+1. COPY du fichier dans une table transiente propre au run
+   (stg_<table>_load_<YYYYMMDD>), ON_ERROR = 'ABORT_STATEMENT' : une ligne
+   rejetée fait échouer le chargement au lieu d'être ignorée
+2. validation : le nombre de lignes copiées doit égaler celui rapporté par
+   l'export (manifeste)
+3. application atomique dans la table de staging, une ligne par id (la
+   dernière du fichier, METADATA$FILE_ROW_NUMBER capturé au COPY) :
+   - export complet     → INSERT OVERWRITE (remplacement atomique de la table)
+   - export incrémental → MERGE dans une transaction
+
+Une ligne n'a son _loaded_at avancé que si son contenu a changé : la staging
+ne contient jamais de doublons, n'a besoin d'aucune passe DELETE et un
+rechargement (retry, backfill) du même fichier ne change rien.
+
+Les tables capturées par CDC (users, subscription_events) sont chargées par
+lots de changements (load_cdc) : COPY dans RAW.<table>_changes puis MERGE
+des changements en attente, comme sql_snowflake/sql7.sql.
+
+Auteur : StreamVision Data Engineering
+"""
+
+from scripts.cdc_export_to_s3 import CDC_META_COLUMNS
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SNOWFLAKE_CONFIG = {
+    "conn_id": "snowflake_default",
+    "warehouse": "LOADING_WH",
+    "database": "STREAMVISION_WH",
+    "schema": "STAGING",
+    "stage": "STREAMVISION_WH.RAW.s3_raw_stage",
+    # Tag des requêtes de chargement (rapport d'élagage, macros/pruning_report.sql)
+    "query_tag": "streamvision_load",
+}
+
+# Colonnes chargées par table de staging (hors _loaded_at)
+STAGING_COLUMNS = {
+    "users": [
+        "id", "email", "username", "first_name", "last_name", "country", "age_group",
+        "subscription_plan", "subscription_start", "subscription_end", "created_at",
+        "last_login", "is_active", "payment_method", "device_preference"
+    ],
+    "content": [
+        "id", "title", "content_type", "genre", "subgenre", "release_year",
+        "duration_minutes", "director", "main_actor", "imdb_rating",
+        "content_rating", "is_original", "added_date", "available_countries",
+        "tags", "description"
+    ],
+    "viewing_sessions": [
+        "id", "user_id", "content_id", "session_start", "session_end", "duration_seconds",
+        "platform", "device_type", "quality", "completion_rate", "buffering_count",
+        "avg_bitrate", "city", "ip_address"
+    ],
+    "ratings": [
+        "id", "user_id", "content_id", "rating", "rating_date", "review_text", "helpful_count"
+    ],
+    "watchlist": [
+        "id", "user_id", "content_id", "added_date", "watched", "watched_date"
+    ],
+    "subscription_events": [
+        "id", "user_id", "event_type", "event_date", "previous_plan", "new_plan",
+        "amount", "currency", "payment_gateway", "transaction_id"
+    ],
+    "search_queries": [
+        "id", "user_id", "query_text", "search_date", "results_count",
+        "clicked_content_id", "search_filters", "session_id"
+    ],
+    "episodes": [
+        "id", "tv_show_id", "season_number", "episode_number", "title",
+        "duration_minutes", "release_date", "director", "imdb_rating", "description"
+    ],
+    "episode_viewing": [
+        "id", "viewing_session_id", "episode_id", "user_id", "start_time", "end_time",
+        "duration_watched", "completion_rate"
+    ],
+}
+
+FILE_FORMAT = "(TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '\"' SKIP_HEADER = 1)"
+
+# Lignes écartées au chargement (ex-tâche clean_staging_data). Elles sont
+# comptées dans la validation : seules les lignes copiées doivent correspondre
+# à l'export.
+LOAD_FILTERS = {
+    "viewing_sessions": "duration_seconds IS NULL OR duration_seconds > 0",
+}
+
+# ============================================================================
+# SQL DE CHARGEMENT
+# ============================================================================
+
+def staging_table(table):
+    return f"stg_{table}"
+
+
+def qualified(name):
+    """
+    Nom complet STREAMVISION_WH.STAGING.<name> : chaque hook.run / get_first
+    ouvre une nouvelle session, un USE SCHEMA ne vaut que pour son lot.
+    """
+    return f"{SNOWFLAKE_CONFIG['database']}.{SNOWFLAKE_CONFIG['schema']}.{name}"
+
+
+def _use_warehouse():
+    return f"USE WAREHOUSE {SNOWFLAKE_CONFIG['warehouse']}"
+
+
+def stage_path(s3_key):
+    """
+    raw/postgres/users/2026-01-05/users_20260105.csv
+    → ("postgres/users/2026-01-05/", "users_20260105.csv")
+    """
+    prefix, file_name = s3_key.rsplit("/", 1)
+    if prefix.startswith("raw/"):
+        prefix = prefix[len("raw/"):]
+    return prefix + "/", file_name
+
+
+def load_table(table, date_partition):
+    """Table transiente d'atterrissage du COPY, propre au run (nom complet)."""
+    return qualified(f"{staging_table(table)}_load_{date_partition.replace('-', '')}")
+
+
+def _column_list(columns, prefix="", indent=12, per_line=6):
+    """Liste de colonnes sur plusieurs lignes (6 par ligne)."""
+    names = [f"{prefix}{column}" for column in columns]
+    return (",\n" + " " * indent).join(
+        ", ".join(names[i:i + per_line]) for i in range(0, len(names), per_line)
+    )
+
+
+def _source_sql(table, landing):
+    """
+    Lignes de la table d'atterrissage à appliquer : filtrées, une par id.
+
+    Pour un id en double, la dernière ligne du fichier l'emporte : le choix
+    est le même à chaque rechargement du fichier.
+    """
+    where = f"WHERE {LOAD_FILTERS[table]}" if table in LOAD_FILTERS else ""
+    return f"""(
+            SELECT *
+            FROM {landing}
+            {where}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _file_row DESC) = 1
+        )"""
+
+
+def _row_hash(table, alias):
+    keyed = [c for c in STAGING_COLUMNS[table] if c != "id"]
+    return f"""HASH(
+                {_column_list(keyed, f"{alias}.", 16)}
+            )"""
+
+
+def build_copy_sql(table, s3_key, date_partition):
+    """
+    Préparation et COPY dans la table d'atterrissage du run.
+
+    Le COPY cible exactement le fichier rapporté par l'export (FILES = ...) :
+    pas de listing du préfixe ni d'attente de fichiers. FORCE = TRUE : la
+    table est recréée à chaque tentative, un retry recharge le même fichier.
+    Le numéro de ligne dans le fichier est conservé (_file_row) pour le
+    dédoublonnage (_source_sql).
+    """
+    if table not in STAGING_COLUMNS:
+        raise ValueError(f"Table de staging inconnue : {table}")
+
+    landing = load_table(table, date_partition)
+    path, file_name = stage_path(s3_key)
+    positions = [f"${i}" for i in range(1, len(STAGING_COLUMNS[table]) + 1)]
+
+    return [
+        _use_warehouse(),
+        f"CREATE OR REPLACE TRANSIENT TABLE {landing} LIKE {qualified(staging_table(table))}",
+        f"ALTER TABLE {landing} ADD COLUMN _file_row NUMBER",
+        f"""
+        COPY INTO {landing} (
+            {_column_list(STAGING_COLUMNS[table])},
+            _file_row
+        )
+        FROM (
+            SELECT
+                {_column_list(positions, indent=16)},
+                METADATA$FILE_ROW_NUMBER
+            FROM @{SNOWFLAKE_CONFIG['stage']}/{path}
+        )
+        FILES = ('{file_name}')
+        FILE_FORMAT = {FILE_FORMAT}
+        ON_ERROR = 'ABORT_STATEMENT'
+        FORCE = TRUE
+        """,
+    ]
+
+
+def build_replace_sql(table, date_partition):
+    """
+    Remplacement atomique de la table de staging (export complet).
+
+    INSERT OVERWRITE vide et recharge la table dans une seule transaction :
+    les lecteurs voient l'ancienne ou la nouvelle version, jamais un état
+    intermédiaire ; les lignes supprimées à la source disparaissent. La
+    table garde ses droits, sa clé de clustering et son search optimization
+    (contrairement à un SWAP avec une table reconstruite).
+    """
+    target = qualified(staging_table(table))
+    columns = STAGING_COLUMNS[table]
+
+    return f"""
+        INSERT OVERWRITE INTO {target} (
+            {_column_list(columns)},
+            _loaded_at
+        )
+        SELECT
+            {_column_list(columns, "s.")},
+            -- Ligne inchangée : on garde son horodatage de chargement
+            CASE
+                WHEN t.id IS NOT NULL
+                 AND {_row_hash(table, "t")} = {_row_hash(table, "s")}
+                THEN t._loaded_at
+                ELSE CURRENT_TIMESTAMP()
+            END
+        FROM {_source_sql(table, load_table(table, date_partition))} AS s
+        LEFT JOIN {target} AS t
+          ON t.id = s.id
+        """
+
+
+def build_merge_sql(table, date_partition):
+    """
+    MERGE de la table d'atterrissage dans la staging (export incrémental).
+
+    UPDATE uniquement si le contenu diffère (HASH des colonnes) : _loaded_at
+    n'avance que pour les lignes réellement modifiées.
+    """
+    columns = STAGING_COLUMNS[table]
+    keyed = [c for c in columns if c != "id"]
+    assignments = [f"{c} = s.{c}" for c in keyed] + ["_loaded_at = CURRENT_TIMESTAMP()"]
+
+    return f"""
+        MERGE INTO {qualified(staging_table(table))} AS t
+        USING {_source_sql(table, load_table(table, date_partition))} AS s
+        ON t.id = s.id
+        WHEN MATCHED AND {_row_hash(table, "t")} <> {_row_hash(table, "s")} THEN UPDATE SET
+            {_column_list(assignments, per_line=3)}
+        WHEN NOT MATCHED THEN INSERT (
+            {_column_list(columns)},
+            _loaded_at
+        ) VALUES (
+            {_column_list(columns, "s.")},
+            CURRENT_TIMESTAMP()
+        )
+        """
+
+
+def build_apply_sql(table, date_partition, mode="full"):
+    """
+    Application atomique de la table d'atterrissage dans la staging.
+
+    mode : "full" (export complet, INSERT OVERWRITE) ou "incremental" (MERGE)
+
+    La table d'atterrissage n'est pas supprimée ici : load_partition la
+    supprime dans tous les cas, succès ou échec.
+    """
+    if mode == "full":
+        apply_sql = build_replace_sql(table, date_partition)
+    elif mode == "incremental":
+        apply_sql = build_merge_sql(table, date_partition)
+    else:
+        raise ValueError(f"Mode de chargement inconnu : {mode}")
+
+    return [
+        _use_warehouse(),
+        "BEGIN",
+        apply_sql,
+        "COMMIT",
+    ]
+
+# ============================================================================
+# CHARGEMENT
+# ============================================================================
+
+def load_partition(hook, export_result, date_partition):
+    """
+    Charge une partition exportée (résultat de export_to_s3.export) :
+    COPY → validation du nombre de lignes → application atomique.
+
+    - hook : SnowflakeHook (ou tout hook DB-API exposant run / get_first)
+
+    Lève une exception si le COPY rejette une ligne, si le nombre de lignes
+    copiées diffère de l'export ou si l'application échoue : la staging n'est
+    alors pas modifiée (la transaction ouverte est annulée à la fermeture de
+    la session). La table d'atterrissage est supprimée dans tous les cas.
+    Retourne le résultat d'export complété (rows_loaded).
+    """
+    table = export_result["table"]
+    landing = load_table(table, date_partition)
+
+    try:
+        hook.run(build_copy_sql(table, export_result["s3_key"], date_partition))
+
+        rows_loaded = hook.get_first(f"SELECT COUNT(*) FROM {landing}")[0]
+        if rows_loaded != export_result["rows"]:
+            raise ValueError(
+                f"{table} : {rows_loaded} lignes copiées pour "
+                f"{export_result['rows']} exportées ({export_result['s3_key']})"
+            )
+
+        hook.run(build_apply_sql(table, date_partition, export_result.get("mode", "full")))
+    finally:
+        hook.run(f"DROP TABLE IF EXISTS {landing}")
+
+    return {**export_result, "rows_loaded": rows_loaded}
+
+# ============================================================================
+# CHARGEMENT CDC (users, subscription_events)
+# ============================================================================
+#
+# Tables d'atterrissage RAW.<table>_changes et streams RAW.<table>_changes_pending
+# créés par sql_snowflake/sql7.sql. Colonnes des lots : CDC_META_COLUMNS puis
+# STAGING_COLUMNS (cdc_export_to_s3.py).
+
+
+def changes_table(table):
+    return f"{SNOWFLAKE_CONFIG['database']}.RAW.{table}_changes"
+
+
+def pending_stream(table):
+    return f"{changes_table(table)}_pending"
+
+
+def build_cdc_copy_sql(table):
+    """
+    COPY des lots CDC de la table (tout le préfixe postgres_cdc/<table>/).
+
+    Pas de FORCE : les métadonnées de chargement écartent les fichiers déjà
+    copiés, seul le nouveau lot est chargé. Un lot écrit un jour où le COPY
+    a échoué est repris au run suivant, quelle que soit sa date de partition.
+    """
+    if table not in STAGING_COLUMNS:
+        raise ValueError(f"Table de staging inconnue : {table}")
+
+    return [
+        _use_warehouse(),
+        f"""
+        COPY INTO {changes_table(table)} (
+            {_column_list(CDC_META_COLUMNS + STAGING_COLUMNS[table])}
+        )
+        FROM @{SNOWFLAKE_CONFIG['stage']}/postgres_cdc/{table}/
+        FILE_FORMAT = (TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '"' SKIP_HEADER = 1 EMPTY_FIELD_AS_NULL = TRUE)
+        ON_ERROR = 'ABORT_STATEMENT'
+        """,
+    ]
+
+
+def build_cdc_merge_sql(table):
+    """
+    MERGE des changements en attente (stream) dans la staging, comme
+    sql_snowflake/sql7.sql : pour chaque id présent dans le stream, seul son
+    dernier changement connu (ordre WAL) est appliqué. Le stream est consommé
+    au COMMIT ; un MERGE en échec laisse les changements en attente.
+    """
+    columns = STAGING_COLUMNS[table]
+    keyed = [c for c in columns if c != "id"]
+    assignments = [f"{c} = c.{c}" for c in keyed] + ["_loaded_at = CURRENT_TIMESTAMP()"]
+
+    merge_sql = f"""
+        MERGE INTO {qualified(staging_table(table))} AS t
+        USING (
+            SELECT *
+            FROM {changes_table(table)}
+            WHERE id IN (SELECT id FROM {pending_stream(table)})
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _cdc_lsn DESC, _cdc_seq DESC) = 1
+        ) AS c
+        ON t.id = c.id
+        WHEN MATCHED AND c._cdc_op = 'D' THEN DELETE
+        WHEN MATCHED AND {_row_hash(table, "t")} <> {_row_hash(table, "c")} THEN UPDATE SET
+            {_column_list(assignments, per_line=3)}
+        WHEN NOT MATCHED AND c._cdc_op <> 'D' THEN INSERT (
+            {_column_list(columns)},
+            _loaded_at
+        ) VALUES (
+            {_column_list(columns, "c.")},
+            CURRENT_TIMESTAMP()
+        )
+        """
+
+    return [
+        _use_warehouse(),
+        "BEGIN",
+        merge_sql,
+        "COMMIT",
+    ]
+
+
+def build_cdc_reset_sql(tables):
+    """
+    Recrée les streams des tables capturées avant un instantané initial :
+    les changements en attente d'un ancien slot, antérieurs à l'instantané,
+    ne doivent pas être rejoués par-dessus.
+    """
+    return [_use_warehouse()] + [
+        f"CREATE OR REPLACE STREAM {pending_stream(table)} "
+        f"ON TABLE {changes_table(table)} APPEND_ONLY = TRUE"
+        for table in tables
+    ]
+
+
+def load_cdc(hook, table):
+    """
+    Charge les nouveaux lots CDC d'une table et les applique à la staging :
+    COPY → MERGE des changements en attente.
+
+    Retourne le nombre de changements appliqués (0 : rien en attente).
+    """
+    hook.run(build_cdc_copy_sql(table))
+
+    pending = hook.get_first(f"SELECT COUNT(*) FROM {pending_stream(table)}")[0]
+    if pending:
+        hook.run(build_cdc_merge_sql(table))
+
+    return pending
@@ -4,16 +4,16 @@ DAG Airflow pour le pipeline quotidien StreamVision
 
 Ce DAG orchestre :
 1. Extraction PostgreSQL vers S3
-2. Chargement S3 vers Snowflake Staging
-3. Transformations dbt (staging vers core vers marts)
-4. Tests de qualité dbt
-5. Rafraîchissement des données Power BI (via API)
+2. Chargement S3 vers Snowflake Staging (users et subscription_events : CDC)
+3. Transformations et tests de qualité dbt (dbt build : staging vers core vers marts)
+4. Rafraîchissement des données Power BI (via API)
 
 Emplacement : airflow/dags/streamvision_daily_pipeline.py
 Auteur : Data Engineering Team - StreamVision
 Date : 2025-11-27
 """
 
+import os
 from datetime import datetime, timedelta
 from airflow import DAG
 # OLD
@@ -25,17 +25,35 @@ from airflow import DAG
 from airflow.providers.standard.operators.python import PythonOperator
 from airflow.providers.standard.operators.bash import BashOperator
 from airflow.providers.standard.operators.empty import EmptyOperator
-from airflow.providers.amazon.aws.sensors.s3 import S3KeySensor
 # Use the generic SQL operator for Snowflake (best practice in newer Airflow)
 # Updated imports for modern Airflow providers
 from airflow.providers.common.sql.operators.sql import SQLExecuteQueryOperator as SnowflakeOperator
 from airflow.providers.common.sql.operators.sql import SQLExecuteQueryOperator as PostgresOperator
+from airflow.sdk import task, task_group
 import pendulum
 
+from scripts.cdc_export_to_s3 import CDC_TABLES
+from scripts.export_to_s3 import TABLES
+
 # ============================================================================
 # CONFIGURATION DU DAG
 # ============================================================================
 
+# Profil d'exécution :
+# - "snowflake" : production (S3 → Snowflake, dbt target par défaut)
+# - "local"     : exports dans un répertoire local, chargement DuckDB et dbt
+#                 target "local" (scripts/duckdb_load.py), pour profiler le
+#                 pipeline de bout en bout sur une seule machine
+EXECUTION_PROFILE = os.environ.get('STREAMVISION_PROFILE', 'snowflake')
+LOCAL_PROFILE = EXECUTION_PROFILE == 'local'
+
+# Tables exportées en entier ou par watermark (task group mappé). En
+# production, les tables mises à jour en place (users, subscription_events)
+# passent par le CDC (tâche cdc_export_merge) : un export complet suivi d'un
+# INSERT OVERWRITE écraserait chaque nuit les MERGE des changements. Le
+# profil local (DuckDB, sans slot wal2json) les exporte en entier.
+BATCH_TABLES = TABLES if LOCAL_PROFILE else [t for t in TABLES if t not in CDC_TABLES]
+
 default_args = {
     'owner': 'data_engineering',
     'depends_on_past': False,
@@ -57,6 +75,9 @@ dag = DAG(
     max_active_runs=1,
     tags=['production', 'daily', 'streamvision', 'data_pipeline'],
     catchup=False,
+    # Déclenchement manuel avec {"full_refresh": true} pour reconstruire les
+    # modèles incrémentaux dbt depuis tout l'historique
+    params={'full_refresh': False},
     doc_md="""# Pipeline quotidien StreamVision
     ...
     """
@@ -66,171 +87,264 @@ dag = DAG(
 # TÂCHES PYTHON PERSONNALISÉES
 # ============================================================================
 
-def extract_postgres_to_s3(**context):
+def local_raw_dir():
+    """Répertoire des exports en profil local (None en production)."""
+    if not LOCAL_PROFILE:
+        return None
+    from scripts.duckdb_load import DUCKDB_CONFIG
+    return DUCKDB_CONFIG['raw_dir']
+
+def dbt_runner():
+    from scripts.dbt_runner import DbtRunner
+    return DbtRunner(target='local' if LOCAL_PROFILE else None)
+
+def snowflake_hook():
+    from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
+    from scripts.snowflake_load import SNOWFLAKE_CONFIG
+
+    return SnowflakeHook(
+        snowflake_conn_id=SNOWFLAKE_CONFIG['conn_id'],
+        session_parameters={'QUERY_TAG': SNOWFLAKE_CONFIG['query_tag']},
+    )
+
+def extract_table_to_s3(table, **context):
     """
-    Extrait les données PostgreSQL et les pousse dans S3
-    
-    Utilise le script Python : StreamVisionTP/scripts/export_to_s3.py
+    Extrait une table PostgreSQL et la pousse dans S3
+
+    Appelle directement la bibliothèque d'export (dags/scripts/export_to_s3.py)
+    dans le processus de la tâche : pas de nouvel interpréteur, les erreurs
+    remontent telles quelles et la partition suit la date logique du run.
+
+    Retourne le résultat de la table (poussé en XCom), dont la clé S3 exacte
+    écrite. Une table vide, ou identique à la partition chargée la veille
+    (manifeste d'export), saute la suite de sa chaîne (rien à charger).
     """
-    import subprocess
-    import sys
-    import os
-    
+    from airflow.exceptions import AirflowSkipException
+    from scripts.export_to_s3 import export
+
     execution_date = context['ds']  # Date d'exécution (YYYY-MM-DD)
-    
-    print(f"🚀 Extraction PostgreSQL vers S3 pour {execution_date}")
-    
-    # Chemin absolu vers le script d'export
-    # ⚠️ MODIFIEZ CE CHEMIN SELON VOTRE INSTALLATION
-    script_path = '/opt/airflow/dags/scripts/export_to_s3.py'
-    
-    if not os.path.exists(script_path):
-        raise FileNotFoundError(f"Script non trouvé : {script_path}")
-    
-    # Construction de la commande
-    cmd = [sys.executable, script_path]
-    
-    # Exécution
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        cwd=os.path.dirname(script_path)
+
+    print(f"🚀 Extraction PostgreSQL vers S3 : {table} pour {execution_date}")
+
+    result = export([table], execution_date, skip_unchanged=True, local_dir=local_raw_dir())[0]
+
+    print(f"  {result['table']:20} : {result['rows']:>10,} lignes ({result['status']})")
+
+    if result['status'] in ('empty', 'unchanged'):
+        raise AirflowSkipException(f"Table {table} {result['status']} : rien à charger")
+
+    print(f"✅ Export {table} → {result['s3_key']}")
+    return result
+
+def load_table_to_staging(export_result, **context):
+    """
+    Charge la partition exportée d'une table dans sa table Snowflake STAGING
+
+    COPY dans une table transiente propre au run, validation du nombre de
+    lignes contre l'export, puis application atomique dédupliquée par id
+    (scripts/snowflake_load.py). Un échec laisse la staging intacte ; un
+    retry ou un backfill recharge exactement le même fichier.
+    """
+    from scripts.snowflake_load import load_partition, staging_table
+
+    table = export_result['table']
+
+    print(f"📥 Chargement {export_result['s3_key']} → {staging_table(table)}")
+
+    if LOCAL_PROFILE:
+        from scripts import duckdb_load
+
+        conn = duckdb_load.get_connection()
+        try:
+            result = duckdb_load.load_partition(conn, export_result, context['ds'])
+        finally:
+            conn.close()
+    else:
+        result = load_partition(snowflake_hook(), export_result, context['ds'])
+
+    print(f"✅ {staging_table(table).upper()} chargé ({result['rows_loaded']:,} lignes)")
+    return {**result, 'loaded': True}
+
+def export_and_merge_cdc(**context):
+    """
+    Réplique les tables capturées par CDC (users, subscription_events) dans
+    leurs tables Snowflake STAGING
+
+    1. Slot absent (première exécution, base rechargée) : création du slot
+       puis instantané initial, export complet des tables capturées et
+       INSERT OVERWRITE de leur staging. Les streams de changements sont
+       recréés avant : des changements d'un ancien slot ne sont pas rejoués
+       par-dessus l'instantané. En cas d'échec, le slot est supprimé et le
+       retry reprend l'instantané.
+    2. Export des changements validés depuis le dernier run
+       (scripts/cdc_export_to_s3.py) puis, par table, COPY des nouveaux lots
+       et MERGE des changements en attente (scripts/snowflake_load.py).
+
+    Retourne les tables modifiées ce jour (sélection dbt en aval).
+    """
+    from scripts.cdc_export_to_s3 import drop_slot, export_changes, prepare_slot
+    from scripts.export_to_s3 import export
+    from scripts.snowflake_load import build_cdc_reset_sql, load_cdc, load_partition, staging_table
+
+    execution_date = context['ds']
+    tables = list(CDC_TABLES)
+    hook = snowflake_hook()
+    changed = set()
+
+    if prepare_slot():
+        print(f"📸 Slot CDC créé : instantané initial de {', '.join(tables)}")
+        try:
+            hook.run(build_cdc_reset_sql(tables))
+            for result in export(tables, execution_date, full=True):
+                if result['status'] == 'exported':
+                    load_partition(hook, result, execution_date)
+                    changed.add(result['table'])
+                    print(f"  {staging_table(result['table']).upper()} : {result['rows']:,} lignes")
+        except Exception:
+            drop_slot()
+            raise
+
+    print(f"🔁 Export des changements CDC pour {execution_date}")
+    for batch in export_changes(execution_date):
+        print(f"  {batch['table']:20} : {batch['changes']:>10,} changements → {batch['key']}")
+
+    # Toutes les tables, même sans nouveau lot : un lot chargé par un run en
+    # échec est repris ici
+    for table in tables:
+        merged = load_cdc(hook, table)
+        if merged:
+            changed.add(table)
+        print(f"  {staging_table(table).upper()} : {merged:,} changements appliqués")
+
+    print(f"✅ CDC appliqué ({len(changed)} tables modifiées)")
+    return sorted(changed)
+
+def publish_export_manifest(**context):
+    """
+    Écrit le manifeste d'export de la partition du jour
+
+    Rassemble les résultats de toutes les tables (instances mappées), que
+    leur chargement ait réussi ou non (trigger_rule all_done) :
+    - chargées ce jour                   → status "exported", loaded = True
+    - exportées mais chargement en échec → status "exported", loaded = False
+                                           (pas de XCom de load_staging)
+    - identiques à la veille, vides ou en échec d'extraction
+                                         → entrée de la veille reportée si
+                                           elle existe (status "unchanged",
+                                           watermark conservé)
+
+    Retourne la liste des tables rechargées (sélection dbt en aval).
+    """
+    from scripts.export_to_s3 import (
+        get_s3_client, loaded_fingerprints, loaded_watermarks,
+        previous_partition, read_manifest, write_manifest,
     )
-    
-    print(f"Sortie standard:\n{result.stdout}")
-    
-    if result.stderr:
-        print(f"Sortie d'erreur:\n{result.stderr}")
-    
-    if result.returncode != 0:
-        raise Exception(f"Échec de l'export PostgreSQL → S3. Code de retour: {result.returncode}")
-    
-    print(f"✅ Export PostgreSQL → S3 terminé avec succès pour {execution_date}")
 
-def run_dbt_models(**context):
+    execution_date = context['ds']
+    ti = context['ti']
+
+    extracted = ti.xcom_pull(task_ids='table_pipeline.extract_postgres_to_s3') or []
+    loaded = ti.xcom_pull(task_ids='table_pipeline.load_staging') or []
+
+    results = {r['table']: {**r, 'loaded': False} for r in extracted if r}
+    results.update({r['table']: r for r in loaded if r})
+
+    local_dir = local_raw_dir()
+    s3 = None if local_dir else get_s3_client()
+    previous = read_manifest(s3, previous_partition(execution_date), local_dir=local_dir) or {'tables': {}}
+    unchanged = loaded_fingerprints(previous)
+    watermarks = loaded_watermarks(previous)
+
+    for table in BATCH_TABLES:
+        if table not in results and (table in unchanged or table in watermarks):
+            results[table] = {
+                **previous['tables'][table],
+                'date_partition': execution_date,
+                'status': 'unchanged',
+            }
+
+    write_manifest(s3, execution_date, list(results.values()), local_dir=local_dir)
+
+    reloaded = sorted(t for t, r in results.items() if r['status'] == 'exported' and r['loaded'])
+    print(f"📋 Manifeste {execution_date} : {len(reloaded)} tables rechargées {reloaded}")
+    return reloaded
+
+def run_dbt_build(**context):
     """
-    Exécute les transformations dbt
-    
-    Utilise la commande : dbt run --project-dir [chemin]
+    Exécute les transformations et les tests dbt (dbt build)
+
+    Les modèles et leurs tests s'enchaînent dans l'ordre du DAG dbt : un
+    modèle en échec saute ses descendants au lieu de les construire sur des
+    données invalides. Retourne les résultats par nœud (XCom).
+
+    Seuls les modèles modifiés et ceux en aval des sources rechargées ce jour
+    (manifeste d'export, tables modifiées par le CDC) sont construits : un
+    jour calme ne coûte presque rien.
+    Le paramètre de run full_refresh force un build complet --full-refresh.
     """
-    import subprocess
-    import os
-    import sys
-    
-    print("🔄 Exécution des modèles dbt...")
-    
-    # Chemin vers le projet dbt
-    # ⚠️ MODIFIEZ CE CHEMIN SELON VOTRE INSTALLATION
-    dbt_project_dir = "/opt/airflow/dbt/streamvision_dbt"
-    
-    if not os.path.exists(dbt_project_dir):
-        raise FileNotFoundError(f"Projet dbt non trouvé : {dbt_project_dir}")
-    
-    # Commande dbt
-    cmd = [
-    sys.executable,
-    "-m",
-    "dbt",
-    "run",
-    "--project-dir",
-    dbt_project_dir
-]
+    from scripts.dbt_runner import summarize
 
-    
-    # Exécution
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        cwd=dbt_project_dir
+    print("🔄 Exécution de dbt build (modèles + tests)...")
+
+    ti = context['ti']
+    reloaded = sorted(
+        set(ti.xcom_pull(task_ids='publish_export_manifest') or [])
+        | set(ti.xcom_pull(task_ids='cdc_export_merge') or [])
     )
-    
-    print(f"Sortie dbt:\n{result.stdout[:500]}...")  # Affiche les 500 premiers caractères
-    
-    if result.stderr:
-        print(f"Erreurs dbt:\n{result.stderr}")
-    
-    if result.returncode != 0:
+
+    runner = dbt_runner()
+    nodes = runner.build_changed(
+        reloaded,
+        full_refresh=bool(context['params'].get('full_refresh')),
+    )
+
+    for node in sorted(nodes, key=lambda n: n['execution_time'], reverse=True)[:10]:
+        print(f"  {node['unique_id']:60} {node['status']:8} {node['execution_time']:>8.1f}s")
+
+    summary = summarize(nodes)
+    print(f"Résumé dbt build : {summary}")
+
+    failed = [n for n in nodes if n['status'] in ('error', 'fail')]
+    if failed:
         # On ne fait pas échouer le DAG pour les erreurs dbt, mais on log
-        print(f"⚠️ Attention: dbt run a retourné le code {result.returncode}")
+        print(f"⚠️ Attention: {len(failed)} nœuds dbt en échec")
+        for node in failed:
+            print(f"  ❌ {node['unique_id']} : {node['message']}")
         # Vous pourriez envoyer une alerte ici
-    
-    print("✅ Transformations dbt terminées")
 
-def run_dbt_tests(**context):
+    print("✅ dbt build terminé")
+    return nodes
+
+def report_pruning(**context):
     """
-    Exécute les tests de qualité dbt
+    Rapport d'élagage des micro-partitions (partitions lues / totales) des
+    chargements et builds dbt des dernières 24 h, par query_tag
+
+    Macro dbt pruning_report (Snowflake uniquement). Informatif : un échec
+    ne bloque pas le pipeline.
     """
-    import subprocess
-    import os
-    import sys
-    
-    print("🧪 Exécution des tests dbt...")
-    
-    dbt_project_dir = "/opt/airflow/dbt/streamvision_dbt"
-    cmd = [
-    sys.executable,
-    "-m",
-    "dbt",
-    "test",
-    "--project-dir",
-    dbt_project_dir
-]
+    print("✂️ Rapport d'élagage des requêtes de chargement et de build...")
 
-    
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        cwd=dbt_project_dir
-    )
-    
-    print(f"Résultats tests:\n{result.stdout}")
-    
-    if result.stderr:
-        print(f"Erreurs tests:\n{result.stderr}")
-    
-    # Les tests peuvent échouer sans faire échouer le DAG
-    if result.returncode != 0:
-        print(f"⚠️ Certains tests dbt ont échoué (code: {result.returncode})")
-        # Envoyer une notification d'avertissement
-    
-    print("✅ Tests dbt terminés")
+    try:
+        dbt_runner().invoke(["run-operation", "pruning_report", "--args", "{hours: 24}"])
+    except RuntimeError as e:
+        print(f"⚠️ Échec du rapport d'élagage: {e}")
+    else:
+        print("✅ Rapport d'élagage généré")
 
 def generate_dbt_docs(**context):
     """
     Génère la documentation dbt
     """
-    import subprocess
-    import os
-    import sys
-    
     print("📚 Génération de la documentation dbt...")
-    
-    dbt_project_dir = '/opt/airflow/dbt/streamvision_dbt'
-    cmd = [
-    sys.executable,
-    "-m",
-    "dbt",
-    "docs",
-    "generate",
-    "--project-dir",
-    dbt_project_dir
-]
-    
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        cwd=dbt_project_dir
-    )
-    
-    if result.returncode != 0:
-        print(f"⚠️ Échec de génération de la documentation: {result.stderr}")
+
+    try:
+        dbt_runner().invoke(["docs", "generate"])
+    except RuntimeError as e:
+        print(f"⚠️ Échec de génération de la documentation: {e}")
     else:
         print("✅ Documentation dbt générée")
-        
+
         # Optionnel : déployer la documentation quelque part
         # (GitHub Pages, S3, serveur web, etc.)
 
@@ -312,163 +426,111 @@ end_task = EmptyOperator(
     dag=dag
 )
 
-# Tâche 1 : Extraction PostgreSQL → S3
-task_extract = PythonOperator(
-    task_id='extract_postgres_to_s3',
-    python_callable=extract_postgres_to_s3,
-    dag=dag
-)
-
-# Tâches 2 : Attente des fichiers dans S3 (Sensors)
-task_wait_s3_users = S3KeySensor(
-    task_id='wait_s3_users_file',
-    bucket_name='streamvision-data-raw',  # ⚠️ MODIFIEZ
-    bucket_key='raw/postgres/users/{{ ds }}/users_{{ ds_nodash }}.csv',
-    aws_conn_id='aws_default',
-    timeout=600,  # 10 minutes
-    poke_interval=30,  # Vérifie toutes les 30 secondes
-    mode='poke',
-    dag=dag
-)
-
-task_wait_s3_viewing_sessions = S3KeySensor(
-    task_id='wait_s3_viewing_sessions_file',
-    bucket_name='streamvision-data-raw',  # ⚠️ MODIFIEZ
-    bucket_key='raw/postgres/viewing_sessions/{{ ds }}/viewing_sessions_{{ ds_nodash }}.csv',
-    aws_conn_id='aws_default',
-    timeout=600,
-    poke_interval=30,
-    mode='poke',
-    dag=dag
-)
-
-# Tâches 3 : Chargement S3 → Snowflake STAGING
-task_load_staging_users = SnowflakeOperator(
-    task_id='load_staging_users',
-    conn_id='snowflake_default',
-    sql="""
-        USE WAREHOUSE LOADING_WH;
-        USE SCHEMA STREAMVISION_WH.STAGING;
-        
-        -- Truncate et chargement incrémental
-        DELETE FROM stg_users WHERE DATE(_loaded_at) = '{{ ds }}';
-        
-        COPY INTO stg_users (
-            id, email, username, first_name, last_name, country, age_group,
-            subscription_plan, subscription_start, subscription_end, created_at,
-            last_login, is_active, payment_method, device_preference
-        )
-        FROM @STREAMVISION_WH.RAW.s3_raw_stage/postgres/users/{{ ds }}/
-        FILE_FORMAT = (TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '\"' SKIP_HEADER = 1)
-        ON_ERROR = 'CONTINUE';
-        
-        SELECT 'STG_USERS chargé : ' || COUNT(*) || ' nouvelles lignes' 
-        FROM stg_users 
-        WHERE DATE(_loaded_at) = '{{ ds }}';
-    """,
-    dag=dag
-)
-
-task_load_staging_viewing_sessions = SnowflakeOperator(
-    task_id='load_staging_viewing_sessions',
-    conn_id='snowflake_default',
-    sql="""
-        USE WAREHOUSE LOADING_WH;
-        USE SCHEMA STREAMVISION_WH.STAGING;
-        
-        DELETE FROM stg_viewing_sessions WHERE DATE(_LOADED_AT) = '{{ ds }}';
-        
-        COPY INTO stg_viewing_sessions (
-            id, user_id, content_id, session_start, session_end, duration_seconds,
-            platform, device_type, quality, completion_rate, buffering_count, avg_bitrate,
-            city, ip_address
-        )
-        FROM @STREAMVISION_WH.RAW.s3_raw_stage/postgres/viewing_sessions/{{ ds }}/
-        FILE_FORMAT = (TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '\"' SKIP_HEADER = 1)
-        PATTERN = '.*viewing_sessions.*\\.csv'
-        ON_ERROR = 'CONTINUE';
-        
-        SELECT 'STG_VIEWING_SESSIONS chargé : ' || COUNT(*) || ' nouvelles lignes' 
-        FROM stg_viewing_sessions 
-        WHERE DATE(_LOADED_AT) = '{{ ds }}';
-    """,
-    dag=dag
-)
+# Tâches 1 et 2 : une chaîne extraction → chargement STAGING par table
+# exportée (task group mappé sur BATCH_TABLES). Les tables s'exécutent en parallèle
+# et sont relancées indépendamment : le chemin critique est la table la plus
+# lente, pas la somme des tables.
+#
+# Pas de S3KeySensor : l'export tourne dans la tâche et rapporte la clé exacte
+# qu'il vient d'écrire (S3 est fortement cohérent). Un sensor en mode 'poke'
+# tiendrait un slot du LocalExecutor par table pendant jusqu'à 10 minutes.
+@task_group(group_id='table_pipeline')
+def table_pipeline(table):
+    # Tâche 1 : Extraction PostgreSQL → S3
+    extracted = task(
+        extract_table_to_s3,
+        task_id='extract_postgres_to_s3',
+    )(table=table)
+
+    # Tâche 2 : Chargement du fichier rapporté S3 → Snowflake STAGING
+    # En profil local, toutes les tables écrivent dans le même fichier DuckDB
+    # (un seul écrivain à la fois) : chargements sérialisés, les extractions
+    # restent parallèles
+    task(
+        load_table_to_staging,
+        task_id='load_staging',
+        max_active_tis_per_dag=1 if LOCAL_PROFILE else None,
+    )(export_result=extracted)
+
+with dag:
+    task_tables = table_pipeline.expand(table=BATCH_TABLES)
+
+# Tâche 2 bis : CDC des tables mises à jour en place (users, subscription_events)
+if LOCAL_PROFILE:
+    # Exportées en entier par table_pipeline en profil local
+    task_cdc = EmptyOperator(
+        task_id='cdc_export_merge',
+        dag=dag
+    )
+else:
+    task_cdc = PythonOperator(
+        task_id='cdc_export_merge',
+        python_callable=export_and_merge_cdc,
+        dag=dag
+    )
 
-# Tâche 4 : Nettoyage des données dans STAGING
-task_clean_staging_data = SnowflakeOperator(
-    task_id='clean_staging_data',
-    conn_id='snowflake_default',
-    sql="""
-        USE WAREHOUSE TRANSFORM_WH;
-        USE SCHEMA STREAMVISION_WH.STAGING;
-        
-        -- Suppression des doublons dans stg_users
-        DELETE FROM stg_users 
-        WHERE _LOADED_AT IN (
-            SELECT _LOADED_AT 
-            FROM (
-                SELECT _LOADED_AT,
-                       ROW_NUMBER() OVER (PARTITION BY id ORDER BY _LOADED_AT DESC) as rn
-                FROM stg_users
-                WHERE DATE(_LOADED_AT) = '{{ ds }}'
-            ) t
-            WHERE t.rn > 1
-        );
-        
-        -- Nettoyage des sessions avec durée invalide
-        DELETE FROM stg_viewing_sessions 
-        WHERE duration_seconds <= 0 
-        AND DATE(_loaded_at) = '{{ ds }}';
-        
-        SELECT 'Données staging nettoyées' AS message;
-    """,
+# Tâche 3 : Manifeste d'export (tables rechargées ce jour)
+task_publish_manifest = PythonOperator(
+    task_id='publish_export_manifest',
+    python_callable=publish_export_manifest,
+    # Tables sautées (vides, inchangées) ou en échec : le manifeste s'écrit
+    # quand même et dbt construit les tables chargées
+    trigger_rule='all_done',
     dag=dag
 )
 
-# Tâche 5 : Exécution de dbt
-task_dbt_run = PythonOperator(
-    task_id='dbt_run_models',
-    python_callable=run_dbt_models,
+# Tâche 4 : dbt build (modèles + tests entrelacés)
+task_dbt_build = PythonOperator(
+    task_id='dbt_build_models',
+    python_callable=run_dbt_build,
     dag=dag
 )
 
-# Tâche 6 : Tests dbt
-task_dbt_test = PythonOperator(
-    task_id='dbt_test_models',
-    python_callable=run_dbt_tests,
+# Tâche 5 : Rapport d'élagage (partitions lues vs totales)
+task_report_pruning = PythonOperator(
+    task_id='report_pruning',
+    python_callable=report_pruning,
     dag=dag
 )
 
-# Tâche 7 : Documentation dbt
+# Tâche 6 : Documentation dbt
 task_dbt_docs = PythonOperator(
     task_id='dbt_generate_docs',
     python_callable=generate_dbt_docs,
     dag=dag
 )
 
-# Tâche 8 : Rafraîchissement des vues matérialisées (optionnel)
-task_refresh_views = SnowflakeOperator(
-    task_id='refresh_materialized_views',
-    conn_id='snowflake_default',
-    sql="""
-        USE WAREHOUSE BI_WH;
-
-        SELECT 
-            'Materialized views auto-refreshed by Snowflake' AS message;
-    """,
-    dag=dag
-)
+# Tâche 7 : Rafraîchissement des vues matérialisées (optionnel)
+if LOCAL_PROFILE:
+    # Pas de Snowflake en profil local
+    task_refresh_views = EmptyOperator(
+        task_id='refresh_materialized_views',
+        dag=dag
+    )
+else:
+    task_refresh_views = SnowflakeOperator(
+        task_id='refresh_materialized_views',
+        conn_id='snowflake_default',
+        sql="""
+            USE WAREHOUSE BI_WH;
+
+            SELECT 
+                'Materialized views auto-refreshed by Snowflake' AS message;
+        """,
+        dag=dag
+    )
 
 
-# Tâche 9 : Notification
+# Tâche 8 : Notification
 task_notification = PythonOperator(
     task_id='send_success_notification',
     python_callable=send_slack_notification,
+    # Tables sautées (vides, inchangées) admises, pas de chargement en échec
+    trigger_rule='none_failed',
     dag=dag
 )
 
-# Tâche 10 : Log de fin
+# Tâche 9 : Log de fin
 task_log_completion = BashOperator(
     task_id='log_pipeline_completion',
     bash_command='echo "Pipeline StreamVision terminé avec succès le $(date)"',
@@ -479,30 +541,30 @@ task_log_completion = BashOperator(
 # DÉFINITION DES DÉPENDANCES (DAG)
 # ============================================================================
 
-# Phase 1 : Extraction
-start_task >> task_extract
+# Phases 1 et 2 : Extraction → chargement, par table ; CDC en parallèle
+start_task >> task_tables
+start_task >> task_cdc
 
-# Phase 2 : Attente des fichiers S3
-task_extract >> [task_wait_s3_users, task_wait_s3_viewing_sessions]
+# Phase 3 : Manifeste d'export
+task_tables >> task_publish_manifest
+task_cdc >> task_publish_manifest
 
-# Phase 3 : Chargement vers Snowflake
-task_wait_s3_users >> task_load_staging_users
-task_wait_s3_viewing_sessions >> task_load_staging_viewing_sessions
+# Phase 4 : Transformations dbt
+# (pas de nettoyage post-chargement : le MERGE du chargement déduplique)
+task_publish_manifest >> task_dbt_build
+task_dbt_build >> task_report_pruning
+task_report_pruning >> task_dbt_docs
 
-# Phase 4 : Nettoyage
-[task_load_staging_users, task_load_staging_viewing_sessions] >> task_clean_staging_data
-
-# Phase 5 : Transformations dbt
-task_clean_staging_data >> task_dbt_run
-task_dbt_run >> task_dbt_test
-task_dbt_test >> task_dbt_docs
-
-# Phase 6 : Post-traitement
+# Phase 5 : Post-traitement
 task_dbt_docs >> task_refresh_views
 task_refresh_views >> task_notification
+# Un chargement en échec ne bloque ni le manifeste ni dbt (all_done), mais
+# empêche la notification de succès : le run reste en échec
+task_tables >> task_notification
+task_cdc >> task_notification
 task_notification >> task_log_completion
 
-# Phase 7 : Fin
+# Phase 6 : Fin
 task_log_completion >> end_task
 
 # ============================================================================
@@ -513,24 +575,24 @@ DAG Structure:
 
 start_pipeline
     ↓
-extract_postgres_to_s3
-    ↓
-wait_s3_users_file     wait_s3_viewing_sessions_file
-    ↓                           ↓
-load_staging_users     load_staging_viewing_sessions
-            \         /
-             \       /
-        clean_staging_data
+table_pipeline (mappé sur BATCH_TABLES, en parallèle)       cdc_export_merge
+    [content]   [viewing_sessions]   ...   [episode_viewing]   (users, subscription_events :
+    extract_postgres_to_s3                                      instantané si slot créé,
+        ↓  (clé S3 exacte en XCom, pas de sensor)               lots WAL → COPY → MERGE)
+    load_staging                                                    |
+            \         /                                             |
+             \       /                                              |
+        publish_export_manifest  ←──────────────────────────────────┘
                 ↓
-        dbt_run_models
+        dbt_build_models
                 ↓
-        dbt_test_models
+        report_pruning
                 ↓
         dbt_generate_docs
                 ↓
         refresh_materialized_views
                 ↓
-        send_success_notification
+        send_success_notification   (+ table_pipeline, cdc_export_merge : aucun échec)
                 ↓
         log_pipeline_completion
                 ↓
@@ -0,0 +1,73 @@
+-- Analyse : profil des builds de marts avant / après bascule
+-- Compile avec : dbt compile --select mart_query_profile
+-- puis exécuter le SQL compilé (target/compiled/...) dans Snowflake.
+--
+-- Avant la bascule, les marts lisaient les vues de staging ; après, elles
+-- lisent les tables core (fact_viewing_sessions clusterisé sur date_key,
+-- rollups, dimensions). On compare volume scanné et élagage de
+-- micro-partitions.
+--
+-- Les builds d'avant la bascule ne portent pas de query_tag (ajouté avec
+-- elle) : un build est reconnu à sa relation cible (<schéma>_marts.mart_*),
+-- et classé d'après les schémas qu'il lit (_staging. avant, _core. après).
+-- Un build incrémental est une vue temporaire mart_*__dbt_tmp (qui porte la
+-- requête sur les sources) puis un MERGE : ses requêtes sont regroupées par
+-- session et par mart.
+--
+-- Fenêtre d'historique (jours, 90 par défaut) :
+--   dbt compile --select mart_query_profile --vars '{profile_days: 180}'
+
+WITH mart_statements AS (
+    SELECT
+        q.session_id,
+        REGEXP_REPLACE(
+            REGEXP_SUBSTR(
+                LOWER(q.query_text),
+                '(table|view|into|from)\\s+[a-z0-9_."]*_marts"?\\."?(mart_[a-z_]+)',
+                1, 1, 'e', 2
+            ),
+            '__dbt_tmp$', ''
+        ) AS mart,
+        DATE(q.start_time) AS run_date,
+        CONTAINS(LOWER(q.query_text), '_staging.') AS reads_staging,
+        CONTAINS(LOWER(q.query_text), '_core.') AS reads_core,
+        q.total_elapsed_time / 1000 AS elapsed_seconds,
+        q.bytes_scanned,
+        q.partitions_scanned,
+        q.partitions_total
+    FROM snowflake.account_usage.query_history AS q
+    WHERE q.query_type IN ('CREATE_TABLE_AS_SELECT', 'CREATE_VIEW', 'INSERT', 'MERGE', 'DELETE')
+      AND q.execution_status = 'SUCCESS'
+      AND q.start_time >= DATEADD(day, -{{ var('profile_days', 90) }}, CURRENT_TIMESTAMP())
+),
+
+mart_builds AS (
+    SELECT
+        mart,
+        run_date,
+        CASE
+            WHEN BOOLOR_AGG(reads_core) THEN 'after (core tables)'
+            WHEN BOOLOR_AGG(reads_staging) THEN 'before (staging views)'
+        END AS period,
+        SUM(elapsed_seconds) AS elapsed_seconds,
+        SUM(bytes_scanned) AS bytes_scanned,
+        SUM(partitions_scanned) AS partitions_scanned,
+        SUM(partitions_total) AS partitions_total
+    FROM mart_statements
+    WHERE mart IS NOT NULL
+    GROUP BY session_id, mart, run_date
+)
+
+SELECT
+    mart,
+    period,
+    COUNT(DISTINCT run_date) AS runs,
+    ROUND(AVG(elapsed_seconds), 1) AS avg_elapsed_seconds,
+    ROUND(AVG(bytes_scanned) / POWER(1024, 3), 3) AS avg_gb_scanned,
+    ROUND(AVG(partitions_scanned), 0) AS avg_partitions_scanned,
+    ROUND(AVG(partitions_total), 0) AS avg_partitions_total,
+    ROUND(100 * SUM(partitions_scanned) / NULLIF(SUM(partitions_total), 0), 1) AS pct_partitions_scanned
+FROM mart_builds
+WHERE period IS NOT NULL
+GROUP BY mart, period
+ORDER BY mart, period DESC
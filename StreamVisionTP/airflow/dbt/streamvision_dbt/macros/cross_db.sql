@@ -0,0 +1,56 @@
+{#
+  SQL spécifique à l'adaptateur.
+
+  Le projet tourne sur Snowflake (production) et sur DuckDB (profil local
+  "local", voir profiles.example.yml) : les fonctions dont la syntaxe diffère
+  passent par adapter.dispatch, default__ = Snowflake.
+#}
+
+{# Horodatage courant (dbt_updated_at) #}
+{% macro current_ts() %}
+  {{ return(adapter.dispatch('current_ts')()) }}
+{% endmacro %}
+
+{% macro default__current_ts() %}CURRENT_TIMESTAMP(){% endmacro %}
+
+{% macro duckdb__current_ts() %}CURRENT_TIMESTAMP{% endmacro %}
+
+{# Nombre de lignes vérifiant une condition (agrégat) #}
+{% macro count_if(condition) %}
+  {{ return(adapter.dispatch('count_if')(condition)) }}
+{% endmacro %}
+
+{% macro default__count_if(condition) %}COUNT_IF({{ condition }}){% endmacro %}
+
+{% macro duckdb__count_if(condition) %}COUNT(*) FILTER (WHERE {{ condition }}){% endmacro %}
+
+{#
+  Stratégie des modèles incrémentaux fusionnés sur une clé : MERGE sur
+  Snowflake, delete+insert ailleurs (même résultat sur unique_key).
+  Évalué au parsing : utilisable dans config().
+#}
+{% macro merge_strategy() %}
+  {%- if target.type == 'snowflake' -%}
+    {{ return('merge') }}
+  {%- else -%}
+    {{ return('delete+insert') }}
+  {%- endif -%}
+{% endmacro %}
+
+{# Jour de la semaine ISO (1 = lundi ... 7 = dimanche) #}
+{% macro iso_day_of_week(expr) %}
+  {{ return(adapter.dispatch('iso_day_of_week')(expr)) }}
+{% endmacro %}
+
+{% macro default__iso_day_of_week(expr) %}DAYOFWEEKISO({{ expr }}){% endmacro %}
+
+{% macro duckdb__iso_day_of_week(expr) %}ISODOW({{ expr }}){% endmacro %}
+
+{# Numéro de semaine ISO #}
+{% macro iso_week(expr) %}
+  {{ return(adapter.dispatch('iso_week')(expr)) }}
+{% endmacro %}
+
+{% macro default__iso_week(expr) %}WEEKISO({{ expr }}){% endmacro %}
+
+{% macro duckdb__iso_week(expr) %}WEEKOFYEAR({{ expr }}){% endmacro %}
@@ -0,0 +1,57 @@
+{#
+  Comptes distincts approximés par sketches HyperLogLog.
+
+  Un sketch (état HLL) se stocke dans une colonne et se fusionne avec d'autres
+  sketches : les utilisateurs distincts d'une semaine ou d'un mois se calculent
+  à partir des états quotidiens, sans relire les sessions.
+
+  Mode exact (audits) : dbt build --vars '{exact_distinct: true}'
+  → COUNT(DISTINCT ...) sur le rollup au lieu de l'estimation HLL.
+#}
+
+{# État HLL d'une expression (agrégat) #}
+{% macro hll_accumulate(expr) %}
+  {{ return(adapter.dispatch('hll_accumulate')(expr)) }}
+{% endmacro %}
+
+{% macro default__hll_accumulate(expr) %}HLL_ACCUMULATE({{ expr }}){% endmacro %}
+
+{# Fusion d'états HLL (agrégat), résultat = état HLL #}
+{% macro hll_combine(state) %}
+  {{ return(adapter.dispatch('hll_combine')(state)) }}
+{% endmacro %}
+
+{% macro default__hll_combine(state) %}HLL_COMBINE({{ state }}){% endmacro %}
+
+{# Estimation du nombre de valeurs distinctes d'un état HLL (scalaire) #}
+{% macro hll_estimate(state) %}
+  {{ return(adapter.dispatch('hll_estimate')(state)) }}
+{% endmacro %}
+
+{% macro default__hll_estimate(state) %}HLL_ESTIMATE({{ state }}){% endmacro %}
+
+{# Fusion + estimation (agrégat) #}
+{% macro hll_merge_estimate(state) %}{{ hll_estimate(hll_combine(state)) }}{% endmacro %}
+
+{#
+  Compte distinct, exact ou approximé selon var('exact_distinct') :
+  - exact_expr : expression dont on compte les valeurs distinctes
+  - state      : colonne d'états HLL équivalente
+#}
+{% macro distinct_count(exact_expr, state) %}
+  {%- if var('exact_distinct', false) -%}
+    COUNT(DISTINCT {{ exact_expr }})
+  {%- else -%}
+    {{ hll_merge_estimate(state) }}
+  {%- endif -%}
+{% endmacro %}
+
+{#
+  DuckDB (profil local) : pas de type HLL. L'état est la liste des valeurs
+  distinctes ; les comptes sont exacts, les fusions restent possibles.
+#}
+{% macro duckdb__hll_accumulate(expr) %}LIST(DISTINCT {{ expr }}){% endmacro %}
+
+{% macro duckdb__hll_combine(state) %}LIST_DISTINCT(FLATTEN(LIST({{ state }}) FILTER (WHERE {{ state }} IS NOT NULL))){% endmacro %}
+
+{% macro duckdb__hll_estimate(state) %}LEN({{ state }}){% endmacro %}
@@ -0,0 +1,70 @@
+{#
+  Rapport d'élagage des micro-partitions (Snowflake) : partitions lues vs
+  partitions totales des requêtes de chargement et de build des dernières
+  heures, par query_tag et type de requête, puis les requêtes qui élaguent
+  le moins.
+
+  dbt run-operation pruning_report --args '{hours: 24}'
+
+  Source : snowflake.account_usage.query_history (latence jusqu'à 45 min :
+  les requêtes les plus récentes apparaissent au rapport suivant).
+#}
+{% macro pruning_report(hours=24, min_partitions=10) %}
+
+  {% if target.type != 'snowflake' %}
+    {{ log("pruning_report : disponible sur Snowflake uniquement (target " ~ target.type ~ ")", info=True) }}
+    {{ return(none) }}
+  {% endif %}
+
+  {% set window %}
+    start_time >= DATEADD('hour', -{{ hours }}, CURRENT_TIMESTAMP())
+    AND database_name = '{{ target.database | upper }}'
+    AND query_tag LIKE 'streamvision%'
+    AND execution_status = 'SUCCESS'
+    AND partitions_total >= {{ min_partitions }}
+  {% endset %}
+
+  {% set by_tag %}
+    SELECT
+        query_tag,
+        query_type,
+        COUNT(*) AS queries,
+        SUM(partitions_scanned) AS partitions_scanned,
+        SUM(partitions_total) AS partitions_total,
+        ROUND(100 * (1 - SUM(partitions_scanned) / NULLIF(SUM(partitions_total), 0)), 1) AS pruned_pct,
+        ROUND(SUM(bytes_scanned) / POWER(1024, 3), 2) AS gb_scanned
+    FROM snowflake.account_usage.query_history
+    WHERE {{ window }}
+    GROUP BY query_tag, query_type
+    ORDER BY partitions_scanned DESC
+  {% endset %}
+
+  {% set worst %}
+    SELECT
+        query_id,
+        query_tag,
+        partitions_scanned,
+        partitions_total,
+        ROUND(100 * (1 - partitions_scanned / partitions_total), 1) AS pruned_pct,
+        REGEXP_SUBSTR(query_text, '(stg|fact|dim|agg|mart|snap)_[a-z_]+') AS relation
+    FROM snowflake.account_usage.query_history
+    WHERE {{ window }}
+    ORDER BY partitions_scanned / partitions_total DESC, partitions_scanned DESC
+    LIMIT 10
+  {% endset %}
+
+  {{ log("Élagage des " ~ hours ~ " dernières heures (par query_tag / type)", info=True) }}
+  {% for row in run_query(by_tag) %}
+    {{ log("  " ~ row['QUERY_TAG'] ~ " " ~ row['QUERY_TYPE'] ~ " : " ~ row['QUERIES'] ~ " requêtes, "
+           ~ row['PARTITIONS_SCANNED'] ~ "/" ~ row['PARTITIONS_TOTAL'] ~ " partitions lues ("
+           ~ row['PRUNED_PCT'] ~ " % élaguées, " ~ row['GB_SCANNED'] ~ " Go)", info=True) }}
+  {% endfor %}
+
+  {{ log("Requêtes qui élaguent le moins", info=True) }}
+  {% for row in run_query(worst) %}
+    {{ log("  " ~ row['QUERY_ID'] ~ " " ~ row['QUERY_TAG'] ~ " " ~ row['RELATION'] ~ " : "
+           ~ row['PARTITIONS_SCANNED'] ~ "/" ~ row['PARTITIONS_TOTAL'] ~ " ("
+           ~ row['PRUNED_PCT'] ~ " % élaguées)", info=True) }}
+  {% endfor %}
+
+{% endmacro %}
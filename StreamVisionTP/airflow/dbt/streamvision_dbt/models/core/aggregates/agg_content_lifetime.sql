@@ -0,0 +1,104 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy=merge_strategy(),
+    unique_key='content_key',
+    cluster_by=['content_key'],
+    on_schema_change='append_new_columns',
+    tags=['core', 'aggregate', 'content']
+) }}
+
+-- État cumulé par contenu (lifetime) : sommes, comptes et sketch HLL des
+-- spectateurs distincts (macros/hll.sql).
+-- En incrémental, seuls les faits chargés après le dernier état sont
+-- agrégés, puis repliés dans l'état stocké des contenus touchés (voir
+-- agg_user_lifetime) : sommes et comptes additionnés, sketches HLL fusionnés.
+-- dim_content dérive ses moyennes et son nombre de spectateurs de cet état.
+
+WITH
+session_totals AS (
+    SELECT
+        content_key,
+        COUNT(*) AS session_count,
+        SUM(duration_seconds) AS total_watch_time_seconds,
+        SUM(completion_rate) AS sum_completion_rate,
+        COUNT(completion_rate) AS completion_rate_count,
+        {{ hll_accumulate('user_key') }} AS viewers_hll,
+        0 AS rating_count,
+        0 AS sum_rating,
+        0 AS five_star_ratings,
+        MAX(_loaded_at) AS _max_session_loaded_at,
+        CAST(NULL AS TIMESTAMP) AS _max_rating_loaded_at
+    FROM {{ ref('fact_viewing_sessions') }}
+    {% if is_incremental() %}
+    WHERE _loaded_at > (
+        SELECT COALESCE(MAX(_max_session_loaded_at), CAST('1900-01-01' AS TIMESTAMP)) FROM {{ this }}
+    )
+    {% endif %}
+    GROUP BY content_key
+),
+
+rating_totals AS (
+    SELECT
+        content_id AS content_key,
+        0 AS session_count,
+        0 AS total_watch_time_seconds,
+        0 AS sum_completion_rate,
+        0 AS completion_rate_count,
+        NULL AS viewers_hll,
+        COUNT(*) AS rating_count,
+        SUM(rating_value) AS sum_rating,
+        {{ count_if('rating_value = 5') }} AS five_star_ratings,
+        CAST(NULL AS TIMESTAMP) AS _max_session_loaded_at,
+        MAX(_loaded_at) AS _max_rating_loaded_at
+    FROM {{ ref('fact_ratings') }}
+    {% if is_incremental() %}
+    WHERE _loaded_at > (
+        SELECT COALESCE(MAX(_max_rating_loaded_at), CAST('1900-01-01' AS TIMESTAMP)) FROM {{ this }}
+    )
+    {% endif %}
+    GROUP BY content_id
+),
+
+combined AS (
+    SELECT * FROM session_totals
+    UNION ALL
+    SELECT * FROM rating_totals
+    {% if is_incremental() %}
+    -- État stocké des contenus touchés, replié avec les deltas
+    UNION ALL
+    SELECT
+        content_key,
+        session_count,
+        total_watch_time_seconds,
+        sum_completion_rate,
+        completion_rate_count,
+        viewers_hll,
+        rating_count,
+        sum_rating,
+        five_star_ratings,
+        _max_session_loaded_at,
+        _max_rating_loaded_at
+    FROM {{ this }}
+    WHERE content_key IN (
+        SELECT content_key FROM session_totals
+        UNION
+        SELECT content_key FROM rating_totals
+    )
+    {% endif %}
+)
+
+SELECT
+    content_key,
+    SUM(session_count) AS session_count,
+    SUM(total_watch_time_seconds) AS total_watch_time_seconds,
+    SUM(sum_completion_rate) AS sum_completion_rate,
+    SUM(completion_rate_count) AS completion_rate_count,
+    {{ hll_combine('viewers_hll') }} AS viewers_hll,
+    SUM(rating_count) AS rating_count,
+    SUM(sum_rating) AS sum_rating,
+    SUM(five_star_ratings) AS five_star_ratings,
+    MAX(_max_session_loaded_at) AS _max_session_loaded_at,
+    MAX(_max_rating_loaded_at) AS _max_rating_loaded_at,
+    {{ current_ts() }} AS dbt_updated_at
+FROM combined
+GROUP BY content_key
@@ -0,0 +1,60 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='date_key',
+    cluster_by=['date_key'],
+    on_schema_change='append_new_columns',
+    tags=['core', 'aggregate', 'viewing_sessions']
+) }}
+
+-- Rollup quotidien partagé par les marts.
+-- Grain : date × utilisateur × contenu × plateforme × qualité.
+-- Les mesures sont additives (sommes, comptes) et les utilisateurs distincts
+-- et contenus distincts sont portés par des sketches HLL fusionnables
+-- (macros/hll.sql) : les marts agrègent ce rollup
+-- au lieu de rescanner fact_viewing_sessions chacun de leur côté.
+-- En incrémental, seules les dates touchées par les sessions chargées depuis
+-- le dernier build sont recalculées (journées remplacées entières).
+
+{% if is_incremental() %}
+WITH affected_dates AS (
+    SELECT DISTINCT date_key
+    FROM {{ ref('fact_viewing_sessions') }}
+    WHERE _loaded_at > (
+        SELECT {{ dbt.dateadd('day', -var('fact_lookback_days'), 'MAX(_max_loaded_at)') }}
+        FROM {{ this }}
+    )
+)
+
+{% endif %}
+SELECT
+    f.date_key,
+    f.user_key,
+    f.content_key,
+    f.platform,
+    f.quality,
+
+    COUNT(*) AS session_count,
+    SUM(f.duration_seconds) AS total_watch_time_seconds,
+    SUM(f.completion_rate) AS sum_completion_rate,
+    COUNT(f.completion_rate) AS completion_rate_count,
+    SUM(f.buffering_count) AS sum_buffering_count,
+    COUNT(f.buffering_count) AS buffering_count_count,
+    MIN(f.session_start) AS first_session_start,
+    MAX(f.session_start) AS last_session_start,
+
+    {{ hll_accumulate('f.user_key') }} AS users_hll,
+    {{ hll_accumulate('f.content_key') }} AS content_hll,
+
+    MAX(f._loaded_at) AS _max_loaded_at,
+    {{ current_ts() }} AS dbt_updated_at
+FROM {{ ref('fact_viewing_sessions') }} AS f
+{% if is_incremental() %}
+WHERE f.date_key IN (SELECT date_key FROM affected_dates)
+{% endif %}
+GROUP BY
+    f.date_key,
+    f.user_key,
+    f.content_key,
+    f.platform,
+    f.quality
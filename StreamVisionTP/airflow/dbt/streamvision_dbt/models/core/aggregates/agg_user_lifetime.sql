@@ -0,0 +1,116 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy=merge_strategy(),
+    unique_key='user_key',
+    cluster_by=['user_key'],
+    on_schema_change='append_new_columns',
+    tags=['core', 'aggregate', 'users']
+) }}
+
+-- État cumulé par utilisateur (lifetime) : sommes, comptes, min/max.
+-- En incrémental, seuls les faits chargés après le dernier état (_loaded_at
+-- au-delà des watermarks) sont agrégés, puis repliés dans l'état stocké des
+-- utilisateurs touchés : sommes et comptes additionnés, min/max combinés.
+-- L'historique des faits n'est jamais relu : le coût d'un build dépend du
+-- volume chargé, pas de l'historique.
+-- Une ligne de fait modifiée ou supprimée à la source n'est pas retirée de
+-- l'état (une modification est ajoutée une seconde fois) : un build
+-- --full-refresh reconstruit l'état exact.
+-- dim_users dérive ses moyennes de cet état.
+
+WITH
+session_totals AS (
+    SELECT
+        user_key,
+        COUNT(*) AS session_count,
+        SUM(duration_seconds) AS total_watch_time_seconds,
+        SUM(completion_rate) AS sum_completion_rate,
+        COUNT(completion_rate) AS completion_rate_count,
+        MIN(session_start) AS first_viewing_date,
+        MAX(session_start) AS last_viewing_date,
+        CAST(NULL AS TIMESTAMP) AS first_subscription_date,
+        CAST(NULL AS TIMESTAMP) AS last_subscription_event_date,
+        0 AS subscription_starts,
+        0 AS cancellations,
+        MAX(_loaded_at) AS _max_session_loaded_at,
+        CAST(NULL AS TIMESTAMP) AS _max_event_loaded_at
+    FROM {{ ref('fact_viewing_sessions') }}
+    {% if is_incremental() %}
+    WHERE _loaded_at > (
+        SELECT COALESCE(MAX(_max_session_loaded_at), CAST('1900-01-01' AS TIMESTAMP)) FROM {{ this }}
+    )
+    {% endif %}
+    GROUP BY user_key
+),
+
+event_totals AS (
+    SELECT
+        user_key,
+        0 AS session_count,
+        0 AS total_watch_time_seconds,
+        0 AS sum_completion_rate,
+        0 AS completion_rate_count,
+        CAST(NULL AS TIMESTAMP) AS first_viewing_date,
+        CAST(NULL AS TIMESTAMP) AS last_viewing_date,
+        MIN(event_at) AS first_subscription_date,
+        MAX(event_at) AS last_subscription_event_date,
+        {{ count_if("event_type = 'subscription_start'") }} AS subscription_starts,
+        {{ count_if("event_type = 'cancellation'") }} AS cancellations,
+        CAST(NULL AS TIMESTAMP) AS _max_session_loaded_at,
+        MAX(_loaded_at) AS _max_event_loaded_at
+    FROM {{ ref('fact_subscription_events') }}
+    {% if is_incremental() %}
+    WHERE _loaded_at > (
+        SELECT COALESCE(MAX(_max_event_loaded_at), CAST('1900-01-01' AS TIMESTAMP)) FROM {{ this }}
+    )
+    {% endif %}
+    GROUP BY user_key
+),
+
+combined AS (
+    SELECT * FROM session_totals
+    UNION ALL
+    SELECT * FROM event_totals
+    {% if is_incremental() %}
+    -- État stocké des utilisateurs touchés, replié avec les deltas
+    UNION ALL
+    SELECT
+        user_key,
+        session_count,
+        total_watch_time_seconds,
+        sum_completion_rate,
+        completion_rate_count,
+        first_viewing_date,
+        last_viewing_date,
+        first_subscription_date,
+        last_subscription_event_date,
+        subscription_starts,
+        cancellations,
+        _max_session_loaded_at,
+        _max_event_loaded_at
+    FROM {{ this }}
+    WHERE user_key IN (
+        SELECT user_key FROM session_totals
+        UNION
+        SELECT user_key FROM event_totals
+    )
+    {% endif %}
+)
+
+SELECT
+    user_key,
+    SUM(session_count) AS session_count,
+    SUM(total_watch_time_seconds) AS total_watch_time_seconds,
+    SUM(sum_completion_rate) AS sum_completion_rate,
+    SUM(completion_rate_count) AS completion_rate_count,
+    MIN(first_viewing_date) AS first_viewing_date,
+    MAX(last_viewing_date) AS last_viewing_date,
+    MIN(first_subscription_date) AS first_subscription_date,
+    MAX(last_subscription_event_date) AS last_subscription_event_date,
+    SUM(subscription_starts) AS subscription_starts,
+    SUM(cancellations) AS cancellations,
+    MAX(_max_session_loaded_at) AS _max_session_loaded_at,
+    MAX(_max_event_loaded_at) AS _max_event_loaded_at,
+    {{ current_ts() }} AS dbt_updated_at
+FROM combined
+GROUP BY user_key
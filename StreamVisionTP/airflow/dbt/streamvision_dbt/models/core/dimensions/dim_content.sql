@@ -2,27 +2,15 @@
 
 WITH content AS (
     SELECT * FROM {{ source('staging', 'stg_content') }}
+    -- Un contenu peut figurer dans plusieurs chargements : une ligne par
+    -- content_key, les marts joignent cette dimension
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1
 ),
 
-viewing_stats AS (
-    SELECT
-        content_id,
-        COUNT(viewing_session_id) AS total_sessions,
-        COUNT(DISTINCT user_id) AS unique_viewers,
-        SUM(duration_seconds) AS total_watch_time_seconds,
-        AVG(completion_rate) AS avg_completion_rate
-    FROM {{ ref('stg_viewing_sessions') }}
-    GROUP BY content_id
-),
-
-rating_stats AS (
-    SELECT
-        content_id,
-        COUNT(*) AS total_ratings,
-        AVG(rating) AS avg_rating,
-        COUNT_IF(rating = 5) AS five_star_ratings
-    FROM {{ source('staging', 'stg_ratings') }}
-    GROUP BY content_id
+-- Statistiques de visionnage et de notes cumulées, maintenues en
+-- incrémental par agg_content_lifetime : pas de rescan de l'historique
+lifetime AS (
+    SELECT * FROM {{ ref('agg_content_lifetime') }}
 ),
 
 final AS (
@@ -48,19 +36,19 @@ final AS (
         c.available_countries,
         c.tags,
 
-        COALESCE(vs.total_sessions, 0) AS total_viewing_sessions,
-        COALESCE(vs.unique_viewers, 0) AS unique_viewers,
-        COALESCE(vs.total_watch_time_seconds, 0) AS total_watch_time_seconds,
-        COALESCE(vs.avg_completion_rate, 0) AS avg_completion_rate,
+        COALESCE(l.session_count, 0) AS total_viewing_sessions,
+        -- Estimation HLL (exacte sur DuckDB)
+        COALESCE({{ hll_estimate('l.viewers_hll') }}, 0) AS unique_viewers,
+        COALESCE(l.total_watch_time_seconds, 0) AS total_watch_time_seconds,
+        COALESCE(l.sum_completion_rate / NULLIF(l.completion_rate_count, 0), 0) AS avg_completion_rate,
 
-        COALESCE(rs.total_ratings, 0) AS total_ratings,
-        COALESCE(rs.avg_rating, 0) AS avg_rating,
-        COALESCE(rs.five_star_ratings, 0) AS five_star_ratings,
+        COALESCE(l.rating_count, 0) AS total_ratings,
+        COALESCE(l.sum_rating / NULLIF(l.rating_count, 0), 0) AS avg_rating,
+        COALESCE(l.five_star_ratings, 0) AS five_star_ratings,
 
-        CURRENT_TIMESTAMP AS dbt_updated_at
+        {{ current_ts() }} AS dbt_updated_at
     FROM content c
-    LEFT JOIN viewing_stats vs ON c.id = vs.content_id
-    LEFT JOIN rating_stats rs ON c.id = rs.content_id
+    LEFT JOIN lifetime l ON c.id = l.content_key
 )
 
 SELECT * FROM final
@@ -1,19 +1,62 @@
 {{ config(
-    materialized='table',
+    materialized='incremental',
+    unique_key='date',
     tags=['core', 'dimension', 'date']
 ) }}
 
--- Dimension: date (distinct dates from viewing sessions)
-WITH dates AS (
-    SELECT DISTINCT CAST(DATE_TRUNC('day', session_start) AS DATE) AS dt
-    FROM {{ source('staging', 'stg_viewing_sessions') }}
+-- Dimension: date (calendrier généré, sans lecture des sessions)
+-- Plage : var('calendar_start_date') → aujourd'hui + var('calendar_days_ahead').
+-- Construite une fois puis prolongée : en incrémental, seules les dates
+-- au-delà de la dernière date présente sont ajoutées. Tous les jours existent,
+-- y compris ceux sans session : une jointure sur la date trouve toujours sa
+-- ligne.
+-- Jours fériés : seed holidays (un --full-refresh réapplique une mise à jour
+-- du seed aux dates déjà construites).
+
+WITH spine AS (
+    {{ dbt.date_spine(
+        'day',
+        "CAST('" ~ var('calendar_start_date') ~ "' AS DATE)",
+        dbt.dateadd('day', var('calendar_days_ahead'), 'CURRENT_DATE')
+    ) }}
+),
+
+dates AS (
+    SELECT CAST(date_day AS DATE) AS dt
+    FROM spine
+    {% if is_incremental() %}
+    WHERE CAST(date_day AS DATE) > (SELECT MAX(date) FROM {{ this }})
+    {% endif %}
 )
 
 SELECT
-    dt AS date,
-    EXTRACT(year FROM dt)::INT AS year,
-    EXTRACT(month FROM dt)::INT AS month,
-    EXTRACT(day FROM dt)::INT AS day,
-    TO_CHAR(dt, 'YYYY-MM-DD') AS date_string
-FROM dates
-ORDER BY dt
+    d.dt AS date,
+    EXTRACT(year FROM d.dt)::INT AS year,
+    EXTRACT(quarter FROM d.dt)::INT AS quarter,
+    EXTRACT(month FROM d.dt)::INT AS month,
+    EXTRACT(day FROM d.dt)::INT AS day,
+    CAST(d.dt AS VARCHAR) AS date_string,
+
+    {{ iso_day_of_week('d.dt') }} AS day_of_week,
+    CASE {{ iso_day_of_week('d.dt') }}
+        WHEN 1 THEN 'Monday'
+        WHEN 2 THEN 'Tuesday'
+        WHEN 3 THEN 'Wednesday'
+        WHEN 4 THEN 'Thursday'
+        WHEN 5 THEN 'Friday'
+        WHEN 6 THEN 'Saturday'
+        ELSE 'Sunday'
+    END AS day_name,
+    {{ iso_day_of_week('d.dt') }} >= 6 AS is_weekend,
+
+    {{ iso_week('d.dt') }} AS iso_week,
+    CAST(DATE_TRUNC('week', d.dt) AS DATE) AS week_start_date,
+    CAST(DATE_TRUNC('month', d.dt) AS DATE) AS month_start_date,
+    CAST(DATE_TRUNC('quarter', d.dt) AS DATE) AS quarter_start_date,
+
+    h.holiday_date IS NOT NULL AS is_holiday,
+    h.holiday_name,
+    {{ iso_day_of_week('d.dt') }} < 6 AND h.holiday_date IS NULL AS is_business_day
+FROM dates AS d
+LEFT JOIN {{ ref('holidays') }} AS h
+  ON h.holiday_date = d.dt
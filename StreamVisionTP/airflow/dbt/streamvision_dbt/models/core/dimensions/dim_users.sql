@@ -6,29 +6,15 @@
 WITH users AS (
     SELECT * 
     FROM {{ source('staging', 'stg_users') }}
+    -- Un utilisateur peut figurer dans plusieurs chargements : une ligne par
+    -- user_key, les marts joignent cette dimension
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1
 ),
 
-viewing_stats AS (
-    SELECT
-        user_id,
-        MIN(session_start) AS first_viewing_date,
-        MAX(session_start) AS last_viewing_date,
-        COUNT(id) AS total_sessions,
-        SUM(duration_seconds) AS total_watch_time_seconds,
-        AVG(completion_rate) AS avg_completion_rate
-    FROM {{ source('staging', 'stg_viewing_sessions') }}
-    GROUP BY user_id
-),
-
-subscription_events AS (
-    SELECT
-        user_id,
-        MIN(event_date) AS first_subscription_date,
-        MAX(event_date) AS last_subscription_event_date,
-        COUNT(CASE WHEN event_type = 'subscription_start' THEN 1 END) AS subscription_starts,
-        COUNT(CASE WHEN event_type = 'cancellation' THEN 1 END) AS cancellations
-    FROM {{ source('staging', 'stg_subscription_events') }}
-    GROUP BY user_id
+-- Statistiques de visionnage et d'abonnement cumulées, maintenues en
+-- incrémental par agg_user_lifetime : pas de rescan de l'historique
+lifetime AS (
+    SELECT * FROM {{ ref('agg_user_lifetime') }}
 ),
 
 final AS (
@@ -62,29 +48,28 @@ final AS (
         u.created_at AS registration_date,
         u.device_preference,
 
-        COALESCE(vs.total_sessions, 0) AS total_viewing_sessions,
-        COALESCE(vs.total_watch_time_seconds, 0) AS total_watch_time_seconds,
-        COALESCE(vs.avg_completion_rate, 0) AS avg_completion_rate,
-        vs.first_viewing_date,
-        vs.last_viewing_date,
+        COALESCE(l.session_count, 0) AS total_viewing_sessions,
+        COALESCE(l.total_watch_time_seconds, 0) AS total_watch_time_seconds,
+        COALESCE(l.sum_completion_rate / NULLIF(l.completion_rate_count, 0), 0) AS avg_completion_rate,
+        l.first_viewing_date,
+        l.last_viewing_date,
 
-        se.first_subscription_date,
-        se.last_subscription_event_date,
-        COALESCE(se.subscription_starts, 0) AS subscription_starts,
-        COALESCE(se.cancellations, 0) AS cancellations,
+        l.first_subscription_date,
+        l.last_subscription_event_date,
+        COALESCE(l.subscription_starts, 0) AS subscription_starts,
+        COALESCE(l.cancellations, 0) AS cancellations,
 
         CASE
-            WHEN vs.last_viewing_date IS NOT NULL 
-                 AND DATEDIFF(day, vs.last_viewing_date, CURRENT_DATE) <= {{ var('active_days_threshold') }} THEN 'Active'
-            WHEN vs.last_viewing_date IS NOT NULL THEN 'Inactive'
+            WHEN l.last_viewing_date IS NOT NULL 
+                 AND {{ dbt.datediff('l.last_viewing_date', 'CURRENT_DATE', 'day') }} <= {{ var('active_days_threshold') }} THEN 'Active'
+            WHEN l.last_viewing_date IS NOT NULL THEN 'Inactive'
             ELSE 'Never Watched'
         END AS engagement_status,
 
-        CURRENT_TIMESTAMP AS dbt_updated_at
+        {{ current_ts() }} AS dbt_updated_at
 
     FROM users u
-    LEFT JOIN viewing_stats vs ON u.id = vs.user_id
-    LEFT JOIN subscription_events se ON u.id = se.user_id
+    LEFT JOIN lifetime l ON u.id = l.user_key
 )
 
 SELECT * 
@@ -0,0 +1,26 @@
+{{ config(
+    materialized='view',
+    tags=['core', 'dimension', 'users']
+) }}
+
+-- Versions successives du plan d'abonnement par utilisateur (snapshot
+-- snap_users), avec un intervalle de validité en dates pour les jointures
+-- par plage : valid_from <= date < valid_to.
+-- La première version couvre tout l'historique antérieur au premier snapshot.
+
+SELECT
+    id AS user_key,
+    subscription_plan,
+    is_active,
+    subscription_end,
+    CASE
+        WHEN ROW_NUMBER() OVER (PARTITION BY id ORDER BY dbt_valid_from) = 1
+            THEN CAST('1900-01-01' AS DATE)
+        ELSE CAST(dbt_valid_from AS DATE)
+    END AS valid_from,
+    COALESCE(CAST(dbt_valid_to AS DATE), CAST('9999-12-31' AS DATE)) AS valid_to,
+    dbt_valid_to IS NULL AS is_current,
+    dbt_scd_id,
+    dbt_valid_from,
+    dbt_valid_to
+FROM {{ ref('snap_users') }}
@@ -1,10 +1,29 @@
 /*
   Fact: ratings
+  Incrémental : seules les évaluations chargées depuis le dernier build
+  (moins fact_lookback_days) sont relues et fusionnées sur rating_id.
 */
+{{ config(
+    materialized='incremental',
+    unique_key='rating_id',
+    incremental_strategy=merge_strategy(),
+    on_schema_change='append_new_columns',
+    cluster_by=['rating_date'],
+    tags=['core', 'fact', 'ratings']
+) }}
+
 select
     r.rating_id,
     r.user_id,
     r.content_id,
     date_trunc('day', r.rated_at)::date as rating_date,
-    r.rating_value
+    r.rating_value,
+    r._loaded_at
 from {{ ref('stg_ratings') }} r
+{% if is_incremental() %}
+where r._loaded_at > (
+    select {{ dbt.dateadd('day', -var('fact_lookback_days'), 'max(_loaded_at)') }}
+    from {{ this }}
+)
+{% endif %}
+qualify row_number() over (partition by r.rating_id order by r._loaded_at desc) = 1
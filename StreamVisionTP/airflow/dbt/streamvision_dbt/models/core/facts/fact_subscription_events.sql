@@ -0,0 +1,39 @@
+{{ config(
+    materialized='incremental',
+    unique_key='event_id',
+    incremental_strategy=merge_strategy(),
+    on_schema_change='append_new_columns',
+    cluster_by=['event_date'],
+    tags=['core', 'fact', 'subscription_events']
+) }}
+
+-- Fait : événements d'abonnement (un événement par ligne), clusterisé sur
+-- event_date. Incrémental comme les autres faits : seules les lignes
+-- chargées depuis le dernier build (moins fact_lookback_days) sont relues et
+-- fusionnées sur event_id.
+
+WITH events AS (
+    SELECT * FROM {{ ref('stg_subscription_events') }}
+    {% if is_incremental() %}
+    WHERE _loaded_at > (
+        SELECT {{ dbt.dateadd('day', -var('fact_lookback_days'), 'MAX(_loaded_at)') }}
+        FROM {{ this }}
+    )
+    {% endif %}
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY event_id ORDER BY _loaded_at DESC) = 1
+)
+
+SELECT
+    event_id,
+    user_id AS user_key,
+    event_type,
+    event_at,
+    CAST(event_at AS DATE) AS event_date,
+    previous_plan,
+    new_plan,
+    amount,
+    currency,
+    payment_gateway,
+    _loaded_at,
+    {{ current_ts() }} AS dbt_updated_at
+FROM events
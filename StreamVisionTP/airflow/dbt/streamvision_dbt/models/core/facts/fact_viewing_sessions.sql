@@ -1,7 +1,24 @@
-{{ config(materialized='table', tags=['core', 'fact', 'viewing_sessions']) }}
+{{ config(
+    materialized='incremental',
+    unique_key='viewing_session_key',
+    incremental_strategy=merge_strategy(),
+    on_schema_change='append_new_columns',
+    cluster_by=['date_key'],
+    tags=['core', 'fact', 'viewing_sessions']
+) }}
 
 WITH vs AS (
     SELECT * FROM {{ ref('stg_viewing_sessions') }}
+    {% if is_incremental() %}
+    -- Seules les lignes chargées depuis le dernier build sont relues, avec une
+    -- marge (fact_lookback_days) pour les sessions arrivées en retard
+    WHERE _loaded_at > (
+        SELECT {{ dbt.dateadd('day', -var('fact_lookback_days'), 'MAX(_loaded_at)') }}
+        FROM {{ this }}
+    )
+    {% endif %}
+    -- Une session peut figurer dans plusieurs chargements : on garde le dernier
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY viewing_session_id ORDER BY _loaded_at DESC) = 1
 ),
 
 final AS (
@@ -31,7 +48,8 @@ final AS (
             ELSE 'Abandoned'
         END AS completion_status,
 
-        CURRENT_TIMESTAMP AS dbt_updated_at
+        _loaded_at,
+        {{ current_ts() }} AS dbt_updated_at
     FROM vs
 )
 
@@ -0,0 +1,85 @@
+{{ config(
+  materialized='table',
+  cluster_by=['activity_date'],
+  tags=['marts', 'user_engagement']
+) }}
+
+-- Utilisateurs actifs : DAU, WAU / MAU glissants (7 et 30 jours) et uniques
+-- par semaine / mois calendaires.
+-- Les états HLL quotidiens de mart_user_engagement sont fusionnés au lieu de
+-- recompter les utilisateurs distincts sur les sessions : une fenêtre de
+-- 30 jours ne fusionne que 30 états par date.
+-- Mode exact (audit) : --vars '{exact_distinct: true}' → COUNT(DISTINCT)
+-- sur le rollup agg_sessions_daily.
+
+WITH daily AS (
+    {% if var('exact_distinct', false) %}
+    SELECT DISTINCT
+        date_key AS activity_date,
+        user_key
+    FROM {{ ref('agg_sessions_daily') }}
+    {% else %}
+    -- Un état par jour, toutes dimensions confondues
+    SELECT
+        engagement_date AS activity_date,
+        {{ hll_combine('daily_active_users_hll') }} AS users_hll
+    FROM {{ ref('mart_user_engagement') }}
+    GROUP BY engagement_date
+    {% endif %}
+),
+
+dates AS (
+    SELECT DISTINCT activity_date FROM daily
+),
+
+rolling AS (
+    SELECT
+        d.activity_date,
+        {{ distinct_count(
+            "CASE WHEN w.activity_date = d.activity_date THEN w.user_key END",
+            "CASE WHEN w.activity_date = d.activity_date THEN w.users_hll END"
+        ) }} AS dau,
+        {{ distinct_count(
+            "CASE WHEN w.activity_date > " ~ dbt.dateadd('day', -7, 'd.activity_date') ~ " THEN w.user_key END",
+            "CASE WHEN w.activity_date > " ~ dbt.dateadd('day', -7, 'd.activity_date') ~ " THEN w.users_hll END"
+        ) }} AS wau_7d,
+        {{ distinct_count('w.user_key', 'w.users_hll') }} AS mau_30d
+    FROM dates AS d
+    JOIN daily AS w
+      ON w.activity_date >  {{ dbt.dateadd('day', -30, 'd.activity_date') }}
+     AND w.activity_date <= d.activity_date
+    GROUP BY d.activity_date
+),
+
+calendar_weeks AS (
+    SELECT
+        DATE_TRUNC('week', activity_date) AS activity_week,
+        {{ distinct_count('user_key', 'users_hll') }} AS calendar_week_users
+    FROM daily
+    GROUP BY DATE_TRUNC('week', activity_date)
+),
+
+calendar_months AS (
+    SELECT
+        DATE_TRUNC('month', activity_date) AS activity_month,
+        {{ distinct_count('user_key', 'users_hll') }} AS calendar_month_users
+    FROM daily
+    GROUP BY DATE_TRUNC('month', activity_date)
+)
+
+SELECT
+    r.activity_date,
+    w.activity_week,
+    m.activity_month,
+    r.dau,
+    r.wau_7d,
+    r.mau_30d,
+    ROUND(r.dau * 100.0 / NULLIF(r.mau_30d, 0), 1) AS stickiness_pct,
+    w.calendar_week_users,
+    m.calendar_month_users,
+    {{ current_ts() }} AS dbt_updated_at
+FROM rolling AS r
+JOIN calendar_weeks AS w
+  ON w.activity_week = DATE_TRUNC('week', r.activity_date)
+JOIN calendar_months AS m
+  ON m.activity_month = DATE_TRUNC('month', r.activity_date)
@@ -3,9 +3,12 @@
   tags=['marts', 'content_performance']
 ) }}
 
+-- unique_viewers est estimé par HLL ; unique_viewers_hll conserve l'état pour
+-- fusionner les spectateurs de plusieurs contenus (genre, type, originaux...)
+
 WITH content_performance AS (
     SELECT
-        c.content_id AS content_id,         -- was c.id
+        c.content_key AS content_id,
         c.title,
         c.content_type,
         c.genre,
@@ -13,20 +16,22 @@ WITH content_performance AS (
         c.release_year,
         c.duration_minutes,
         c.is_original,
-        COUNT(*) AS total_sessions,         -- no f.id column in staging, count rows
-        COUNT(DISTINCT f.user_id) AS unique_viewers,
-        SUM(f.duration_seconds) AS total_watch_time_seconds,
-        AVG(f.completion_rate) AS avg_completion_rate,
+        SUM(a.session_count) AS total_sessions,
+        {{ distinct_count('a.user_key', 'a.users_hll') }} AS unique_viewers,
+        {{ hll_combine('a.users_hll') }} AS unique_viewers_hll,
+        SUM(a.total_watch_time_seconds) AS total_watch_time_seconds,
+        SUM(a.sum_completion_rate) / NULLIF(SUM(a.completion_rate_count), 0) AS avg_completion_rate,
         c.imdb_rating AS avg_rating,
         0 AS total_ratings,
         0 AS five_star_ratings,
-        MIN(f.session_start) AS first_viewing_date,
-        MAX(f.session_start) AS last_viewing_date
-    FROM {{ ref('stg_viewing_sessions') }} AS f
-    JOIN {{ ref('stg_content') }} AS c
-        ON f.content_id = c.content_id      -- was c.id
+        MIN(a.first_session_start) AS first_viewing_date,
+        MAX(a.last_session_start) AS last_viewing_date
+    -- Rollup quotidien partagé (agg_sessions_daily) plutôt que le fait brut
+    FROM {{ ref('agg_sessions_daily') }} AS a
+    JOIN {{ ref('dim_content') }} AS c
+        ON a.content_key = c.content_key
     GROUP BY
-        c.content_id,                       -- was c.id
+        c.content_key,
         c.title,
         c.content_type,
         c.genre,
@@ -69,7 +74,7 @@ final AS (
             (LN(GREATEST(COALESCE(total_sessions, 1), 1)) * 0.3),
             2
         ) AS content_score,
-        CURRENT_TIMESTAMP() AS dbt_updated_at
+        {{ current_ts() }} AS dbt_updated_at
     FROM ranked
 )
 
@@ -1,26 +1,81 @@
 {{ config(
-  materialized='table',
+  materialized='incremental',
+  incremental_strategy='delete+insert',
+  unique_key='activity_month',
+  cluster_by=['activity_month'],
+  on_schema_change='append_new_columns',
   tags=['marts', 'subscription_analytics']
 ) }}
 
-WITH subscription_events AS (
-    SELECT *
-    FROM {{ ref('stg_subscription_events') }}
+-- Grain : (activity_month, user_key), un mois par utilisateur ayant au moins
+-- un événement d'abonnement.
+-- Agrégats simples sur fact_subscription_events : ni fenêtre sur tout
+-- l'historique ni tri global. En incrémental, seuls les mois touchés par les
+-- événements chargés depuis le dernier build sont recalculés (delete+insert
+-- sur activity_month remplace le mois entier).
+-- Le plan en fin de mois vient de l'historique SCD2 (dim_users_history).
+
+{% if is_incremental() %}
+WITH affected_months AS (
+    SELECT DISTINCT CAST(DATE_TRUNC('month', event_date) AS DATE) AS activity_month
+    FROM {{ ref('fact_subscription_events') }}
+    WHERE _loaded_at > (
+        SELECT {{ dbt.dateadd('day', -var('fact_lookback_days'), 'MAX(_max_loaded_at)') }}
+        FROM {{ this }}
+    )
 ),
 
-subscription_summary AS (
+monthly AS (
+{% else %}
+WITH monthly AS (
+{% endif %}
     SELECT
-        user_id,
-        event_type,
-        event_at AS event_date,   -- use staging column name, alias to event_date
-        previous_plan,
-        new_plan,
-        COUNT(*) OVER (PARTITION BY user_id, event_type) AS event_count
-    FROM subscription_events
+        CAST(DATE_TRUNC('month', e.event_date) AS DATE) AS activity_month,
+        e.user_key,
+        COUNT(*) AS event_count,
+        {{ count_if("e.event_type = 'subscription_start'") }} AS subscription_starts,
+        {{ count_if("e.event_type = 'upgrade'") }} AS upgrades,
+        {{ count_if("e.event_type = 'downgrade'") }} AS downgrades,
+        {{ count_if("e.event_type = 'cancellation'") }} AS cancellations,
+        {{ count_if("e.event_type = 'renewal'") }} AS renewals,
+        {{ count_if("e.event_type = 'payment_failed'") }} AS payment_failures,
+        SUM(e.amount) AS total_amount,
+        MIN(e.event_at) AS first_event_at,
+        MAX(e.event_at) AS last_event_at,
+        MAX_BY(e.event_type, e.event_at) AS last_event_type,
+        MAX(e._loaded_at) AS _max_loaded_at
+    FROM {{ ref('fact_subscription_events') }} AS e
+    {% if is_incremental() %}
+    WHERE CAST(DATE_TRUNC('month', e.event_date) AS DATE) IN (SELECT activity_month FROM affected_months)
+    {% endif %}
+    GROUP BY
+        CAST(DATE_TRUNC('month', e.event_date) AS DATE),
+        e.user_key
 )
 
 SELECT
-    *,
-    CURRENT_TIMESTAMP() AS dbt_updated_at
-FROM subscription_summary
-ORDER BY event_date DESC, user_id
\ No newline at end of file
+    m.activity_month,
+    m.user_key,
+    m.event_count,
+    m.subscription_starts,
+    m.upgrades,
+    m.downgrades,
+    m.cancellations,
+    m.renewals,
+    m.payment_failures,
+    m.total_amount,
+    m.first_event_at,
+    m.last_event_at,
+    m.last_event_type,
+    -- Churn : le mois se termine sur une résiliation
+    m.cancellations > 0 AS has_cancellation,
+    m.last_event_type = 'cancellation' AS is_churned,
+    h.subscription_plan AS plan_at_month_end,
+    h.is_active AS active_at_month_end,
+    m._max_loaded_at,
+    {{ current_ts() }} AS dbt_updated_at
+FROM monthly AS m
+LEFT JOIN {{ ref('dim_users_history') }} AS h
+  ON h.user_key = m.user_key
+ AND {{ dbt.last_day('m.activity_month', 'month') }} >= h.valid_from
+ AND {{ dbt.last_day('m.activity_month', 'month') }} <  h.valid_to
@@ -1,37 +1,78 @@
 {{ config(
-  materialized='table',
+  materialized='incremental',
+  incremental_strategy='delete+insert',
+  unique_key='engagement_date',
+  cluster_by=['engagement_date'],
+  on_schema_change='append_new_columns',
   tags=['marts', 'user_engagement']
 ) }}
 
+-- Grain : (engagement_date, country_code, customer_tier, subscription_plan).
+-- En incrémental, seules les dates touchées par les sessions chargées depuis
+-- le dernier build sont recalculées ; delete+insert sur engagement_date
+-- remplace la journée entière (aucun groupe obsolète ne subsiste).
+-- Les comptes distincts sont estimés par HLL (macros/hll.sql) ;
+-- --vars '{exact_distinct: true}' les recalcule exactement pour un audit.
+
+{% if is_incremental() %}
+WITH affected_dates AS (
+    SELECT DISTINCT date_key AS engagement_date
+    FROM {{ ref('agg_sessions_daily') }}
+    WHERE _max_loaded_at > (
+        SELECT {{ dbt.dateadd('day', -var('fact_lookback_days'), 'MAX(_max_loaded_at)') }}
+        FROM {{ this }}
+    )
+),
+
+daily_engagement AS (
+{% else %}
 WITH daily_engagement AS (
+{% endif %}
     SELECT
-        DATE_TRUNC('day', f.session_start) AS engagement_date,
-        u.country AS country_code,
+        a.date_key AS engagement_date,
+        u.country_code,
         u.age_group AS customer_tier,
-        u.subscription_plan,
-        COUNT(DISTINCT f.user_id) AS daily_active_users,
-        COUNT(DISTINCT f.content_id) AS unique_content_viewed,
-        COUNT(*) AS total_sessions,                 -- instead of COUNT(f.id)
-        SUM(f.duration_seconds) AS total_watch_time_seconds,
-        AVG(f.completion_rate) AS avg_completion_rate,
-        AVG(f.buffering_count) AS avg_buffering_count,
-        COUNT_IF(f.platform = 'web') AS web_sessions,
-        COUNT_IF(f.platform LIKE 'mobile%') AS mobile_sessions,
-        COUNT_IF(f.platform = 'smart_tv') AS tv_sessions,
-        COUNT_IF(f.quality IN ('4K','HDR')) AS high_quality_sessions,
-        COUNT_IF(f.quality = 'Full HD') AS full_hd_sessions,
-        COUNT_IF(f.quality = 'HD') AS hd_sessions,
-        COUNT_IF(f.quality = 'SD') AS sd_sessions
-    FROM {{ ref('stg_viewing_sessions') }} AS f
-    JOIN {{ ref('stg_users') }} AS u
-      ON f.user_id = u.user_id                     -- was u.id
+        -- Plan en vigueur à la date de la session (historique SCD2)
+        h.subscription_plan,
+        {{ distinct_count('a.user_key', 'a.users_hll') }} AS daily_active_users,
+        {{ distinct_count('a.content_key', 'a.content_hll') }} AS unique_content_viewed,
+        -- États HLL du groupe : fusionnables en uniques hebdo/mensuels
+        -- (voir mart_active_users)
+        {{ hll_combine('a.users_hll') }} AS daily_active_users_hll,
+        {{ hll_combine('a.content_hll') }} AS unique_content_viewed_hll,
+        SUM(a.session_count) AS total_sessions,
+        SUM(a.total_watch_time_seconds) AS total_watch_time_seconds,
+        SUM(a.sum_completion_rate) / NULLIF(SUM(a.completion_rate_count), 0) AS avg_completion_rate,
+        SUM(a.sum_buffering_count) / NULLIF(SUM(a.buffering_count_count), 0) AS avg_buffering_count,
+        SUM(CASE WHEN a.platform = 'web' THEN a.session_count ELSE 0 END) AS web_sessions,
+        SUM(CASE WHEN a.platform LIKE 'mobile%' THEN a.session_count ELSE 0 END) AS mobile_sessions,
+        SUM(CASE WHEN a.platform = 'smart_tv' THEN a.session_count ELSE 0 END) AS tv_sessions,
+        SUM(CASE WHEN a.quality IN ('4K','HDR') THEN a.session_count ELSE 0 END) AS high_quality_sessions,
+        SUM(CASE WHEN a.quality = 'Full HD' THEN a.session_count ELSE 0 END) AS full_hd_sessions,
+        SUM(CASE WHEN a.quality = 'HD' THEN a.session_count ELSE 0 END) AS hd_sessions,
+        SUM(CASE WHEN a.quality = 'SD' THEN a.session_count ELSE 0 END) AS sd_sessions,
+        MAX(a._max_loaded_at) AS _max_loaded_at
+    -- Rollup quotidien partagé (agg_sessions_daily) : le fait n'est scanné
+    -- qu'une fois par nuit, par le rollup, quel que soit le nombre de marts
+    FROM {{ ref('agg_sessions_daily') }} AS a
+    JOIN {{ ref('dim_users') }} AS u
+      ON a.user_key = u.user_key
+    JOIN {{ ref('dim_users_history') }} AS h
+      ON a.user_key = h.user_key
+     AND a.date_key >= h.valid_from
+     AND a.date_key <  h.valid_to
+    {% if is_incremental() %}
+    WHERE a.date_key IN (SELECT engagement_date FROM affected_dates)
+    {% endif %}
     GROUP BY
-      DATE_TRUNC('day', f.session_start),
-      u.country,
+      a.date_key,
+      u.country_code,
       u.age_group,
-      u.subscription_plan
+      h.subscription_plan
 )
 
+-- Pas d'ORDER BY final : la table est clusterisée sur engagement_date, les
+-- requêtes BI filtrant sur la date élaguent les micro-partitions
 SELECT
     *,
     ROUND(total_watch_time_seconds / 3600.0, 2) AS total_watch_time_hours,
@@ -40,6 +81,5 @@ SELECT
     ROUND(web_sessions * 100.0 / NULLIF(total_sessions, 0), 1) AS web_sessions_pct,
     ROUND(mobile_sessions * 100.0 / NULLIF(total_sessions, 0), 1) AS mobile_sessions_pct,
     ROUND(tv_sessions * 100.0 / NULLIF(total_sessions, 0), 1) AS tv_sessions_pct,
-    CURRENT_TIMESTAMP() AS dbt_updated_at
+    {{ current_ts() }} AS dbt_updated_at
 FROM daily_engagement
-ORDER BY engagement_date DESC, total_watch_time_seconds DESC
\ No newline at end of file
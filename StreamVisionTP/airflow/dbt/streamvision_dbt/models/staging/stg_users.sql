@@ -15,7 +15,7 @@ WITH src AS (
 ranked AS (
     SELECT
         *,
-        ROW_NUMBER() OVER (PARTITION BY id ORDER BY COALESCE(_loaded_at, CURRENT_TIMESTAMP()) DESC) AS _rn
+        ROW_NUMBER() OVER (PARTITION BY id ORDER BY COALESCE(_loaded_at, {{ current_ts() }}) DESC) AS _rn
     FROM src
 )
 
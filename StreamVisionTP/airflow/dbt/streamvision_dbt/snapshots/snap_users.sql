@@ -0,0 +1,26 @@
+{% snapshot snap_users %}
+
+{{ config(
+    target_schema='snapshots',
+    unique_key='id',
+    strategy='check',
+    check_cols=['subscription_plan', 'is_active', 'subscription_end'],
+    tags=['core', 'snapshot', 'users']
+) }}
+
+-- Historique SCD type 2 des utilisateurs : une nouvelle version dès que le
+-- plan, le statut actif ou la fin d'abonnement change.
+-- Seules les lignes chargées depuis le dernier snapshot sont comparées : les
+-- utilisateurs absents de ce lot gardent leur version courante (pas de
+-- suppression implicite).
+
+{% set existing = load_relation(this) %}
+
+SELECT *
+FROM {{ source('staging', 'stg_users') }}
+{% if existing is not none %}
+WHERE _loaded_at > (SELECT MAX(_loaded_at) FROM {{ this }})
+{% endif %}
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1
+
+{% endsnapshot %}
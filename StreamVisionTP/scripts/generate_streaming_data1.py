@@ -5,6 +5,8 @@ Auteur : Équipe Data Engineering
 Date : 2025-11-27
 """
 
+import argparse
+import calendar
 import os
 import sys
 import random
@@ -13,6 +15,7 @@ import logging
 import io
 from datetime import datetime, timedelta, date, time
 from decimal import Decimal
+from time import perf_counter
 from typing import List, Dict, Tuple, Any
 
 import psycopg2
@@ -80,6 +83,201 @@ DEVICE_TYPES = ['desktop', 'laptop', 'phone', 'tablet', 'tv', 'console']
 QUALITIES = ['SD', 'HD', 'Full HD', '4K', 'HDR']
 SUBSCRIPTION_EVENTS = ['subscription_start', 'upgrade', 'downgrade', 'cancellation', 'renewal', 'payment_failed']
 
+# Poids de génération (aussi utilisés par verify_data pour les répartitions attendues)
+PLAN_WEIGHTS = [0.15, 0.2, 0.3, 0.25, 0.1]  # free_trial, basic, standard, premium, family
+PLATFORM_WEIGHTS = [0.3, 0.25, 0.2, 0.15, 0.05, 0.05]  # web, mobile_ios, mobile_android, smart_tv, game_console, tablet
+PLATFORM_DEVICES = {
+    'web': ['desktop', 'laptop'],
+    'mobile_ios': ['phone', 'tablet'],
+    'mobile_android': ['phone', 'tablet'],
+    'smart_tv': ['tv'],
+    'game_console': ['console'],
+    'tablet': ['tablet']
+}
+# Heure de début des sessions (0h-23h), plus de sessions le soir et le week-end
+HOUR_WEIGHTS = {
+    'weekday': [0.01] * 6 + [0.02] * 4 + [0.03] * 4 + [0.05] * 4 + [0.08] * 4 + [0.04] * 2,
+    'weekend': [0.02] * 6 + [0.04] * 4 + [0.06] * 4 + [0.08] * 4 + [0.1] * 4 + [0.06] * 2,
+}
+PRIME_TIME_HOUR = 18
+LARGE_SCREEN_DEVICES = ['tv', 'desktop', 'laptop']
+MOBILE_DATA_SHARE = 0.3  # sessions mobiles hors Wi-Fi
+# Qualité selon l'écran et le contexte (ordre de QUALITIES)
+QUALITY_WEIGHTS = {
+    'large_screen_prime_time': [0.05, 0.2, 0.5, 0.2, 0.05],
+    'large_screen': [0.1, 0.3, 0.4, 0.15, 0.05],
+    'mobile_data': [0.4, 0.5, 0.1, 0.0, 0.0],
+    'mobile_wifi': [0.2, 0.5, 0.2, 0.05, 0.05],
+}
+
+# Tables StreamVision, tables référençantes avant les tables référencées
+# (ordre de passage en UNLOGGED ; ordre inverse pour LOGGED)
+TABLES_CHILDREN_FIRST = [
+    "dashboard_refresh_state",
+    "daily_engagement_summary",
+    "content_popularity_summary",
+    "episode_viewing",
+    "episodes",
+    "search_queries",
+    "subscription_events",
+    "watchlist",
+    "ratings",
+    "viewing_sessions",
+    "content",
+    "users"
+]
+
+# Slot de réplication logique du CDC (users, subscription_events) : voir
+# sql_postgres/sql3.sql et airflow/dags/scripts/cdc_export_to_s3.py
+CDC_SLOT_NAME = "streamvision_cdc"
+
+# Historique généré par table partitionnée (jours) : partitions à créer
+PARTITION_HISTORY_DAYS = {
+    'viewing_sessions': 180,
+    'episode_viewing': 90,
+}
+
+# Catalogue d'épisodes (build_episode_catalogue)
+SEASONS_PER_SHOW = ([1, 2, 3, 4, 5, 6], [0.1, 0.2, 0.3, 0.2, 0.15, 0.05])
+EPISODES_PER_SEASON = ([6, 8, 10, 12, 13, 16, 20, 22], [0.05, 0.1, 0.2, 0.3, 0.2, 0.1, 0.03, 0.02])
+EPISODE_DURATIONS = ([20, 30, 40, 45, 50, 55, 60, 75], [0.05, 0.1, 0.2, 0.25, 0.2, 0.1, 0.08, 0.02])
+EPISODE_TITLES = [
+    'Pilot', 'Beginnings', 'Endings', 'The Start', 'The Finish',
+    'Unexpected', 'Revelations', 'Secrets', 'Truth', 'Lies',
+    'Alliances', 'Betrayals', 'Hope', 'Despair', 'Love', 'Hate',
+    'Crossroads', 'Turning Point', 'Last Stand', 'New Dawn'
+]
+
+# Séances de binge (simulate_binge_sessions) : épisodes consécutifs d'une série
+BINGE_CONFIG = {
+    'linked_session_share': 0.6,  # séances rattachées à une session de visionnage
+    'mean_run_length': 2.5,       # épisodes par séance (loi géométrique)
+    'max_run_length': 12,
+    'autoplay_share': 0.8,        # enchaînement automatique (10 s - 2 min), sinon pause (5 - 30 min)
+}
+
+# Taille des lots COPY (copy_dataframe)
+COPY_CHUNK_ROWS = 200000
+
+# Volumes de la génération complète
+GENERATION_SIZES = {
+    'n_users': 10000,
+    'n_content': 5000,
+    'n_sessions': 100000,
+    'n_ratings': 30000,
+    'n_items': 20000,
+    'n_events': 15000,
+    'n_queries': 25000,
+    'n_episodes': 5000,
+    'n_episode_views': 30000,
+}
+
+# Index secondaires du profil "serving" (mêmes définitions que sql_postgres/sql1.sql)
+SERVING_INDEXES = {
+    'idx_users_country': "CREATE INDEX idx_users_country ON users (country)",
+    'idx_users_subscription_end': "CREATE INDEX idx_users_subscription_end ON users (subscription_end)",
+    'idx_users_active_last_login':
+        "CREATE INDEX idx_users_active_last_login ON users (last_login) WHERE is_active",
+    'idx_content_title': "CREATE INDEX idx_content_title ON content (title)",
+    'idx_content_genre': "CREATE INDEX idx_content_genre ON content (genre)",
+    'idx_content_release_year': "CREATE INDEX idx_content_release_year ON content (release_year)",
+    'idx_viewing_sessions_user_id': "CREATE INDEX idx_viewing_sessions_user_id ON viewing_sessions (user_id)",
+    'idx_viewing_sessions_content_cover':
+        "CREATE INDEX idx_viewing_sessions_content_cover ON viewing_sessions (content_id) "
+        "INCLUDE (completion_rate)",
+    'idx_viewing_sessions_daily_cover':
+        "CREATE INDEX idx_viewing_sessions_daily_cover ON viewing_sessions (session_start) "
+        "INCLUDE (user_id, duration_seconds, completion_rate)",
+    'idx_ratings_user_id': "CREATE INDEX idx_ratings_user_id ON ratings (user_id)",
+    'idx_ratings_content_cover': "CREATE INDEX idx_ratings_content_cover ON ratings (content_id) INCLUDE (rating)",
+    'idx_ratings_rating_date': "CREATE INDEX idx_ratings_rating_date ON ratings (rating_date)",
+    'idx_watchlist_user_id': "CREATE INDEX idx_watchlist_user_id ON watchlist (user_id)",
+    'idx_subscription_events_user_id':
+        "CREATE INDEX idx_subscription_events_user_id ON subscription_events (user_id)",
+    'idx_subscription_events_event_date':
+        "CREATE INDEX idx_subscription_events_event_date ON subscription_events (event_date)",
+    'idx_search_queries_user_id': "CREATE INDEX idx_search_queries_user_id ON search_queries (user_id)",
+    'idx_search_queries_search_date':
+        "CREATE INDEX idx_search_queries_search_date ON search_queries (search_date)",
+    'idx_search_queries_clicked_content':
+        "CREATE INDEX idx_search_queries_clicked_content ON search_queries (clicked_content_id)",
+    'idx_episode_viewing_user_id': "CREATE INDEX idx_episode_viewing_user_id ON episode_viewing (user_id)",
+    'idx_episode_viewing_episode_id': "CREATE INDEX idx_episode_viewing_episode_id ON episode_viewing (episode_id)",
+    'idx_episode_viewing_start_time':
+        "CREATE INDEX idx_episode_viewing_start_time ON episode_viewing (start_time)",
+}
+
+# Index de l'ancien schéma (redondants ou à faible cardinalité) et anciens BRIN
+# (colonnes sans corrélation avec l'ordre physique), supprimés par tous les profils
+LEGACY_INDEXES = [
+    'idx_users_email', 'idx_users_subscription_plan', 'idx_users_is_active',
+    'idx_content_type', 'idx_content_is_original',
+    'idx_viewing_sessions_content_id', 'idx_viewing_sessions_session_start',
+    'idx_viewing_sessions_platform', 'idx_viewing_sessions_completion_rate',
+    'idx_ratings_content_id', 'idx_ratings_rating',
+    'idx_watchlist_watched',
+    'idx_subscription_events_event_type',
+    'idx_episodes_tv_show_id', 'idx_episodes_season_episode',
+    'idx_ratings_rating_date_brin', 'idx_subscription_events_event_date_brin',
+    'idx_search_queries_search_date_brin', 'idx_episode_viewing_start_time_brin',
+]
+
+# Profils d'index (apply_index_profile) :
+# - bulk_load : aucun index secondaire pendant la génération massive
+#               (clés primaires et contraintes UNIQUE conservées)
+# - serving   : index adaptés aux exports et aux vues d'analyse
+INDEX_PROFILES = {
+    'bulk_load': [],
+    'serving': list(SERVING_INDEXES),
+}
+
+# Reconstruction des index (profil serving)
+INDEX_BUILD_CONFIG = {
+    'max_parallel_maintenance_workers': 4,
+    'maintenance_work_mem': '512MB',
+}
+
+# Statistiques de verify_data : une requête par table, (clé, expression, type)
+# type : 'count' / 'sum' (extrapolés en mode rapide) ou 'avg'
+VERIFY_STATS = {
+    'users': [
+        ('rows', 'COUNT(*)', 'count'),
+        ('active', 'COUNT(*) FILTER (WHERE is_active)', 'count'),
+        *[(f'plan_{plan}', f"COUNT(*) FILTER (WHERE subscription_plan = '{plan}')", 'count')
+          for plan in SUBSCRIPTION_PLANS],
+    ],
+    'content': [
+        ('rows', 'COUNT(*)', 'count'),
+        *[(f'type_{content_type}', f"COUNT(*) FILTER (WHERE content_type = '{content_type}')", 'count')
+          for content_type in CONTENT_TYPES],
+    ],
+    'viewing_sessions': [
+        ('rows', 'COUNT(*)', 'count'),
+        ('watch_seconds', 'SUM(duration_seconds)', 'sum'),
+        ('avg_completion', 'AVG(completion_rate)', 'avg'),
+        *[(f'platform_{platform}', f"COUNT(*) FILTER (WHERE platform = '{platform}')", 'count')
+          for platform in PLATFORMS],
+        *[(f'quality_{quality}', f"COUNT(*) FILTER (WHERE quality = '{quality}')", 'count')
+          for quality in QUALITIES],
+    ],
+    'ratings': [
+        ('rows', 'COUNT(*)', 'count'),
+        ('avg_rating', 'AVG(rating)', 'avg'),
+    ],
+    'watchlist': [('rows', 'COUNT(*)', 'count')],
+    'subscription_events': [('rows', 'COUNT(*)', 'count')],
+    'search_queries': [('rows', 'COUNT(*)', 'count')],
+    'episodes': [('rows', 'COUNT(*)', 'count')],
+    'episode_viewing': [('rows', 'COUNT(*)', 'count')],
+}
+
+VERIFY_CONFIG = {
+    'report_path': 'data_verification.json',
+    'tolerance': 0.15,       # écart toléré du ratio observé / attendu
+    'sample_percent': 1.0,   # TABLESAMPLE SYSTEM du mode rapide
+    'fast_min_rows': 100000, # en dessous, calcul exact même en mode rapide
+}
+
 # Initialisation de Faker avec plusieurs langues
 fake = Faker(['fr_FR', 'en_US', 'de_DE', 'es_ES', 'it_IT', 'pt_BR', 'ja_JP', 'ko_KR'])
 
@@ -97,6 +295,31 @@ def to_datetime(d):
     return d
 
 
+def copy_dataframe(cursor, table: str, df: pd.DataFrame, chunk_rows: int = COPY_CHUNK_ROWS):
+    """
+    Insère un DataFrame avec COPY ... FROM STDIN (CSV), par lots de chunk_rows.
+    Les colonnes du DataFrame donnent la liste des colonnes cibles ; les
+    valeurs manquantes (NaN, NA) sont insérées comme NULL.
+    """
+    columns = ", ".join(df.columns)
+    for start in range(0, len(df), chunk_rows):
+        buffer = io.StringIO()
+        df.iloc[start:start + chunk_rows].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _ranks(counts: np.ndarray) -> np.ndarray:
+    """Position (à partir de 1) de chaque élément dans son groupe : [2, 3] → [1, 2, 1, 2, 3]."""
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+
+
+def _choice(rng, options: Tuple[List, List], size: int) -> np.ndarray:
+    values, weights = options
+    weights = np.asarray(weights, dtype=float)
+    return rng.choice(values, size=size, p=weights / weights.sum())
+
+
 def get_db_connection():
     """Établit une connexion à PostgreSQL"""
     try:
@@ -109,62 +332,278 @@ def get_db_connection():
         sys.exit(1)
 
 
+def ensure_partitions(conn, table: str, days_back: int):
+    """
+    Crée les partitions mensuelles couvrant les dates générées (days_back jours
+    d'historique, mois suivant compris) pour une table partitionnée de sql1.sql.
+
+    Sans effet si la table n'est pas partitionnée (ancien schéma). Les lignes
+    hors partition tomberaient de toute façon dans la partition DEFAULT.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            (table,)
+        )
+        if cursor.fetchone() is None:
+            return
+
+        cursor.execute(
+            "SELECT create_monthly_partitions(%s, %s, %s)",
+            (table, days_back // 28 + 1, 1)
+        )
+        created = cursor.fetchone()[0]
+        conn.commit()
+        if created:
+            logger.info(f"{created} partitions mensuelles créées pour {table}")
+    finally:
+        cursor.close()
+
+
 # ============================================================================
 # 🚨 FLUSH DATABASE (SUPPRESSION TOTALE DES DONNÉES)
 # ============================================================================
 
-def flush_database(conn):
+def flush_database(conn, confirm: bool = None) -> bool:
     """
     Supprime TOUTES les données de la base StreamVision.
     Action IRRÉVERSIBLE.
+
+    confirm : True pour un appel non interactif (scripts, boucles de
+    benchmark) ; sinon la saisie de 'YES' est demandée.
+    Retourne True si la base a été vidée.
     """
-    print("\n" + "⚠️" * 30)
-    print("⚠️  DANGER – FLUSH DE LA BASE DE DONNÉES")
-    print("⚠️  Cette action SUPPRIME TOUTES LES DONNÉES.")
-    print("⚠️  Elle est IRRÉVERSIBLE.")
-    print("⚠️" * 30)
+    if confirm is None:
+        print("\n" + "⚠️" * 30)
+        print("⚠️  DANGER – FLUSH DE LA BASE DE DONNÉES")
+        print("⚠️  Cette action SUPPRIME TOUTES LES DONNÉES.")
+        print("⚠️  Elle est IRRÉVERSIBLE.")
+        print("⚠️" * 30)
 
-    confirm = input("\nTapez exactement 'YES' pour confirmer : ").strip()
+        confirm = input("\nTapez exactement 'YES' pour confirmer : ").strip() == "YES"
 
-    if confirm != "YES":
+    if not confirm:
         print("❌ Opération annulée.")
-        return
-
-    tables = [
-        "episode_viewing",
-        "episodes",
-        "search_queries",
-        "subscription_events",
-        "watchlist",
-        "ratings",
-        "viewing_sessions",
-        "content",
-        "users"
-    ]
+        return False
 
     cursor = conn.cursor()
 
     try:
         logger.warning("FLUSH DATABASE INITIÉ")
 
+        # viewing_sessions et episode_viewing sont partitionnées : TRUNCATE
+        # sur le parent vide toutes les partitions (qui restent attachées)
         cursor.execute(
-            f"TRUNCATE TABLE {', '.join(tables)} RESTART IDENTITY CASCADE;"
+            f"TRUNCATE TABLE {', '.join(TABLES_CHILDREN_FIRST)} RESTART IDENTITY CASCADE;"
         )
 
         conn.commit()
 
         logger.warning("🔥 BASE DE DONNÉES COMPLÈTEMENT VIDÉE")
         print("\n🧹 BASE DE DONNÉES FLUSHÉE AVEC SUCCÈS")
+        return True
 
     except Exception as e:
         conn.rollback()
         logger.error("Erreur lors du flush de la base", exc_info=True)
         print(f"\n❌ ERREUR LORS DU FLUSH : {e}")
+        return False
 
     finally:
         cursor.close()
 
 
+def drop_cdc_slot(conn):
+    """
+    Supprime le slot de réplication logique du CDC s'il existe.
+
+    Un rechargement massif n'est pas décodable : le TRUNCATE n'est pas
+    rejoué par le MERGE des changements, et les insertions dans les tables
+    UNLOGGED (subscription_events) n'écrivent pas de WAL. Sans slot, la
+    tâche cdc_export_merge du DAG le recrée au run suivant et recharge un
+    instantané complet de users et subscription_events.
+    """
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            SELECT pg_drop_replication_slot(slot_name)
+            FROM pg_replication_slots
+            WHERE slot_name = %s
+            """,
+            (CDC_SLOT_NAME,)
+        )
+        if cursor.rowcount:
+            logger.warning(f"Slot CDC {CDC_SLOT_NAME} supprimé : instantané complet au prochain run du DAG")
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        logger.error(f"Erreur lors de la suppression du slot {CDC_SLOT_NAME}", exc_info=True)
+        raise
+
+    finally:
+        cursor.close()
+
+
+def set_tables_logged(conn, logged: bool):
+    """
+    Passe les tables StreamVision en LOGGED ou UNLOGGED.
+
+    Une table UNLOGGED n'écrit pas de WAL (insertions bien plus rapides) mais
+    est vidée après un arrêt brutal et n'est pas répliquée. Les partitions
+    sont traitées une à une (non supporté sur le parent partitionné), dans
+    l'ordre des clés étrangères : une table permanente ne peut pas référencer
+    une table UNLOGGED.
+
+    Les parents partitionnés restent permanents, donc les tables qu'ils
+    référencent (users, content, puis episodes via episode_viewing) restent
+    LOGGED elles aussi : seules les partitions et les tables filles changent.
+    Les insertions dans une table UNLOGGED (dont subscription_events, capturée
+    par le CDC) ne sont pas décodées : reset_and_bulk_load supprime le slot
+    CDC avant (drop_cdc_slot).
+    """
+    order = TABLES_CHILDREN_FIRST if not logged else list(reversed(TABLES_CHILDREN_FIRST))
+    mode = "LOGGED" if logged else "UNLOGGED"
+    cursor = conn.cursor()
+
+    try:
+        # Tables à laisser permanentes : parents partitionnés et, de proche en
+        # proche, toutes les tables référencées par une clé étrangère de l'une
+        # d'elles
+        cursor.execute("""
+            WITH RECURSIVE pinned(relid) AS (
+                SELECT partrelid FROM pg_partitioned_table
+                UNION
+                SELECT c.confrelid
+                FROM pg_constraint c
+                JOIN pinned p ON p.relid = c.conrelid
+                WHERE c.contype = 'f'
+            )
+            SELECT relid::regclass::text FROM pinned
+        """)
+        pinned = {relation for (relation,) in cursor.fetchall()}
+
+        for table in order:
+            # pg_partition_tree ne renvoie rien pour une table non partitionnée
+            cursor.execute(
+                "SELECT COALESCE(array_agg(relid::regclass::text) FILTER (WHERE isleaf), "
+                "ARRAY[%s]) FROM pg_partition_tree(%s)",
+                (table, table)
+            )
+            for relation in cursor.fetchone()[0]:
+                if relation not in pinned:
+                    cursor.execute(f"ALTER TABLE {relation} SET {mode}")
+        conn.commit()
+        logger.info(f"Tables StreamVision passées en {mode} "
+                    f"(restées LOGGED : {', '.join(sorted(pinned & set(TABLES_CHILDREN_FIRST)))})")
+
+    except Exception:
+        conn.rollback()
+        logger.error(f"Erreur lors du passage des tables en {mode}", exc_info=True)
+        raise
+
+    finally:
+        cursor.close()
+
+
+def analyze_tables(conn):
+    """Met à jour les statistiques du planificateur de toutes les tables."""
+    cursor = conn.cursor()
+    try:
+        for table in TABLES_CHILDREN_FIRST:
+            cursor.execute(f"ANALYZE {table}")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+# ============================================================================
+# PROFILS D'INDEX
+# ============================================================================
+
+def apply_index_profile(conn, profile: str):
+    """
+    Aligne les index secondaires sur un profil de INDEX_PROFILES :
+    supprime ceux qui n'en font pas partie (et les index de l'ancien schéma),
+    crée ceux qui manquent avec des workers de maintenance parallèles, puis
+    met à jour les statistiques des tables reconstruites.
+
+    Usage : 'bulk_load' avant une génération massive, 'serving' après.
+    """
+    if profile not in INDEX_PROFILES:
+        raise ValueError(f"Profil d'index inconnu : {profile}")
+
+    wanted = INDEX_PROFILES[profile]
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND indexname = ANY(%s)",
+            (list(SERVING_INDEXES) + LEGACY_INDEXES,)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+
+        dropped = sorted(existing - set(wanted))
+        for index_name in dropped:
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+        missing = [name for name in wanted if name not in existing]
+        if missing:
+            for setting, value in INDEX_BUILD_CONFIG.items():
+                cursor.execute(f"SET {setting} = %s", (str(value),))
+
+            rebuilt_tables = set()
+            for index_name in tqdm(missing, desc=f"Index ({profile})", unit="index"):
+                ddl = SERVING_INDEXES[index_name]
+                cursor.execute(ddl)
+                rebuilt_tables.add(ddl.split(" ON ")[1].split()[0])
+
+            for table in sorted(rebuilt_tables):
+                cursor.execute(f"ANALYZE {table}")
+
+        conn.commit()
+        logger.info(
+            f"Profil d'index '{profile}' appliqué : "
+            f"{len(dropped)} supprimés, {len(missing)} créés"
+        )
+
+    except Exception:
+        conn.rollback()
+        logger.error(f"Erreur lors de l'application du profil d'index '{profile}'", exc_info=True)
+        raise
+
+    finally:
+        cursor.close()
+
+
+# ============================================================================
+# TABLES DE SYNTHÈSE (TABLEAUX DE BORD)
+# ============================================================================
+
+def refresh_dashboard_summaries(conn, full_refresh: bool = False):
+    """
+    Met à jour daily_engagement_summary et content_popularity_summary
+    (fonction SQL refresh_dashboard_summaries de sql1.sql), lues par les vues
+    daily_engagement et popular_content.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT * FROM refresh_dashboard_summaries(%s)", (full_refresh,))
+        refreshed = cursor.fetchall()
+        conn.commit()
+        for summary, keys in refreshed:
+            logger.info(f"{summary} : {keys} clés recalculées")
+    except Exception:
+        conn.rollback()
+        logger.error("Erreur lors du rafraîchissement des tables de synthèse", exc_info=True)
+        raise
+    finally:
+        cursor.close()
+
+
 def generate_realistic_movie_titles(count: int = 100) -> List[str]:
     """Génère des titres de films réalistes"""
     titles = []
@@ -285,8 +724,7 @@ def generate_users(conn, n_users: int = 10000):
         age_group = calculate_age_group(birth_year)
 
         # More realistic subscription plan distribution
-        plan_weights = [0.15, 0.2, 0.3, 0.25, 0.1]  # free_trial, basic, standard, premium, family
-        subscription_plan = random.choices(SUBSCRIPTION_PLANS, weights=plan_weights)[0]
+        subscription_plan = random.choices(SUBSCRIPTION_PLANS, weights=PLAN_WEIGHTS)[0]
 
         # More varied subscription dates
         subscription_start = fake.date_between(
@@ -624,6 +1062,9 @@ def generate_viewing_sessions(conn, n_sessions: int = 100000):
         logger.error("Pas d'utilisateurs ou de contenus. Générez-les d'abord.")
         return
 
+    # Sessions sur les 180 derniers jours
+    ensure_partitions(conn, 'viewing_sessions', PARTITION_HISTORY_DAYS['viewing_sessions'])
+
     sessions_data = []
 
     # Progress bar
@@ -651,10 +1092,7 @@ def generate_viewing_sessions(conn, n_sessions: int = 100000):
         day_of_week = random.randint(0, 6)  # 0=Monday, 6=Sunday
 
         # Time distribution weights
-        if day_of_week < 5:  # Weekday
-            time_weights = [0.01] * 6 + [0.02] * 4 + [0.03] * 4 + [0.05] * 4 + [0.08] * 4 + [0.04] * 2
-        else:  # Weekend
-            time_weights = [0.02] * 6 + [0.04] * 4 + [0.06] * 4 + [0.08] * 4 + [0.1] * 4 + [0.06] * 2
+        time_weights = HOUR_WEIGHTS['weekday' if day_of_week < 5 else 'weekend']
 
         # Create session start with time bias
         days_ago = np.random.exponential(scale=30)  # More recent sessions
@@ -692,34 +1130,24 @@ def generate_viewing_sessions(conn, n_sessions: int = 100000):
         completion_rate = min(duration_seconds / (content_duration * 60), 1.0) * 100
 
         # Platform with device correlation
-        platform_weights = [0.3, 0.25, 0.2, 0.15, 0.05,
-                            0.05]  # web, mobile_ios, mobile_android, smart_tv, game_console, tablet
-        platform = random.choices(PLATFORMS, weights=platform_weights)[0]
+        platform = random.choices(PLATFORMS, weights=PLATFORM_WEIGHTS)[0]
 
         # Device type mapping with more variation
-        platform_device_map = {
-            'web': ['desktop', 'laptop'],
-            'mobile_ios': ['phone', 'tablet'],
-            'mobile_android': ['phone', 'tablet'],
-            'smart_tv': ['tv'],
-            'game_console': ['console'],
-            'tablet': ['tablet']
-        }
-        device_type = random.choice(platform_device_map[platform])
+        device_type = random.choice(PLATFORM_DEVICES[platform])
 
         # Quality based on device and time of day
-        if device_type in ['tv', 'desktop', 'laptop']:
-            if hour >= 18:  # Evening prime time
-                quality_weights = [0.05, 0.2, 0.5, 0.2, 0.05]
+        if device_type in LARGE_SCREEN_DEVICES:
+            if hour >= PRIME_TIME_HOUR:  # Evening prime time
+                quality_context = 'large_screen_prime_time'
             else:
-                quality_weights = [0.1, 0.3, 0.4, 0.15, 0.05]
+                quality_context = 'large_screen'
         else:  # Mobile devices
-            if random.random() < 0.3:  # On mobile data
-                quality_weights = [0.4, 0.5, 0.1, 0.0, 0.0]
+            if random.random() < MOBILE_DATA_SHARE:  # On mobile data
+                quality_context = 'mobile_data'
             else:  # On WiFi
-                quality_weights = [0.2, 0.5, 0.2, 0.05, 0.05]
+                quality_context = 'mobile_wifi'
 
-        quality = random.choices(QUALITIES, weights=quality_weights)[0]
+        quality = random.choices(QUALITIES, weights=QUALITY_WEIGHTS[quality_context])[0]
 
         # Buffering count - more realistic distribution
         buffering_prob = random.random()
@@ -1057,7 +1485,8 @@ def generate_subscription_events(conn, n_events: int = 15000):
 
         # Adjust for end-of-month clustering
         if random.random() < 0.3 and event_date.day > 25:
-            event_date = event_date.replace(day=random.randint(28, 31))
+            last_day = calendar.monthrange(event_date.year, event_date.month)[1]
+            event_date = event_date.replace(day=random.randint(28, last_day))
 
         # Plan transitions
         if event_type == 'subscription_start':
@@ -1319,11 +1748,198 @@ def generate_search_queries(conn, n_queries: int = 25000):
     logger.info(f"✅ {n_queries} requêtes de recherche générées avec succès")
 
 
+def build_episode_catalogue(tv_show_ids: List[int], n_episodes: int, rng) -> pd.DataFrame:
+    """
+    Construit le catalogue d'épisodes (au plus n_episodes) sans boucle par
+    épisode : saisons par série et épisodes par saison tirés en bloc, puis
+    titres, durées, dates de sortie (hebdomadaires dans une saison),
+    réalisateurs (souvent conservés d'un épisode à l'autre) et notes (premiers
+    et derniers épisodes mieux notés) calculés par colonne. Noms et
+    descriptions Faker viennent de pools générés une fois.
+    """
+    show_ids = rng.permutation(np.asarray(tv_show_ids))
+
+    # Saisons : une ligne par (série, saison)
+    seasons_per_show = _choice(rng, SEASONS_PER_SHOW, len(show_ids))
+    season_show = np.repeat(show_ids, seasons_per_show)
+    season_number = _ranks(seasons_per_show)
+    n_seasons = len(season_show)
+
+    # Épisodes : une ligne par (série, saison, épisode)
+    season_size = _choice(rng, EPISODES_PER_SEASON, n_seasons)
+    season_id = np.repeat(np.arange(n_seasons), season_size)[:n_episodes]
+    episode_number = _ranks(season_size)[:n_episodes]
+    size = np.repeat(season_size, season_size)[:n_episodes]
+    n = len(season_id)
+
+    # Titres
+    episode = pd.Series(episode_number).astype(str)
+    season = pd.Series(season_number[season_id]).astype(str)
+    pattern = rng.integers(0, 4, n)
+    base = np.select(
+        [pattern == 0, pattern == 1, pattern == 2],
+        ["Episode " + episode, "Chapter " + episode, "Part " + episode],
+        default="S" + season.str.zfill(2) + "E" + episode.str.zfill(2),
+    )
+    title = np.where(
+        rng.random(n) < 0.8,
+        base + ": " + rng.choice(EPISODE_TITLES, n),
+        base,
+    )
+
+    # Sorties hebdomadaires à partir du début de saison ; le dernier épisode
+    # de chaque saison est déjà sorti (pas de visionnage d'épisode futur)
+    season_start = np.datetime64(date.today()) - (
+        (season_size - 1) * 7 + rng.integers(1, 5 * 365 + 1, n_seasons)
+    ).astype('timedelta64[D]')
+    release_date = season_start[season_id] + ((episode_number - 1) * 7).astype('timedelta64[D]')
+
+    # Réalisateur : nouveau au premier épisode ou dans 30 % des cas, sinon le précédent
+    directors = np.array([fake.name() for _ in range(min(500, max(n, 1)))])
+    new_director = (episode_number == 1) | (rng.random(n) < 0.3)
+    director_idx = pd.Series(np.where(new_director, rng.integers(0, len(directors), n), np.nan)).ffill()
+
+    # Notes IMDB
+    edge = (episode_number == 1) | (episode_number == size)
+    near_edge = (episode_number < 3) | (episode_number > size - 2)
+    low = np.select([edge, near_edge], [7.5, 7.0], default=6.5)
+    high = np.select([edge, near_edge], [9.5, 8.5], default=8.0)
+
+    descriptions = np.array([fake.text(max_nb_chars=random.randint(50, 200)) for _ in range(min(1000, max(n, 1)))])
+
+    return pd.DataFrame({
+        'tv_show_id': season_show[season_id],
+        'season_number': season_number[season_id],
+        'episode_number': episode_number,
+        'title': title,
+        'duration_minutes': _choice(rng, EPISODE_DURATIONS, n),
+        'release_date': pd.to_datetime(release_date).date,
+        'director': directors[director_idx.astype(int).to_numpy()],
+        'imdb_rating': np.round(rng.uniform(low, high), 1),
+        'description': rng.choice(descriptions, n),
+    })
+
+
+def simulate_binge_sessions(episode_index: pd.DataFrame, sessions: pd.DataFrame, user_ids: List[int],
+                            n_views: int, rng, history_days: int = 90) -> pd.DataFrame:
+    """
+    Simule n_views visionnages d'épisodes sous forme de séances de binge :
+    chaque séance enchaîne des épisodes consécutifs d'une même série
+    (épisode suivant dans l'index par série), le dernier pouvant être
+    abandonné en cours de route. Toute séance se termine avant maintenant
+    (pas de watermark futur pour l'export incrémental). Coût linéaire en
+    n_views.
+
+    - episode_index : id, tv_show_id, duration_minutes, trié par série,
+                      saison et épisode
+    - sessions      : viewing_session_id, user_id, tv_show_id, session_start
+                      (sessions de visionnage de séries auxquelles rattacher
+                      une séance, peut être vide)
+    """
+    episode_ids = episode_index['id'].to_numpy()
+    episode_minutes = episode_index['duration_minutes'].to_numpy()
+
+    # Index par série : premier épisode et nombre d'épisodes
+    shows, show_codes = np.unique(episode_index['tv_show_id'].to_numpy(), return_inverse=True)
+    show_first = np.searchsorted(show_codes, np.arange(len(shows)))
+    show_length = np.bincount(show_codes, minlength=len(shows))
+
+    sessions = sessions[sessions['tv_show_id'].isin(shows)]
+    mean_run = BINGE_CONFIG['mean_run_length']
+    now = np.datetime64(datetime.now(), 's')
+    batches = []
+    generated = 0
+
+    while generated < n_views:
+        n_runs = int((n_views - generated) / mean_run) + 1
+
+        # Séance libre (utilisateur, série et heure au hasard) ou rattachée à
+        # une session de visionnage de série (son utilisateur, sa série, son
+        # heure). L'heure des séances libres est tirée plus bas, une fois leur
+        # durée connue.
+        user = rng.choice(np.asarray(user_ids), n_runs)
+        show = rng.integers(0, len(shows), n_runs)
+        run_start = np.full(n_runs, now)
+        session_id = np.zeros(n_runs, dtype='int64')
+
+        linked = np.zeros(n_runs, dtype=bool)
+        if len(sessions):
+            linked = rng.random(n_runs) < BINGE_CONFIG['linked_session_share']
+            picked = sessions.iloc[rng.integers(0, len(sessions), linked.sum())]
+            user[linked] = picked['user_id'].to_numpy()
+            show[linked] = np.searchsorted(shows, picked['tv_show_id'].to_numpy())
+            run_start[linked] = picked['session_start'].to_numpy().astype('datetime64[s]')
+            session_id[linked] = picked['viewing_session_id'].to_numpy()
+
+        session_id = pd.arrays.IntegerArray(session_id, mask=~linked)
+
+        # Premier épisode et longueur de la séance (bornée par la fin de la série)
+        position = (rng.random(n_runs) * show_length[show]).astype(int)
+        run_length = np.minimum(
+            np.minimum(rng.geometric(1 / mean_run, n_runs), BINGE_CONFIG['max_run_length']),
+            show_length[show] - position,
+        )
+
+        # Une ligne par épisode vu
+        run = np.repeat(np.arange(n_runs), run_length)
+        step = _ranks(run_length) - 1
+        episode_row = show_first[show[run]] + position[run] + step
+        minutes = episode_minutes[episode_row]
+        full_seconds = minutes * 60
+
+        # Épisodes enchaînés vus en entier ; le dernier de la séance peut être
+        # abandonné (court / moyen / complet)
+        last = step == run_length[run] - 1
+        casual = rng.choice(['short', 'medium', 'full'], len(run), p=[0.3, 0.4, 0.3])
+        watched = np.select(
+            [last & (casual == 'short'), last & (casual == 'medium')],
+            [rng.integers(300, 901, len(run)), (full_seconds * rng.uniform(0.3, 0.7, len(run))).astype(int)],
+            default=full_seconds,
+        )
+        watched = np.maximum(np.minimum(watched, np.minimum(full_seconds, 3600)), 300)
+
+        # Heure de début : fin de l'épisode précédent + enchaînement ou pause
+        gap = np.where(
+            rng.random(len(run)) < BINGE_CONFIG['autoplay_share'],
+            rng.integers(10, 121, len(run)),
+            rng.integers(300, 1801, len(run)),
+        )
+        elapsed = np.cumsum(watched + gap) - (watched + gap)
+        offset = elapsed - elapsed[np.repeat(np.cumsum(run_length) - run_length, run_length)]
+
+        # Durée de chaque séance (fin du dernier épisode) : la séance tient
+        # dans la période d'historique et se termine avant maintenant
+        run_span = np.zeros(n_runs, dtype='int64')
+        run_span[run[last]] = offset[last] + watched[last]
+        latest_start = now - run_span.astype('timedelta64[s]')
+        window = np.maximum(history_days * 86400 - run_span, 1)
+        run_start = np.where(
+            linked,
+            np.minimum(run_start, latest_start),
+            latest_start - rng.integers(0, window).astype('timedelta64[s]'),
+        )
+        start_time = run_start[run] + offset.astype('timedelta64[s]')
+
+        batches.append(pd.DataFrame({
+            'viewing_session_id': session_id[run],
+            'episode_id': episode_ids[episode_row],
+            'user_id': user[run],
+            'start_time': start_time,
+            'end_time': start_time + watched.astype('timedelta64[s]'),
+            'duration_watched': watched,
+            'completion_rate': np.round(np.minimum(watched / full_seconds, 1.0) * 100, 2),
+        }))
+        generated += len(run)
+
+    return pd.concat(batches, ignore_index=True).iloc[:n_views]
+
+
 def generate_episodes_and_viewing(conn, n_episodes: int = 5000, n_episode_views: int = 30000):
     """Génère des épisodes (pour les séries) et leur visionnage"""
     logger.info(f"Début de la génération de {n_episodes} épisodes et {n_episode_views} visionnages d'épisodes...")
 
     cursor = conn.cursor()
+    rng = np.random.default_rng()
 
     # Récupération des séries TV seulement
     cursor.execute("SELECT id, title FROM content WHERE content_type = 'tv_show' LIMIT 200")
@@ -1347,311 +1963,348 @@ def generate_episodes_and_viewing(conn, n_episodes: int = 5000, n_episode_views:
     # ÉTAPE 1 : Génération des épisodes
     # ============================================================================
     logger.info("Génération des épisodes...")
-    episodes_data = []
-
-    # Shuffle TV shows for more randomness
-    random.shuffle(tv_shows)
-
-    for tv_show_id, tv_show_title in tv_shows:
-        # Variable number of seasons
-        n_seasons = random.choices([1, 2, 3, 4, 5, 6], weights=[0.1, 0.2, 0.3, 0.2, 0.15, 0.05])[0]
 
-        for season in range(1, n_seasons + 1):
-            # Variable episodes per season
-            n_episodes_per_season = random.choices(
-                [6, 8, 10, 12, 13, 16, 20, 22],
-                weights=[0.05, 0.1, 0.2, 0.3, 0.2, 0.1, 0.03, 0.02]
-            )[0]
-
-            for episode in range(1, n_episodes_per_season + 1):
-                # Episode title patterns
-                episode_title_patterns = [
-                    f"Episode {episode}",
-                    f"Chapter {episode}",
-                    f"Part {episode}",
-                    f"S{season:02d}E{episode:02d}"
-                ]
-
-                title_base = random.choice(episode_title_patterns)
-
-                # Add descriptive title
-                descriptive_titles = [
-                    'Pilot', 'Beginnings', 'Endings', 'The Start', 'The Finish',
-                    'Unexpected', 'Revelations', 'Secrets', 'Truth', 'Lies',
-                    'Alliances', 'Betrayals', 'Hope', 'Despair', 'Love', 'Hate',
-                    'Crossroads', 'Turning Point', 'Last Stand', 'New Dawn'
-                ]
-
-                if random.random() < 0.8:
-                    episode_title = f"{title_base}: {random.choice(descriptive_titles)}"
-                else:
-                    episode_title = title_base
-
-                # Duration with variation
-                duration_minutes = random.choices(
-                    [20, 30, 40, 45, 50, 55, 60, 75],
-                    weights=[0.05, 0.1, 0.2, 0.25, 0.2, 0.1, 0.08, 0.02]
-                )[0]
-
-                # Release date - episodes within a season are close together
-                season_start = fake.date_between(
-                    start_date=date.today() - timedelta(days=5 * 365),
-                    end_date=date.today() - timedelta(days=30)
-                )
-
-                # Episodes released weekly
-                episode_offset = (episode - 1) * 7
-                release_date = season_start + timedelta(days=episode_offset)
-
-                # Director - sometimes same for season, sometimes different
-                if episode == 1 or random.random() < 0.3:
-                    director = fake.name()
-                else:
-                    # Keep same director for some episodes
-                    director = episodes_data[-1][6] if episodes_data else fake.name()
-
-                # IMDB rating - first and last episodes often rated higher
-                if episode == 1 or episode == n_episodes_per_season:
-                    imdb_rating = round(random.uniform(7.5, 9.5), 1)
-                elif episode < 3 or episode > n_episodes_per_season - 2:
-                    imdb_rating = round(random.uniform(7.0, 8.5), 1)
-                else:
-                    imdb_rating = round(random.uniform(6.5, 8.0), 1)
-
-                # Description length varies
-                description = fake.text(max_nb_chars=random.randint(50, 200))
-
-                episode_record = (
-                    tv_show_id, season, episode, episode_title, duration_minutes,
-                    release_date, director, float(imdb_rating), description
-                )
-
-                episodes_data.append(episode_record)
-
-                # Limiter le nombre total d'épisodes
-                if len(episodes_data) >= n_episodes:
-                    break
-
-            if len(episodes_data) >= n_episodes:
-                break
-
-        if len(episodes_data) >= n_episodes:
-            break
-
-    # Shuffle episodes before insertion
-    random.shuffle(episodes_data)
-
-    # Insertion des épisodes
-    if episodes_data:
-        query = """
-            INSERT INTO episodes (
-                tv_show_id, season_number, episode_number, title, duration_minutes,
-                release_date, director, imdb_rating, description
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        execute_batch(cursor, query, episodes_data)
+    episodes = build_episode_catalogue([tv_show_id for tv_show_id, _ in tv_shows], n_episodes, rng)
+    copy_dataframe(cursor, 'episodes', episodes)
 
     conn.commit()
-    logger.info(f"✅ {len(episodes_data)} épisodes générés avec succès")
+    logger.info(f"✅ {len(episodes)} épisodes générés avec succès")
 
     # ============================================================================
     # ÉTAPE 2 : Génération des visionnages d'épisodes
     # ============================================================================
     logger.info("Génération des visionnages d'épisodes...")
 
-    # Récupération des IDs des épisodes
-    cursor.execute("SELECT id, duration_minutes FROM episodes LIMIT 1000")
-    episodes = cursor.fetchall()
+    # Index des épisodes par série, dans l'ordre de visionnage
+    cursor.execute("""
+        SELECT id, tv_show_id, duration_minutes
+        FROM episodes
+        ORDER BY tv_show_id, season_number, episode_number
+    """)
+    episode_index = pd.DataFrame(cursor.fetchall(), columns=['id', 'tv_show_id', 'duration_minutes'])
 
     # Récupération des IDs utilisateurs
-    cursor.execute("SELECT id FROM users WHERE is_active = TRUE LIMIT 2000")
+    cursor.execute("SELECT id FROM users WHERE is_active = TRUE")
     user_ids = [row[0] for row in cursor.fetchall()]
 
-    # Récupération des IDs de sessions de visionnage pour les séries
+    history_days = PARTITION_HISTORY_DAYS['episode_viewing']
+
+    # Sessions de visionnage de séries sur la période (partitions récentes seulement)
     cursor.execute("""
-        SELECT vs.id, vs.user_id 
+        SELECT vs.id, vs.user_id, vs.content_id, vs.session_start
         FROM viewing_sessions vs
         JOIN content c ON vs.content_id = c.id
         WHERE c.content_type = 'tv_show'
-        LIMIT 5000
-    """)
-    viewing_sessions_data = cursor.fetchall()
+          AND vs.session_start >= NOW() - make_interval(days => %s)
+    """, (history_days,))
+    sessions = pd.DataFrame(
+        cursor.fetchall(), columns=['viewing_session_id', 'user_id', 'tv_show_id', 'session_start']
+    )
+
+    if episode_index.empty or not user_ids:
+        logger.error("Pas d'épisodes ou d'utilisateurs actifs. Générez-les d'abord.")
+        cursor.close()
+        return
 
-    episode_viewing_data = []
+    # Visionnages sur les 90 derniers jours
+    ensure_partitions(conn, 'episode_viewing', history_days)
 
-    # Progress bar
-    pbar = tqdm(total=min(n_episode_views, 30000), desc="Génération des visionnages d'épisodes", unit="view")
+    episode_views = simulate_binge_sessions(
+        episode_index, sessions, user_ids, n_episode_views, rng, history_days
+    )
+    copy_dataframe(cursor, 'episode_viewing', episode_views)
 
-    for i in range(min(n_episode_views, 30000)):
-        # Choose viewing session or create new
-        if viewing_sessions_data and random.random() < 0.6:
-            viewing_session_id, user_id = random.choice(viewing_sessions_data)
-        else:
-            viewing_session_id = None
-            user_id = random.choice(user_ids)
+    conn.commit()
+    cursor.close()
+    logger.info(f"✅ {len(episode_views)} visionnages d'épisodes générés avec succès")
 
-        # Choose episode - binge watching patterns
-        episode_id, episode_duration = random.choice(episodes)
-
-        # For binge watching, multiple episodes in sequence
-        if random.random() < 0.3 and i > 0:
-            # Continue watching next episode
-            last_viewing = episode_viewing_data[-1]
-            last_episode_id = last_viewing[1]
-            last_user_id = last_viewing[2]
-            last_end_time = last_viewing[4]
-
-            # Get next episode (simplified - in real case would query database)
-            if user_id == last_user_id and random.random() < 0.7:
-                # Same user continues binge
-                start_time = last_end_time + timedelta(minutes=random.randint(1, 60))
-            else:
-                start_time = fake.date_time_between(
-                    start_date=datetime.now() - timedelta(days=90),
-                    end_date=datetime.now()
-                )
-        else:
-            # New viewing session
-            start_time = fake.date_time_between(
-                start_date=datetime.now() - timedelta(days=90),
-                end_date=datetime.now()
-            )
 
-        # Watch duration - binge vs casual watching
-        if random.random() < 0.4:  # Binge watching
-            duration_watched = episode_duration * 60  # Watch full episode
-        else:  # Casual watching
-            watch_ratio = random.choices(['short', 'medium', 'full'], weights=[0.3, 0.4, 0.3])[0]
-            if watch_ratio == 'short':
-                duration_watched = random.randint(300, 900)  # 5-15 minutes
-            elif watch_ratio == 'medium':
-                duration_watched = random.randint(int(episode_duration * 60 * 0.3), int(episode_duration * 60 * 0.7))
-            else:  # full
-                duration_watched = episode_duration * 60
-
-        # Ensure duration is valid
-        max_watch = min(episode_duration * 60, 3600)
-        duration_watched = min(duration_watched, max_watch)
-        duration_watched = max(300, duration_watched)  # At least 5 minutes
+# ============================================================================
+# GÉNÉRATION COMPLÈTE ET CHARGEMENT MASSIF
+# ============================================================================
 
-        # Completion rate
-        completion_rate = min(duration_watched / (episode_duration * 60), 1.0) * 100
+def generate_all(conn, sizes: Dict[str, int] = None):
+    """Génère toutes les tables (volumes : GENERATION_SIZES, surchargés par sizes)"""
+    sizes = {**GENERATION_SIZES, **(sizes or {})}
 
-        viewing_record = (
-            viewing_session_id, episode_id, user_id, start_time,
-            start_time + timedelta(seconds=duration_watched),
-            duration_watched, round(completion_rate, 2)
-        )
+    generate_users(conn, n_users=sizes['n_users'])
+    generate_content(conn, n_content=sizes['n_content'])
+    generate_viewing_sessions(conn, n_sessions=sizes['n_sessions'])
+    generate_ratings(conn, n_ratings=sizes['n_ratings'])
+    generate_watchlist(conn, n_items=sizes['n_items'])
+    generate_subscription_events(conn, n_events=sizes['n_events'])
+    generate_search_queries(conn, n_queries=sizes['n_queries'])
+    generate_episodes_and_viewing(conn, n_episodes=sizes['n_episodes'],
+                                  n_episode_views=sizes['n_episode_views'])
 
-        episode_viewing_data.append(viewing_record)
 
-        # Insertion par lots de 1000
-        if len(episode_viewing_data) >= 1000:
-            query = """
-                INSERT INTO episode_viewing (
-                    viewing_session_id, episode_id, user_id, start_time,
-                    end_time, duration_watched, completion_rate
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-            execute_batch(cursor, query, episode_viewing_data)
-            episode_viewing_data = []
+def reset_and_bulk_load(conn, sizes: Dict[str, int] = None, confirm: bool = None) -> Dict[str, float]:
+    """
+    Vide la base puis la régénère en mode chargement massif :
+    1. TRUNCATE de toutes les tables et suppression du slot CDC (le
+       rechargement n'est pas décodable, voir drop_cdc_slot)
+    2. création des partitions de l'historique généré (une partition créée
+       pendant la génération serait permanente et écrirait dans le WAL)
+    3. partitions et tables filles en UNLOGGED (pas de WAL) et profil
+       d'index bulk_load ; users, content et episodes, référencées par les
+       parents partitionnés, restent LOGGED
+    4. génération
+    5. tables en LOGGED (toujours, même en cas d'erreur), profil d'index
+       serving, ANALYZE et tables de synthèse
+
+    Avec wal_level = logical (sql3.sql), le passage en LOGGED écrit chaque
+    table une fois dans le WAL : le gain vient des insertions sans WAL ni
+    maintenance d'index sur les grosses tables (partitions de sessions et
+    d'épisodes vus, évaluations, watchlist, événements, recherches).
+
+    Retourne la durée de chaque étape (secondes), None si le flush est annulé.
+    """
+    timings = {}
 
-        pbar.update(1)
+    def step(name, func, *args, **kwargs):
+        start = perf_counter()
+        result = func(*args, **kwargs)
+        timings[name] = round(perf_counter() - start, 3)
+        return result
 
-    # Insertion des données restantes
-    if episode_viewing_data:
-        query = """
-            INSERT INTO episode_viewing (
-                viewing_session_id, episode_id, user_id, start_time,
-                end_time, duration_watched, completion_rate
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        execute_batch(cursor, query, episode_viewing_data)
+    if not step('flush', flush_database, conn, confirm):
+        return None
+    step('cdc_slot', drop_cdc_slot, conn)
 
-    pbar.close()
-    conn.commit()
-    cursor.close()
-    logger.info(f"✅ {min(n_episode_views, 30000)} visionnages d'épisodes générés avec succès")
+    for table, days_back in PARTITION_HISTORY_DAYS.items():
+        step(f'partitions_{table}', ensure_partitions, conn, table, days_back)
 
+    step('unlogged', set_tables_logged, conn, logged=False)
+    try:
+        step('bulk_load_indexes', apply_index_profile, conn, 'bulk_load')
+        step('generate', generate_all, conn, sizes)
+    finally:
+        step('logged', set_tables_logged, conn, logged=True)
 
-def verify_data(conn):
-    """Vérifie et affiche un récapitulatif des données générées"""
-    logger.info("Vérification des données générées...")
+    step('serving_indexes', apply_index_profile, conn, 'serving')
+    step('analyze', analyze_tables, conn)
+    step('summaries', refresh_dashboard_summaries, conn, full_refresh=True)
 
+    print("\n⏱️  Durée par étape:")
+    for name, seconds in timings.items():
+        print(f"  • {name:30} : {seconds:>10.3f}s")
+    print(f"  • {'TOTAL':30} : {sum(timings.values()):>10.3f}s")
+
+    return timings
+
+
+def expected_distributions() -> Dict[str, Dict[str, float]]:
+    """
+    Répartitions attendues des plans, plateformes et qualités, calculées à
+    partir des poids de génération (PLAN_WEIGHTS, PLATFORM_WEIGHTS, ...).
+    """
+    def normalize(weights):
+        total = sum(weights)
+        return [w / total for w in weights]
+
+    platforms = dict(zip(PLATFORMS, normalize(PLATFORM_WEIGHTS)))
+
+    # Qualité : mélange des contextes (grand écran en soirée / en journée,
+    # mobile sur données / Wi-Fi). Le jour de semaine est tiré uniformément.
+    prime_time = (
+        5 / 7 * sum(normalize(HOUR_WEIGHTS['weekday'])[PRIME_TIME_HOUR:])
+        + 2 / 7 * sum(normalize(HOUR_WEIGHTS['weekend'])[PRIME_TIME_HOUR:])
+    )
+    large_screen = sum(
+        share / len(PLATFORM_DEVICES[platform])
+        for platform, share in platforms.items()
+        for device in PLATFORM_DEVICES[platform]
+        if device in LARGE_SCREEN_DEVICES
+    )
+    contexts = {
+        'large_screen_prime_time': large_screen * prime_time,
+        'large_screen': large_screen * (1 - prime_time),
+        'mobile_data': (1 - large_screen) * MOBILE_DATA_SHARE,
+        'mobile_wifi': (1 - large_screen) * (1 - MOBILE_DATA_SHARE),
+    }
+
+    return {
+        'subscription_plan': dict(zip(SUBSCRIPTION_PLANS, normalize(PLAN_WEIGHTS))),
+        'platform': platforms,
+        'quality': {
+            quality: sum(share * normalize(QUALITY_WEIGHTS[context])[i] for context, share in contexts.items())
+            for i, quality in enumerate(QUALITIES)
+        },
+    }
+
+
+def _table_stats(cursor, table: str, stats: List[Tuple[str, str, str]], sample_percent: float = None):
+    """
+    Calcule toutes les statistiques d'une table en un seul parcours
+    (agrégats avec FILTER), éventuellement sur un échantillon TABLESAMPLE.
+    """
+    sample = f" TABLESAMPLE SYSTEM ({sample_percent})" if sample_percent else ""
+    columns = ",\n            ".join(f'{expr} AS "{key}"' for key, expr, _ in stats)
+    cursor.execute(f"""
+        SELECT
+            {columns}
+        FROM {table}{sample}
+    """)
+    return dict(cursor.fetchone())
+
+
+def _estimated_rows(cursor, tables: List[str]) -> Dict[str, int]:
+    """Nombre de lignes estimé (pg_class.reltuples, partitions comprises)."""
+    cursor.execute("""
+        SELECT t.table_name, SUM(GREATEST(c.reltuples, 0))::BIGINT AS estimated_rows
+        FROM unnest(%s::TEXT[]) AS t(table_name)
+        JOIN pg_class c
+          ON c.oid = to_regclass(t.table_name)
+          OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(t.table_name))
+        WHERE c.relkind = 'r'
+        GROUP BY t.table_name
+    """, (tables,))
+    return {row['table_name']: row['estimated_rows'] for row in cursor.fetchall()}
+
+
+def collect_stats(conn, fast: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Statistiques par table (VERIFY_STATS), une requête par table.
+
+    fast : nombre de lignes estimé d'après pg_class.reltuples (à jour après
+    ANALYZE) et autres statistiques sur un échantillon TABLESAMPLE pour les
+    tables d'au moins VERIFY_CONFIG['fast_min_rows'] lignes ; les comptes et
+    sommes de l'échantillon sont extrapolés, les moyennes gardées telles quelles.
+    """
     cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        estimated = _estimated_rows(cursor, list(VERIFY_STATS)) if fast else {}
+
+        results = {}
+        for table, stats in VERIFY_STATS.items():
+            rows = estimated.get(table, 0)
+            if not fast or rows < VERIFY_CONFIG['fast_min_rows']:
+                results[table] = {**_table_stats(cursor, table, stats), 'estimated': False}
+                continue
+
+            sample = _table_stats(cursor, table, stats, VERIFY_CONFIG['sample_percent'])
+            scale = rows / sample['rows'] if sample['rows'] else 0
+            results[table] = {
+                key: (sample[key] * scale if kind in ('count', 'sum') and sample[key] is not None
+                      else sample[key])
+                for key, _, kind in stats
+            }
+            results[table].update(rows=rows, estimated=True)
+
+        return results
+    finally:
+        cursor.close()
+
+
+def distribution_checks(stats: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Compare les répartitions observées aux répartitions attendues :
+    ratio = part observée / part attendue, hors tolérance si
+    |ratio - 1| > VERIFY_CONFIG['tolerance'].
+    """
+    observed = {
+        'subscription_plan': ('users', 'plan', SUBSCRIPTION_PLANS),
+        'platform': ('viewing_sessions', 'platform', PLATFORMS),
+        'quality': ('viewing_sessions', 'quality', QUALITIES),
+    }
+
+    checks = []
+    for dimension, expected in expected_distributions().items():
+        table, prefix, values = observed[dimension]
+        total = stats[table]['rows']
+        for value in values:
+            actual_share = float(stats[table][f"{prefix}_{value}"]) / total if total else None
+            expected_share = expected[value]
+            ratio = (
+                actual_share / expected_share
+                if actual_share is not None and expected_share else None
+            )
+            checks.append({
+                'dimension': dimension,
+                'value': value,
+                'expected_share': round(expected_share, 4),
+                'actual_share': round(actual_share, 4) if actual_share is not None else None,
+                'ratio': round(ratio, 3) if ratio is not None else None,
+                'ok': ratio is not None and abs(ratio - 1) <= VERIFY_CONFIG['tolerance'],
+            })
+    return checks
+
+
+def verify_data(conn, fast: bool = False, report_path: str = None):
+    """
+    Vérifie et affiche un récapitulatif des données générées
 
-    # Requêtes de vérification
-    queries = [
-        ("Utilisateurs", "SELECT COUNT(*) as count FROM users"),
-        ("Utilisateurs actifs", "SELECT COUNT(*) as count FROM users WHERE is_active = TRUE"),
-        ("Contenus", "SELECT COUNT(*) as count FROM content"),
-        ("Films", "SELECT COUNT(*) as count FROM content WHERE content_type = 'movie'"),
-        ("Séries TV", "SELECT COUNT(*) as count FROM content WHERE content_type = 'tv_show'"),
-        ("Documentaires", "SELECT COUNT(*) as count FROM content WHERE content_type = 'documentary'"),
-        ("Sessions de visionnage", "SELECT COUNT(*) as count FROM viewing_sessions"),
-        ("Évaluations", "SELECT COUNT(*) as count FROM ratings"),
-        ("Liste de visionnage", "SELECT COUNT(*) as count FROM watchlist"),
-        ("Événements d'abonnement", "SELECT COUNT(*) as count FROM subscription_events"),
-        ("Requêtes de recherche", "SELECT COUNT(*) as count FROM search_queries"),
-        ("Épisodes", "SELECT COUNT(*) as count FROM episodes"),
-        ("Visionnages d'épisodes", "SELECT COUNT(*) as count FROM episode_viewing"),
+    Une requête par table (voir collect_stats), contrôles de répartition
+    écrits en JSON dans report_path (par défaut VERIFY_CONFIG['report_path']).
+    Retourne le rapport.
+    """
+    logger.info(f"Vérification des données générées{' (mode rapide)' if fast else ''}...")
+
+    stats = collect_stats(conn, fast)
+    checks = distribution_checks(stats)
+
+    labels = [
+        ("Utilisateurs", 'users', 'rows'),
+        ("Utilisateurs actifs", 'users', 'active'),
+        ("Contenus", 'content', 'rows'),
+        ("Films", 'content', 'type_movie'),
+        ("Séries TV", 'content', 'type_tv_show'),
+        ("Documentaires", 'content', 'type_documentary'),
+        ("Sessions de visionnage", 'viewing_sessions', 'rows'),
+        ("Évaluations", 'ratings', 'rows'),
+        ("Liste de visionnage", 'watchlist', 'rows'),
+        ("Événements d'abonnement", 'subscription_events', 'rows'),
+        ("Requêtes de recherche", 'search_queries', 'rows'),
+        ("Épisodes", 'episodes', 'rows'),
+        ("Visionnages d'épisodes", 'episode_viewing', 'rows'),
     ]
 
     print("\n" + "=" * 60)
-    print("RÉCAPITULATIF DES DONNÉES GÉNÉRÉES")
+    print("RÉCAPITULATIF DES DONNÉES GÉNÉRÉES" + (" (ESTIMATIONS)" if fast else ""))
     print("=" * 60)
 
-    total_records = 0
-    for label, query in queries:
-        cursor.execute(query)
-        result = cursor.fetchone()
-        count = result['count'] if result else 0
-        total_records += count
-        print(f"{label:30} : {count:>10,}")
+    for label, table, key in labels:
+        marker = " ~" if stats[table]['estimated'] else ""
+        print(f"{label:30} : {int(stats[table][key] or 0):>10,}{marker}")
 
+    total_records = sum(int(table_stats['rows']) for table_stats in stats.values())
     print("-" * 60)
-    print(f"{'TOTAL':30} : {total_records:>10,}")
+    print(f"{'TOTAL (lignes des tables)':30} : {total_records:>10,}")
     print("=" * 60)
 
     # Quelques statistiques supplémentaires
     print("\n📊 Statistiques supplémentaires:")
 
-    # Temps de visionnage total
-    cursor.execute("SELECT SUM(duration_seconds) as total_watch_seconds FROM viewing_sessions")
-    result = cursor.fetchone()
-    total_seconds = result['total_watch_seconds'] or 0
-    total_hours = total_seconds / 3600
+    total_hours = float(stats['viewing_sessions']['watch_seconds'] or 0) / 3600
     print(f"• Temps total de visionnage : {total_hours:,.0f} heures")
+    print(f"• Note moyenne : {float(stats['ratings']['avg_rating'] or 0):.2f}/5")
+    print(f"• Taux de complétion moyen : {float(stats['viewing_sessions']['avg_completion'] or 0):.1f}%")
+
+    # Répartitions observées / attendues
+    print("\n📈 Répartitions (observé / attendu):")
+    for check in checks:
+        actual = f"{check['actual_share'] * 100:5.1f}%" if check['actual_share'] is not None else "    -"
+        status = "✅" if check['ok'] else "⚠️"
+        print(f"  {status} {check['dimension']:17} {check['value']:15} : "
+              f"{actual} / {check['expected_share'] * 100:5.1f}% (ratio {check['ratio']})")
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'fast': fast,
+        'tables': stats,
+        'distribution_checks': checks,
+    }
 
-    # Note moyenne
-    cursor.execute("SELECT AVG(rating) as avg_rating FROM ratings")
-    result = cursor.fetchone()
-    avg_rating = result['avg_rating'] or 0
-    print(f"• Note moyenne : {avg_rating:.2f}/5")
+    report_path = report_path or VERIFY_CONFIG['report_path']
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=float)
+    logger.info(f"Rapport de vérification écrit dans {report_path}")
 
-    # Taux de complétion moyen
-    cursor.execute("SELECT AVG(completion_rate) as avg_completion FROM viewing_sessions")
-    result = cursor.fetchone()
-    avg_completion = result['avg_completion'] or 0
-    print(f"• Taux de complétion moyen : {avg_completion:.1f}%")
+    return report
 
-    # Répartition des abonnements
-    cursor.execute("""
-        SELECT subscription_plan, COUNT(*) as count,
-               ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 1) as percentage
-        FROM users
-        GROUP BY subscription_plan
-        ORDER BY count DESC
-    """)
-    print("\n📈 Répartition des plans d'abonnement:")
-    for row in cursor.fetchall():
-        print(f"  • {row['subscription_plan']:15} : {row['count']:>6,} ({row['percentage']}%)")
 
-    cursor.close()
-
-
-def main():
-    """Point d'entrée principal"""
+def interactive_menu():
+    """Menu interactif (lancement sans argument)"""
     print("\n" + "=" * 70)
     print("GÉNÉRATEUR DE DONNÉES STREAMVISION - PLATEFORME DE STREAMING")
     print("=" * 70)
@@ -1671,23 +2324,20 @@ def main():
         print("2. ⚙️  Personnaliser la génération")
         print("3. 🔍 Vérifier les données existantes")
         print("4. 🧹 FLUSH DATABASE (SUPPRIMER TOUT)")
-        print("5. 🚪 Quitter")
+        print("5. ⚡ Flush + régénération complète en chargement massif")
+        print("6. 🚪 Quitter")
 
-        choice = input("\nVotre choix [1-4]: ").strip()
+        choice = input("\nVotre choix [1-6]: ").strip()
 
         if choice == "1":
             # Génération complète
             print("\n🎬 Démarrage de la génération complète...")
 
-            generate_users(conn, n_users=10000)
-            generate_content(conn, n_content=5000)
-            generate_viewing_sessions(conn, n_sessions=100000)
-            generate_ratings(conn, n_ratings=30000)
-            generate_watchlist(conn, n_items=20000)
-            generate_subscription_events(conn, n_events=15000)
-            generate_search_queries(conn, n_queries=25000)
-            generate_episodes_and_viewing(conn, n_episodes=5000, n_episode_views=30000)
-
+            # Index secondaires supprimés pendant la génération, reconstruits après
+            apply_index_profile(conn, 'bulk_load')
+            generate_all(conn)
+            apply_index_profile(conn, 'serving')
+            refresh_dashboard_summaries(conn, full_refresh=True)
             verify_data(conn)
 
         elif choice == "2":
@@ -1709,16 +2359,22 @@ def main():
             if input("Générer la watchlist? [O/n]: ").strip().lower() != 'n':
                 generate_watchlist(conn, n_items=20000)
 
+            refresh_dashboard_summaries(conn)
             verify_data(conn)
 
         elif choice == "3":
             # Vérification seulement
-            verify_data(conn)
+            fast = input("Mode rapide (estimations pg_class + échantillon)? [o/N]: ").strip().lower() == 'o'
+            verify_data(conn, fast=fast)
 
         elif choice == "4":
             flush_database(conn)
 
         elif choice == "5":
+            if reset_and_bulk_load(conn) is not None:
+                verify_data(conn)
+
+        elif choice == "6":
             print("\nAu revoir!")
             sys.exit(0)
 
@@ -1748,5 +2404,110 @@ def main():
         sys.exit(1)
 
 
+# ============================================================================
+# LIGNE DE COMMANDE
+# ============================================================================
+
+# Options de volume → clés de GENERATION_SIZES
+SIZE_OPTIONS = {
+    '--users': 'n_users',
+    '--content': 'n_content',
+    '--sessions': 'n_sessions',
+    '--ratings': 'n_ratings',
+    '--watchlist': 'n_items',
+    '--events': 'n_events',
+    '--queries': 'n_queries',
+    '--episodes': 'n_episodes',
+    '--episode-views': 'n_episode_views',
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Générateur de données StreamVision (sans commande : menu interactif)"
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    generate = commands.add_parser("generate", help="Génération complète (profil d'index bulk_load)")
+    reset = commands.add_parser(
+        "reset", help="Flush puis régénération en chargement massif (UNLOGGED, bulk_load)"
+    )
+    for command in (generate, reset):
+        for option, key in SIZE_OPTIONS.items():
+            command.add_argument(option, dest=key, type=int, default=GENERATION_SIZES[key],
+                                 help=f"défaut : {GENERATION_SIZES[key]}")
+    reset.add_argument("--yes", action="store_true", help="Confirme le flush sans saisie")
+    reset.add_argument("--json", help="Écrit les durées par étape dans ce fichier JSON")
+
+    verify = commands.add_parser("verify", help="Vérification des données")
+    verify.add_argument("--fast", action="store_true",
+                        help="Estimations pg_class.reltuples et échantillon TABLESAMPLE")
+    verify.add_argument("--report", help=f"Rapport JSON (défaut : {VERIFY_CONFIG['report_path']})")
+
+    flush = commands.add_parser("flush", help="Supprime toutes les données")
+    flush.add_argument("--yes", action="store_true", help="Confirme sans saisie")
+
+    index_profile = commands.add_parser("index-profile", help="Applique un profil d'index")
+    index_profile.add_argument("profile", choices=list(INDEX_PROFILES))
+
+    return parser.parse_args(argv)
+
+
+def run_command(conn, args):
+    sizes = {key: getattr(args, key) for key in SIZE_OPTIONS.values() if hasattr(args, key)}
+
+    if args.command == "generate":
+        apply_index_profile(conn, 'bulk_load')
+        generate_all(conn, sizes)
+        apply_index_profile(conn, 'serving')
+        refresh_dashboard_summaries(conn, full_refresh=True)
+        verify_data(conn)
+
+    elif args.command == "reset":
+        timings = reset_and_bulk_load(conn, sizes, confirm=True if args.yes else None)
+        if timings is None:
+            sys.exit(1)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({'sizes': sizes, 'timings': timings}, f, indent=2)
+        verify_data(conn, fast=True)
+
+    elif args.command == "verify":
+        verify_data(conn, fast=args.fast, report_path=args.report)
+
+    elif args.command == "flush":
+        if not flush_database(conn, confirm=True if args.yes else None):
+            sys.exit(1)
+
+    elif args.command == "index-profile":
+        apply_index_profile(conn, args.profile)
+
+
+def main():
+    """
+    Point d'entrée principal
+
+    Sans argument : menu interactif. Avec une commande (scripts, boucles de
+    benchmark), aucune saisie n'est demandée si --yes est fourni :
+        python generate_streaming_data1.py reset --yes --sessions 1000000 --json timings.json
+        python generate_streaming_data1.py verify --fast
+    """
+    args = parse_args()
+    if args.command is None:
+        interactive_menu()
+        return
+
+    conn = get_db_connection()
+    try:
+        run_command(conn, args)
+    except Exception as e:
+        logger.error(f"Erreur fatale: {e}", exc_info=True)
+        print(f"\n❌ ERREUR: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+        logger.info("Connexion PostgreSQL fermée")
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -45,8 +45,10 @@ CREATE TABLE content (
 );
 
 -- 3. Table VIEWING_SESSIONS (Sessions de visionnage)
+--    Partitionnée par mois sur session_start (voir "Partitionnement" plus bas) :
+--    la clé primaire doit inclure la colonne de partitionnement
 CREATE TABLE viewing_sessions (
-    id BIGSERIAL PRIMARY KEY,
+    id BIGSERIAL,
     user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     content_id INT NOT NULL REFERENCES content(id) ON DELETE CASCADE,
     session_start TIMESTAMP NOT NULL,
@@ -61,8 +63,9 @@ CREATE TABLE viewing_sessions (
     buffering_count INT DEFAULT 0,
     avg_bitrate INT, -- en kbps
     city VARCHAR(100),
-    ip_address VARCHAR(45)
-);
+    ip_address VARCHAR(45),
+    PRIMARY KEY (id, session_start)
+) PARTITION BY RANGE (session_start);
 
 -- 4. Table RATINGS (Évaluations)
 CREATE TABLE ratings (
@@ -130,70 +133,200 @@ CREATE TABLE episodes (
 );
 
 -- 9. Table EPISODE_VIEWING (Visionnage d'épisodes)
+--    Partitionnée par mois sur start_time. viewing_session_id n'a
+--    volontairement pas de clé étrangère : viewing_sessions.id seul n'est plus
+--    unique (clé (id, session_start)), et une clé composite
+--    (viewing_session_id, session_start) vers viewing_sessions empêcherait de
+--    passer ses partitions en UNLOGGED pendant un chargement massif (une table
+--    permanente, le parent episode_viewing, les référencerait). L'intégrité est
+--    vérifiée après chargement par le test dbt relationships de
+--    stg_episode_viewing.viewing_session_id (_staging__sources.yml).
 CREATE TABLE episode_viewing (
-    id BIGSERIAL PRIMARY KEY,
-    viewing_session_id BIGINT REFERENCES viewing_sessions(id) ON DELETE CASCADE,
+    id BIGSERIAL,
+    viewing_session_id BIGINT,
     episode_id INT NOT NULL REFERENCES episodes(id) ON DELETE CASCADE,
     user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     start_time TIMESTAMP NOT NULL,
     end_time TIMESTAMP,
     duration_watched INT NOT NULL,
-    completion_rate DECIMAL(5,2)
-);
+    completion_rate DECIMAL(5,2),
+    PRIMARY KEY (id, start_time)
+) PARTITION BY RANGE (start_time);
+
+-- ============================================
+-- Partitionnement mensuel (viewing_sessions, episode_viewing)
+-- ============================================
+-- Une partition par mois : <table>_yYYYYmMM, bornes [1er du mois, 1er du mois suivant).
+-- Les requêtes filtrées sur session_start / start_time (exports incrémentaux,
+-- watermarks, vues quotidiennes) ne lisent que les partitions concernées.
+-- La partition DEFAULT reçoit les lignes hors des partitions créées : elle doit
+-- rester vide en régime normal (create_monthly_partitions la vide à la création
+-- d'une partition couvrant ses lignes).
+
+CREATE TABLE viewing_sessions_default PARTITION OF viewing_sessions DEFAULT;
+CREATE TABLE episode_viewing_default PARTITION OF episode_viewing DEFAULT;
+
+-- Crée les partitions mensuelles de parent_table de months_back mois avant le
+-- mois courant à months_ahead mois après (idempotent). Retourne le nombre de
+-- partitions créées.
+CREATE OR REPLACE FUNCTION create_monthly_partitions(
+    parent_table TEXT,
+    months_back INT DEFAULT 0,
+    months_ahead INT DEFAULT 3
+) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    partition_column TEXT;
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    -- Colonne de partitionnement lue dans le catalogue
+    SELECT a.attname INTO partition_column
+    FROM pg_partitioned_table pt
+    JOIN pg_attribute a
+      ON a.attrelid = pt.partrelid
+     AND a.attnum = pt.partattrs[0]
+    WHERE pt.partrelid = parent_table::regclass;
+
+    IF partition_column IS NULL THEN
+        RAISE EXCEPTION 'La table % n''est pas partitionnée', parent_table;
+    END IF;
+
+    FOR i IN -months_back..months_ahead LOOP
+        month_start := (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::DATE;
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := format('%s_y%sm%s', parent_table,
+                                 to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        -- Table créée hors du parent, alimentée avec les lignes du mois tombées
+        -- dans la partition DEFAULT, puis attachée (ATTACH échouerait si la
+        -- DEFAULT contenait encore des lignes du mois)
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                       partition_name, parent_table);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            parent_table || '_default', partition_column, month_start, partition_column, month_end,
+            partition_name);
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       parent_table, partition_name, month_start, month_end);
+        created := created + 1;
+    END LOOP;
+
+    RETURN created;
+END;
+$$;
+
+-- Rétention : détache (et supprime si drop_detached) les partitions mensuelles
+-- de parent_table entièrement antérieures à retention_months mois avant le
+-- mois courant. Une partition détachée reste une table ordinaire (archivage,
+-- export) ; elle ne coûte plus rien aux requêtes sur le parent. Retourne les
+-- partitions traitées.
+CREATE OR REPLACE FUNCTION drop_old_partitions(
+    parent_table TEXT,
+    retention_months INT DEFAULT 12,
+    drop_detached BOOLEAN DEFAULT FALSE
+) RETURNS SETOF TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => retention_months))::DATE;
+    partition_name TEXT;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent_table::regclass
+          AND c.relname ~ '_y[0-9]{4}m[0-9]{2}$'
+          AND to_date(right(c.relname, 8), '"y"YYYY"m"MM') < cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent_table, partition_name);
+        IF drop_detached THEN
+            EXECUTE format('DROP TABLE %I', partition_name);
+        END IF;
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$;
+
+-- Partitions initiales : 12 mois d'historique (données générées) et 3 mois d'avance.
+-- À planifier ensuite (cron / pg_cron), par exemple chaque mois :
+--   SELECT create_monthly_partitions('viewing_sessions', 0, 3);
+--   SELECT create_monthly_partitions('episode_viewing', 0, 3);
+--   SELECT * FROM drop_old_partitions('viewing_sessions', 24);
+--   SELECT * FROM drop_old_partitions('episode_viewing', 24);
+SELECT create_monthly_partitions('viewing_sessions', 12, 3);
+SELECT create_monthly_partitions('episode_viewing', 12, 3);
 
 -- ============================================
 -- Création des INDEX pour optimiser les performances
 -- ============================================
 
+-- Profil "serving" : définitions identiques à SERVING_INDEXES de
+-- scripts/generate_streaming_data1.py, qui les supprime pendant une génération
+-- massive (profil "bulk_load") et les reconstruit ensuite en parallèle.
+-- Clés primaires et contraintes UNIQUE ne font pas partie des profils.
+--
+-- Choix :
+-- - pas d'index sur les colonnes à faible cardinalité (is_active, platform,
+--   is_original, content_type, subscription_plan, event_type, rating, watched) :
+--   un parcours séquentiel est aussi rapide, chaque index ralentit les insertions
+-- - pas de doublon des contraintes UNIQUE (users.email, episodes(tv_show_id, ...))
+-- - B-tree sur les colonnes temporelles (exports, watermarks) : pas de BRIN, les
+--   lignes générées ne sont pas stockées dans l'ordre chronologique
+--   (pg_stats.correlation proche de 0), un BRIN lirait toute la table
+-- - index couvrants (INCLUDE) pour les vues popular_content et daily_engagement :
+--   parcours d'index seul, sans lecture de la table
+
 -- Index pour la table USERS
-CREATE INDEX idx_users_email ON users(email);
-CREATE INDEX idx_users_country ON users(country);
-CREATE INDEX idx_users_subscription_plan ON users(subscription_plan);
-CREATE INDEX idx_users_subscription_end ON users(subscription_end);
-CREATE INDEX idx_users_is_active ON users(is_active);
+CREATE INDEX idx_users_country ON users (country);
+CREATE INDEX idx_users_subscription_end ON users (subscription_end);
+CREATE INDEX idx_users_active_last_login ON users (last_login) WHERE is_active;  -- vue active_users
 
 -- Index pour la table CONTENT
-CREATE INDEX idx_content_title ON content(title);
-CREATE INDEX idx_content_genre ON content(genre);
-CREATE INDEX idx_content_type ON content(content_type);
-CREATE INDEX idx_content_release_year ON content(release_year);
-CREATE INDEX idx_content_is_original ON content(is_original);
+CREATE INDEX idx_content_title ON content (title);
+CREATE INDEX idx_content_genre ON content (genre);
+CREATE INDEX idx_content_release_year ON content (release_year);
 
 -- Index pour la table VIEWING_SESSIONS
-CREATE INDEX idx_viewing_sessions_user_id ON viewing_sessions(user_id);
-CREATE INDEX idx_viewing_sessions_content_id ON viewing_sessions(content_id);
-CREATE INDEX idx_viewing_sessions_session_start ON viewing_sessions(session_start);
-CREATE INDEX idx_viewing_sessions_platform ON viewing_sessions(platform);
-CREATE INDEX idx_viewing_sessions_completion_rate ON viewing_sessions(completion_rate);
+-- (index sur tables partitionnées : créés sur chaque partition, y compris
+-- celles créées plus tard par create_monthly_partitions)
+CREATE INDEX idx_viewing_sessions_user_id ON viewing_sessions (user_id);
+-- popular_content : nombre de vues et complétion par contenu
+CREATE INDEX idx_viewing_sessions_content_cover ON viewing_sessions (content_id) INCLUDE (completion_rate);
+-- daily_engagement et exports incrémentaux : plage de session_start (B-tree couvrant)
+CREATE INDEX idx_viewing_sessions_daily_cover ON viewing_sessions (session_start)
+    INCLUDE (user_id, duration_seconds, completion_rate);
 
 -- Index pour la table RATINGS
-CREATE INDEX idx_ratings_user_id ON ratings(user_id);
-CREATE INDEX idx_ratings_content_id ON ratings(content_id);
-CREATE INDEX idx_ratings_rating ON ratings(rating);
-CREATE INDEX idx_ratings_rating_date ON ratings(rating_date);
+CREATE INDEX idx_ratings_user_id ON ratings (user_id);
+-- popular_content : note moyenne par contenu
+CREATE INDEX idx_ratings_content_cover ON ratings (content_id) INCLUDE (rating);
+CREATE INDEX idx_ratings_rating_date ON ratings (rating_date);
 
 -- Index pour la table WATCHLIST
-CREATE INDEX idx_watchlist_user_id ON watchlist(user_id);
-CREATE INDEX idx_watchlist_watched ON watchlist(watched);
+CREATE INDEX idx_watchlist_user_id ON watchlist (user_id);
 
 -- Index pour la table SUBSCRIPTION_EVENTS
-CREATE INDEX idx_subscription_events_user_id ON subscription_events(user_id);
-CREATE INDEX idx_subscription_events_event_date ON subscription_events(event_date);
-CREATE INDEX idx_subscription_events_event_type ON subscription_events(event_type);
+CREATE INDEX idx_subscription_events_user_id ON subscription_events (user_id);
+CREATE INDEX idx_subscription_events_event_date ON subscription_events (event_date);
 
 -- Index pour la table SEARCH_QUERIES
-CREATE INDEX idx_search_queries_user_id ON search_queries(user_id);
-CREATE INDEX idx_search_queries_search_date ON search_queries(search_date);
-CREATE INDEX idx_search_queries_clicked_content ON search_queries(clicked_content_id);
+CREATE INDEX idx_search_queries_user_id ON search_queries (user_id);
+CREATE INDEX idx_search_queries_search_date ON search_queries (search_date);
+CREATE INDEX idx_search_queries_clicked_content ON search_queries (clicked_content_id);
 
--- Index pour la table EPISODES
-CREATE INDEX idx_episodes_tv_show_id ON episodes(tv_show_id);
-CREATE INDEX idx_episodes_season_episode ON episodes(tv_show_id, season_number, episode_number);
+-- Index pour la table EPISODES : UNIQUE(tv_show_id, season_number, episode_number) suffit
 
 -- Index pour la table EPISODE_VIEWING
-CREATE INDEX idx_episode_viewing_user_id ON episode_viewing(user_id);
-CREATE INDEX idx_episode_viewing_episode_id ON episode_viewing(episode_id);
-CREATE INDEX idx_episode_viewing_start_time ON episode_viewing(start_time);
+CREATE INDEX idx_episode_viewing_user_id ON episode_viewing (user_id);
+CREATE INDEX idx_episode_viewing_episode_id ON episode_viewing (episode_id);
+CREATE INDEX idx_episode_viewing_start_time ON episode_viewing (start_time);
 
 -- ============================================
 -- Commentaires sur les tables
@@ -209,11 +342,159 @@ COMMENT ON TABLE search_queries IS 'Recherches effectuées par les utilisateurs'
 COMMENT ON TABLE episodes IS 'Épisodes pour les séries TV';
 COMMENT ON TABLE episode_viewing IS 'Visionnage détaillé par épisode';
 
+-- ============================================
+-- Tables de synthèse des tableaux de bord
+-- ============================================
+-- Les vues popular_content et daily_engagement lisent ces tables au lieu
+-- d'agréger viewing_sessions à chaque requête. Elles sont tenues à jour par
+-- refresh_dashboard_summaries(), job périodique de delta (plutôt que des
+-- triggers, qui renchériraient chaque insertion de l'application et du
+-- générateur). À planifier, par exemple avec pg_cron :
+--   SELECT cron.schedule('streamvision_dashboards', '*/15 * * * *',
+--                        'SELECT * FROM refresh_dashboard_summaries()');
+
+-- Engagement par jour de visionnage
+CREATE TABLE daily_engagement_summary (
+    viewing_date DATE PRIMARY KEY,
+    daily_active_users INT NOT NULL,
+    total_sessions INT NOT NULL,
+    total_watch_time_seconds BIGINT NOT NULL,
+    avg_completion_rate DECIMAL(5,2),
+    refreshed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Vues et notes par contenu
+CREATE TABLE content_popularity_summary (
+    content_id INT PRIMARY KEY REFERENCES content(id) ON DELETE CASCADE,
+    view_count INT NOT NULL,
+    avg_completion DECIMAL(5,2),
+    rating_count INT NOT NULL,
+    avg_rating DECIMAL(3,2),
+    refreshed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Dernier id traité par table source
+CREATE TABLE dashboard_refresh_state (
+    source_table VARCHAR(50) PRIMARY KEY,
+    last_id BIGINT NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Rafraîchissement par delta : les jours et contenus touchés par les lignes
+-- insérées depuis le dernier passage (id > last_id) sont recalculés en entier
+-- depuis les tables sources, via les index couvrants (idx_viewing_sessions_daily_cover,
+-- idx_viewing_sessions_content_cover, idx_ratings_content_cover). Un recalcul
+-- par clé reste exact pour COUNT(DISTINCT) et est idempotent.
+-- Les UPDATE / DELETE des sources et les lignes validées hors ordre d'id ne
+-- sont pas détectés : full_refresh => TRUE reconstruit tout (ex. chaque nuit).
+CREATE OR REPLACE FUNCTION refresh_dashboard_summaries(full_refresh BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (summary TEXT, keys_refreshed BIGINT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    last_session_id BIGINT := 0;
+    last_rating_id BIGINT := 0;
+    max_session_id BIGINT;
+    max_rating_id BIGINT;
+BEGIN
+    -- Un seul rafraîchissement à la fois
+    PERFORM pg_advisory_xact_lock(hashtext('refresh_dashboard_summaries'));
+
+    SELECT COALESCE(MAX(id), 0) INTO max_session_id FROM viewing_sessions;
+    SELECT COALESCE(MAX(id), 0) INTO max_rating_id FROM ratings;
+
+    IF full_refresh THEN
+        TRUNCATE daily_engagement_summary, content_popularity_summary;
+    ELSE
+        SELECT COALESCE(MAX(last_id) FILTER (WHERE source_table = 'viewing_sessions'), 0),
+               COALESCE(MAX(last_id) FILTER (WHERE source_table = 'ratings'), 0)
+        INTO last_session_id, last_rating_id
+        FROM dashboard_refresh_state;
+    END IF;
+
+    -- Clés touchées par les nouvelles lignes
+    DROP TABLE IF EXISTS touched_days, touched_content;
+
+    CREATE TEMP TABLE touched_days ON COMMIT DROP AS
+    SELECT DISTINCT session_start::DATE AS viewing_date
+    FROM viewing_sessions
+    WHERE id > last_session_id AND id <= max_session_id;
+
+    CREATE TEMP TABLE touched_content ON COMMIT DROP AS
+    SELECT content_id FROM viewing_sessions
+    WHERE id > last_session_id AND id <= max_session_id
+    UNION
+    SELECT content_id FROM ratings
+    WHERE id > last_rating_id AND id <= max_rating_id;
+
+    -- Engagement quotidien : un parcours d'index par jour touché
+    DELETE FROM daily_engagement_summary d
+    USING touched_days t
+    WHERE d.viewing_date = t.viewing_date;
+
+    INSERT INTO daily_engagement_summary (
+        viewing_date, daily_active_users, total_sessions,
+        total_watch_time_seconds, avg_completion_rate, refreshed_at
+    )
+    SELECT
+        t.viewing_date,
+        COUNT(DISTINCT vs.user_id),
+        COUNT(*),
+        SUM(vs.duration_seconds),
+        AVG(vs.completion_rate),
+        NOW()
+    FROM touched_days t
+    JOIN viewing_sessions vs
+      ON vs.session_start >= t.viewing_date
+     AND vs.session_start < t.viewing_date + 1
+    GROUP BY t.viewing_date;
+
+    -- Popularité des contenus : vues et notes agrégées séparément (pas de
+    -- produit sessions × notes)
+    DELETE FROM content_popularity_summary s
+    USING touched_content t
+    WHERE s.content_id = t.content_id;
+
+    INSERT INTO content_popularity_summary (
+        content_id, view_count, avg_completion, rating_count, avg_rating, refreshed_at
+    )
+    SELECT t.content_id, v.view_count, v.avg_completion, r.rating_count, r.avg_rating, NOW()
+    FROM touched_content t
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS view_count, AVG(completion_rate) AS avg_completion
+        FROM viewing_sessions
+        WHERE content_id = t.content_id
+    ) v
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS rating_count, AVG(rating) AS avg_rating
+        FROM ratings
+        WHERE content_id = t.content_id
+    ) r;
+
+    INSERT INTO dashboard_refresh_state (source_table, last_id, refreshed_at)
+    VALUES ('viewing_sessions', max_session_id, NOW()),
+           ('ratings', max_rating_id, NOW())
+    ON CONFLICT (source_table) DO UPDATE
+    SET last_id = EXCLUDED.last_id,
+        refreshed_at = EXCLUDED.refreshed_at;
+
+    RETURN QUERY
+    SELECT 'daily_engagement_summary', COUNT(*) FROM touched_days
+    UNION ALL
+    SELECT 'content_popularity_summary', COUNT(*) FROM touched_content;
+END;
+$$;
+
+COMMENT ON TABLE daily_engagement_summary IS 'Synthèse quotidienne des sessions (refresh_dashboard_summaries)';
+COMMENT ON TABLE content_popularity_summary IS 'Vues et notes par contenu (refresh_dashboard_summaries)';
+COMMENT ON TABLE dashboard_refresh_state IS 'Dernier id traité par refresh_dashboard_summaries';
+
 -- ============================================
 -- Vues utiles pour l''application
 -- ============================================
 
 -- Vue des utilisateurs actifs (dernière connexion < 30 jours)
+-- Reste une vue : elle ne lit que users, via l'index partiel
+-- idx_users_active_last_login (un résultat matérialisé vieillirait avec NOW())
 CREATE VIEW active_users AS
 SELECT * FROM users 
 WHERE last_login >= NOW() - INTERVAL '30 days' 
@@ -226,26 +507,23 @@ SELECT
     c.title,
     c.content_type,
     c.genre,
-    COUNT(vs.id) as view_count,
-    AVG(vs.completion_rate) as avg_completion,
-    AVG(r.rating) as avg_rating
-FROM content c
-LEFT JOIN viewing_sessions vs ON c.id = vs.content_id
-LEFT JOIN ratings r ON c.id = r.content_id
-GROUP BY c.id, c.title, c.content_type, c.genre
-HAVING COUNT(vs.id) >= 1000
-ORDER BY view_count DESC;
+    s.view_count,
+    s.avg_completion,
+    s.avg_rating
+FROM content_popularity_summary s
+JOIN content c ON c.id = s.content_id
+WHERE s.view_count >= 1000
+ORDER BY s.view_count DESC;
 
 -- Vue des statistiques d''engagement quotidien
 CREATE VIEW daily_engagement AS
 SELECT 
-    DATE(session_start) as viewing_date,
-    COUNT(DISTINCT user_id) as daily_active_users,
-    COUNT(*) as total_sessions,
-    SUM(duration_seconds) as total_watch_time_seconds,
-    AVG(completion_rate) as avg_completion_rate
-FROM viewing_sessions
-GROUP BY DATE(session_start)
+    viewing_date,
+    daily_active_users,
+    total_sessions,
+    total_watch_time_seconds,
+    avg_completion_rate
+FROM daily_engagement_summary
 ORDER BY viewing_date DESC;
 
 -- Message de confirmation
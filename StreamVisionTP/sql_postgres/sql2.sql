@@ -5,25 +5,26 @@ SELECT id, email, username, country, subscription_plan
 FROM users 
 LIMIT 5;
 
+-- Mise à jour des tables de synthèse (delta depuis le dernier passage)
+SELECT * FROM refresh_dashboard_summaries();
+
 SELECT 
     c.title,
     c.content_type,
     c.genre,
-    COUNT(vs.id) as view_count,
-    AVG(vs.completion_rate) as avg_completion
-FROM content c
-JOIN viewing_sessions vs ON c.id = vs.content_id
-GROUP BY c.id, c.title, c.content_type, c.genre
-ORDER BY view_count DESC
+    s.view_count,
+    s.avg_completion
+FROM content_popularity_summary s
+JOIN content c ON c.id = s.content_id
+ORDER BY s.view_count DESC
 LIMIT 10;
 
 
 SELECT 
-    DATE(session_start) as viewing_date,
-    COUNT(DISTINCT user_id) as daily_active_users,
-    COUNT(*) as total_sessions,
-    ROUND(SUM(duration_seconds) / 3600.0, 1) as total_hours_watched
-FROM viewing_sessions
-GROUP BY DATE(session_start)
+    viewing_date,
+    daily_active_users,
+    total_sessions,
+    ROUND(total_watch_time_seconds / 3600.0, 1) as total_hours_watched
+FROM daily_engagement_summary
 ORDER BY viewing_date DESC
 LIMIT 7;
\ No newline at end of file
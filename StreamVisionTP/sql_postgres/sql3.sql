@@ -0,0 +1,37 @@
+-- ============================================
+-- Change Data Capture (réplication logique) - StreamVision
+-- Pré-requis de airflow/dags/scripts/cdc_export_to_s3.py
+-- ============================================
+
+-- 1. Activer le décodage logique (nécessite un redémarrage de PostgreSQL)
+--    Le plugin wal2json doit être installé (paquet postgresql-XX-wal2json)
+ALTER SYSTEM SET wal_level = 'logical';
+ALTER SYSTEM SET max_replication_slots = 4;
+ALTER SYSTEM SET max_wal_senders = 4;
+
+-- 2. Identité de réplication : la clé primaire suffit pour UPDATE / DELETE
+--    (les UPDATE publient la nouvelle ligne complète, les DELETE la clé)
+ALTER TABLE users REPLICA IDENTITY DEFAULT;
+ALTER TABLE subscription_events REPLICA IDENTITY DEFAULT;
+
+-- 3. Création du slot (fait aussi automatiquement par la tâche cdc_export_merge
+--    du DAG, qui charge alors un instantané complet des deux tables). Le
+--    rechargement massif du générateur (reset) supprime le slot : TRUNCATE
+--    et insertions UNLOGGED ne sont pas décodables.
+SELECT pg_create_logical_replication_slot('streamvision_cdc', 'wal2json')
+WHERE NOT EXISTS (
+    SELECT 1 FROM pg_replication_slots WHERE slot_name = 'streamvision_cdc'
+);
+
+-- Vérification : retard du slot (WAL retenu tant que le slot n'avance pas)
+SELECT
+    slot_name,
+    plugin,
+    confirmed_flush_lsn,
+    pg_size_pretty(pg_wal_lsn_diff(pg_current_wal_lsn(), confirmed_flush_lsn)) AS retained_wal
+FROM pg_replication_slots
+WHERE slot_name = 'streamvision_cdc';
+
+-- Test rapide sur une base locale :
+--   UPDATE users SET is_active = FALSE WHERE id = 1;
+--   SELECT * FROM pg_logical_slot_peek_changes('streamvision_cdc', NULL, NULL, 'format-version', '2');
@@ -0,0 +1,168 @@
+-- ============================================
+-- MERGE des lots CDC (users, subscription_events) - StreamVision
+-- Fichiers produits par airflow/dags/scripts/cdc_export_to_s3.py :
+--   raw/postgres_cdc/<table>/<date>/<table>_cdc_<date>_<lsn>.csv
+--
+-- Chargement quotidien : tâche cdc_export_merge du DAG (snowflake_load.load_cdc,
+-- même COPY + MERGE) ; ce script crée les tables et streams, et sert aux
+-- rattrapages manuels.
+--
+-- Date de partition à charger passée en paramètre (substitution SnowSQL) :
+--   snowsql -f sql7.sql -o variable_substitution=true -D cdc_date=2026-01-05
+-- ============================================
+
+Use STREAMVISION_WH;
+USE WAREHOUSE LOADING_WH;
+USE SCHEMA RAW;
+
+-- Tables d'atterrissage des changements (une ligne par changement WAL)
+CREATE TRANSIENT TABLE IF NOT EXISTS users_changes (
+    _cdc_lsn NUMBER(20,0),
+    _cdc_seq INT,
+    _cdc_op CHAR(1),
+    _cdc_xid BIGINT,
+    id INT,
+    email VARCHAR(255),
+    username VARCHAR(100),
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    country VARCHAR(3),
+    age_group VARCHAR(20),
+    subscription_plan VARCHAR(20),
+    subscription_start DATE,
+    subscription_end DATE,
+    created_at TIMESTAMP,
+    last_login TIMESTAMP,
+    is_active BOOLEAN,
+    payment_method VARCHAR(50),
+    device_preference VARCHAR(50),
+    _loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
+);
+
+CREATE TRANSIENT TABLE IF NOT EXISTS subscription_events_changes (
+    _cdc_lsn NUMBER(20,0),
+    _cdc_seq INT,
+    _cdc_op CHAR(1),
+    _cdc_xid BIGINT,
+    id INT,
+    user_id INT,
+    event_type VARCHAR(50),
+    event_date TIMESTAMP,
+    previous_plan VARCHAR(20),
+    new_plan VARCHAR(20),
+    amount DECIMAL(10,2),
+    currency VARCHAR(3),
+    payment_gateway VARCHAR(50),
+    transaction_id VARCHAR(100),
+    _loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
+);
+
+-- Changements chargés mais pas encore appliqués : un stream append-only par
+-- table d'atterrissage. Le MERGE qui le lit le consomme à son COMMIT ; un
+-- lot non appliqué (run manqué, échec) reste dans le stream jusqu'au
+-- prochain MERGE, quel que soit son âge (Snowflake prolonge la rétention
+-- de la table source tant que le stream n'est pas consommé, 14 jours par
+-- défaut : MAX_DATA_EXTENSION_TIME_IN_DAYS).
+CREATE STREAM IF NOT EXISTS users_changes_pending
+    ON TABLE users_changes APPEND_ONLY = TRUE;
+
+CREATE STREAM IF NOT EXISTS subscription_events_changes_pending
+    ON TABLE subscription_events_changes APPEND_ONLY = TRUE;
+
+-- 1. Chargement des lots du jour (COPY ignore les fichiers déjà chargés)
+COPY INTO users_changes (
+    _cdc_lsn, _cdc_seq, _cdc_op, _cdc_xid,
+    id, email, username, first_name, last_name, country, age_group,
+    subscription_plan, subscription_start, subscription_end,
+    created_at, last_login, is_active, payment_method, device_preference
+)
+FROM @RAW.s3_raw_stage/postgres_cdc/users/&{cdc_date}/
+FILE_FORMAT = (TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '"' SKIP_HEADER = 1 EMPTY_FIELD_AS_NULL = TRUE)
+ON_ERROR = 'ABORT_STATEMENT';
+
+COPY INTO subscription_events_changes (
+    _cdc_lsn, _cdc_seq, _cdc_op, _cdc_xid,
+    id, user_id, event_type, event_date, previous_plan, new_plan,
+    amount, currency, payment_gateway, transaction_id
+)
+FROM @RAW.s3_raw_stage/postgres_cdc/subscription_events/&{cdc_date}/
+FILE_FORMAT = (TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '"' SKIP_HEADER = 1 EMPTY_FIELD_AS_NULL = TRUE)
+ON_ERROR = 'ABORT_STATEMENT';
+
+-- 2. MERGE : pour chaque clé présente dans les changements en attente (stream),
+--    seul son dernier changement connu (ordre WAL) est appliqué : un lot plus
+--    ancien chargé en retard ne peut pas écraser un état plus récent.
+--    Le coût est proportionnel au nombre de lignes modifiées, pas à la table.
+MERGE INTO STAGING.stg_users t
+USING (
+    SELECT *
+    FROM RAW.users_changes
+    WHERE id IN (SELECT id FROM RAW.users_changes_pending)
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _cdc_lsn DESC, _cdc_seq DESC) = 1
+) c
+ON t.id = c.id
+WHEN MATCHED AND c._cdc_op = 'D' THEN DELETE
+WHEN MATCHED THEN UPDATE SET
+    email = c.email,
+    username = c.username,
+    first_name = c.first_name,
+    last_name = c.last_name,
+    country = c.country,
+    age_group = c.age_group,
+    subscription_plan = c.subscription_plan,
+    subscription_start = c.subscription_start,
+    subscription_end = c.subscription_end,
+    created_at = c.created_at,
+    last_login = c.last_login,
+    is_active = c.is_active,
+    payment_method = c.payment_method,
+    device_preference = c.device_preference,
+    _loaded_at = CURRENT_TIMESTAMP()
+WHEN NOT MATCHED AND c._cdc_op <> 'D' THEN INSERT (
+    id, email, username, first_name, last_name, country, age_group,
+    subscription_plan, subscription_start, subscription_end,
+    created_at, last_login, is_active, payment_method, device_preference
+) VALUES (
+    c.id, c.email, c.username, c.first_name, c.last_name, c.country, c.age_group,
+    c.subscription_plan, c.subscription_start, c.subscription_end,
+    c.created_at, c.last_login, c.is_active, c.payment_method, c.device_preference
+);
+
+MERGE INTO STAGING.stg_subscription_events t
+USING (
+    SELECT *
+    FROM RAW.subscription_events_changes
+    WHERE id IN (SELECT id FROM RAW.subscription_events_changes_pending)
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _cdc_lsn DESC, _cdc_seq DESC) = 1
+) c
+ON t.id = c.id
+WHEN MATCHED AND c._cdc_op = 'D' THEN DELETE
+WHEN MATCHED THEN UPDATE SET
+    user_id = c.user_id,
+    event_type = c.event_type,
+    event_date = c.event_date,
+    previous_plan = c.previous_plan,
+    new_plan = c.new_plan,
+    amount = c.amount,
+    currency = c.currency,
+    payment_gateway = c.payment_gateway,
+    transaction_id = c.transaction_id,
+    _loaded_at = CURRENT_TIMESTAMP()
+WHEN NOT MATCHED AND c._cdc_op <> 'D' THEN INSERT (
+    id, user_id, event_type, event_date, previous_plan, new_plan,
+    amount, currency, payment_gateway, transaction_id
+) VALUES (
+    c.id, c.user_id, c.event_type, c.event_date, c.previous_plan, c.new_plan,
+    c.amount, c.currency, c.payment_gateway, c.transaction_id
+);
+
+-- Vérification : volume de changements chargés sur les dernières 24 h par type
+SELECT 'users' AS table_name, _cdc_op, COUNT(*) AS changes
+FROM RAW.users_changes
+WHERE _loaded_at >= DATEADD(day, -1, CURRENT_TIMESTAMP())
+GROUP BY _cdc_op
+UNION ALL
+SELECT 'subscription_events', _cdc_op, COUNT(*)
+FROM RAW.subscription_events_changes
+WHERE _loaded_at >= DATEADD(day, -1, CURRENT_TIMESTAMP())
+GROUP BY _cdc_op;
@@ -0,0 +1,54 @@
+-- ============================================
+-- Déduplication initiale des tables de STAGING - StreamVision
+-- À exécuter une fois avant de passer au chargement par MERGE
+-- (airflow/dags/scripts/snowflake_load.py) : les anciens chargements
+-- (DELETE du jour + COPY) ont accumulé une copie complète par jour.
+-- Ensuite chaque chargement garde une ligne par id, sans passe DELETE.
+-- ============================================
+Use STREAMVISION_WH;
+USE WAREHOUSE LOADING_WH;
+USE SCHEMA STAGING;
+
+-- Dernière version chargée de chaque id, réécrite en une passe
+INSERT OVERWRITE INTO stg_users
+SELECT * FROM stg_users
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1;
+
+INSERT OVERWRITE INTO stg_content
+SELECT * FROM stg_content
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1;
+
+-- Sessions : les durées invalides sont aussi écartées au chargement
+INSERT OVERWRITE INTO stg_viewing_sessions
+SELECT * FROM stg_viewing_sessions
+WHERE duration_seconds IS NULL OR duration_seconds > 0
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1;
+
+INSERT OVERWRITE INTO stg_ratings
+SELECT * FROM stg_ratings
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1;
+
+INSERT OVERWRITE INTO stg_watchlist
+SELECT * FROM stg_watchlist
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1;
+
+INSERT OVERWRITE INTO stg_subscription_events
+SELECT * FROM stg_subscription_events
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1;
+
+INSERT OVERWRITE INTO stg_search_queries
+SELECT * FROM stg_search_queries
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1;
+
+INSERT OVERWRITE INTO stg_episodes
+SELECT * FROM stg_episodes
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1;
+
+INSERT OVERWRITE INTO stg_episode_viewing
+SELECT * FROM stg_episode_viewing
+QUALIFY ROW_NUMBER() OVER (PARTITION BY id ORDER BY _loaded_at DESC) = 1;
+
+-- Vérification : aucun id en double
+SELECT 'stg_users' AS table_name, COUNT(*) - COUNT(DISTINCT id) AS duplicates FROM stg_users
+UNION ALL SELECT 'stg_viewing_sessions', COUNT(*) - COUNT(DISTINCT id) FROM stg_viewing_sessions
+UNION ALL SELECT 'stg_subscription_events', COUNT(*) - COUNT(DISTINCT id) FROM stg_subscription_events;
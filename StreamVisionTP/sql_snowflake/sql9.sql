@@ -0,0 +1,44 @@
+-- ============================================
+-- Couche physique STAGING : clustering et search optimization - StreamVision
+-- À exécuter après sql5.sql (tables de staging). Idempotent : peut être
+-- rejoué sur un environnement existant.
+--
+-- Les modèles dbt incrémentaux lisent la staging par _loaded_at (lignes
+-- chargées depuis le dernier build) et les analyses par date d'événement :
+-- les tables d'événements sont clusterisées sur (date de chargement, date
+-- d'événement). Le reclustering est automatique ; les tables de référence
+-- (content, episodes) sont trop petites pour en bénéficier.
+--
+-- Côté dbt, les faits, agrégats et marts déclarent leur clé via cluster_by.
+-- Contrôle de l'élagage : dbt run-operation pruning_report (tâche
+-- report_pruning du DAG).
+-- ============================================
+Use STREAMVISION_WH;
+USE SCHEMA STAGING;
+
+-- 1. Clés de clustering
+ALTER TABLE stg_viewing_sessions CLUSTER BY (TO_DATE(_loaded_at), TO_DATE(session_start));
+ALTER TABLE stg_episode_viewing CLUSTER BY (TO_DATE(_loaded_at), TO_DATE(start_time));
+ALTER TABLE stg_ratings CLUSTER BY (TO_DATE(_loaded_at), TO_DATE(rating_date));
+ALTER TABLE stg_subscription_events CLUSTER BY (TO_DATE(_loaded_at), TO_DATE(event_date));
+ALTER TABLE stg_search_queries CLUSTER BY (TO_DATE(_loaded_at), TO_DATE(search_date));
+ALTER TABLE stg_watchlist CLUSTER BY (TO_DATE(_loaded_at));
+-- Snapshot snap_users : lecture des seules lignes chargées depuis le dernier run
+ALTER TABLE stg_users CLUSTER BY (TO_DATE(_loaded_at));
+
+-- 2. Search optimization : recherches ponctuelles par utilisateur
+ALTER TABLE stg_viewing_sessions ADD SEARCH OPTIMIZATION ON EQUALITY(user_id);
+ALTER TABLE stg_subscription_events ADD SEARCH OPTIMIZATION ON EQUALITY(user_id);
+ALTER TABLE stg_ratings ADD SEARCH OPTIMIZATION ON EQUALITY(user_id);
+
+-- 3. Vérification : qualité du clustering (profondeur moyenne faible = bon)
+SELECT 'stg_viewing_sessions' AS table_name,
+       PARSE_JSON(SYSTEM$CLUSTERING_INFORMATION('stg_viewing_sessions')):average_depth::FLOAT AS average_depth
+UNION ALL
+SELECT 'stg_subscription_events',
+       PARSE_JSON(SYSTEM$CLUSTERING_INFORMATION('stg_subscription_events')):average_depth::FLOAT
+UNION ALL
+SELECT 'stg_ratings',
+       PARSE_JSON(SYSTEM$CLUSTERING_INFORMATION('stg_ratings')):average_depth::FLOAT;
+
+SHOW TABLES LIKE 'stg_%' IN SCHEMA STAGING;